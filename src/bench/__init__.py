@@ -0,0 +1,134 @@
+# coding=utf-8
+"""
+timeit-style micro benchmarks for the idioms shown in the study tests
+
+A benchmark is registered with the 'benchmark' decorator on a factory function. The factory does the
+setup work and returns the callable to measure, or a tuple of the callable followed by an 'info' dict of
+extra figures to put into the report and / or a 'cleanup' callable, e.g. (callable, info),
+(callable, pool.shutdown) or (callable, info, pool.shutdown). The callable is warmed up, then timed
+'repeat' times in batches of 'number' calls, and the median / p95 of the per-call time are reported.
+cleanup is called once after measuring, also when measuring fails, to stop the threads, processes or
+files the factory started, so that they do not run on while the next benchmarks are measured.
+"""
+
+import collections
+import gc
+import importlib
+import itertools
+import json
+import math
+import os
+import timeit
+
+Benchmark = collections.namedtuple('Benchmark', ['name', 'topic', 'factory', 'number', 'repeat', 'warmup'])
+
+BENCHMARKS = []
+
+DEFAULT_REPEAT = 7
+DEFAULT_WARMUP = 1
+
+
+def benchmark(topic, name=None, number=1000, repeat=None, warmup=None):
+    def decorator(factory):
+        BENCHMARKS.append(Benchmark(name='{:}.{:}'.format(topic, name or factory.__name__), topic=topic,
+                                    factory=factory, number=number, repeat=repeat, warmup=warmup))
+        return factory
+
+    return decorator
+
+
+def load_benchmarks():
+    """
+    import every bench_*.py module of this package, which registers their benchmarks
+    """
+    path = os.path.split(os.path.abspath(__file__))[0]
+    for f in sorted(os.listdir(path)):
+        if f.startswith('bench_') and f.endswith('.py'):
+            importlib.import_module('{:}.{:}'.format(__name__, f[:-3]))
+    return BENCHMARKS
+
+
+def percentile(samples, p):
+    # nearest-rank percentile of a sorted list
+    return samples[max(0, int(math.ceil(p / 100.0 * len(samples))) - 1)]
+
+
+def statistics(samples):
+    samples = sorted(samples)
+    mean = sum(samples) / len(samples)
+    stdev = math.sqrt(sum((s - mean) ** 2 for s in samples) / (len(samples) - 1)) if len(samples) > 1 else 0.0
+    return dict(min=samples[0], median=percentile(samples, 50), p95=percentile(samples, 95), mean=mean,
+                stdev=stdev)
+
+
+def unpack(made):
+    """
+    split what a factory returned into (callable, info, cleanup)
+    """
+    if not isinstance(made, tuple):
+        return made, {}, None
+    info = next((item for item in made[1:] if isinstance(item, dict)), {})
+    cleanup = next((item for item in made[1:] if callable(item)), None)
+    return made[0], info, cleanup
+
+
+def measure(bench, repeat=None, warmup=None):
+    fn, info, cleanup = unpack(bench.factory())
+    repeat = repeat or bench.repeat or DEFAULT_REPEAT
+    if warmup is None:
+        warmup = DEFAULT_WARMUP if bench.warmup is None else bench.warmup
+
+    samples = []
+    gc_enabled = gc.isenabled()
+    gc.disable()  # same as timeit, keep collections out of the figures
+    try:
+        for n in range(warmup + repeat):
+            ts = timeit.default_timer()
+            for _ in itertools.repeat(None, bench.number):
+                fn()
+            if n >= warmup:
+                samples.append((timeit.default_timer() - ts) / bench.number)
+    finally:
+        if gc_enabled:
+            gc.enable()
+        if cleanup is not None:
+            cleanup()
+
+    result = dict(name=bench.name, topic=bench.topic, number=bench.number, repeat=repeat)
+    result.update(statistics(samples))
+    if info:
+        result['info'] = info
+    return result
+
+
+def compare(results, baseline, threshold=0.1):
+    """
+    compare the medians with a baseline report, returns (name, baseline, current, ratio) of the
+    benchmarks which are slower than the baseline by more than 'threshold'
+    """
+    base = dict((r['name'], r) for r in baseline)
+    regressions = []
+    for r in results:
+        b = base.get(r['name'])
+        if b and b['median'] > 0:
+            ratio = r['median'] / b['median']
+            if ratio > 1 + threshold:
+                regressions.append((r['name'], b['median'], r['median'], ratio))
+    return regressions
+
+
+def format_time(seconds):
+    for unit, scale in (('s', 1.0), ('ms', 1e-3), ('us', 1e-6)):
+        if seconds >= scale:
+            return '{:.3f}{:}'.format(seconds / scale, unit)
+    return '{:.1f}ns'.format(seconds / 1e-9)
+
+
+def load_report(file_name):
+    with open(file_name) as f:
+        return json.load(f)
+
+
+def save_report(file_name, results):
+    with open(file_name, 'w') as f:
+        json.dump(results, f, indent=2, sort_keys=True)
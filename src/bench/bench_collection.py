@@ -0,0 +1,35 @@
+# coding=utf-8
+"""
+对应 collection/test_iterator.py 和 collection/test_list.py 中的迭代范例
+"""
+from bench import benchmark
+
+FILE_NAMES = ['test{:}{:}'.format(n, ext) for n in range(100) for ext in ('.jpg', '.png', '.bmp', '.txt')]
+FILE_EXTS = ('.jpg', '.bmp', '.png')
+
+
+@benchmark('collection', number=100)
+def endswith_map():
+    # test_iterator_imap 中 itertools.imap 的写法，python3 中即为 map
+    return lambda: [True in map(s.endswith, FILE_EXTS) for s in FILE_NAMES]
+
+
+@benchmark('collection', number=100)
+def endswith_tuple():
+    return lambda: [s.endswith(FILE_EXTS) for s in FILE_NAMES]
+
+
+@benchmark('collection', number=100)
+def list_append():
+    def run():
+        l = []
+        for n in range(1000):
+            l.append(n * 2)
+        return l
+
+    return run
+
+
+@benchmark('collection', number=100)
+def list_comprehension():
+    return lambda: [n * 2 for n in range(1000)]
@@ -0,0 +1,90 @@
+# coding=utf-8
+"""
+对应 thread/test_coroutine.py，比较 asyncio 任务和 test_sleep 中每个任务一个线程的做法
+
+每次测量启动 n 个同时睡眠 SLEEP 秒的任务并等待它们全部结束，n 从 10 增加到 100000；
+线程数不超过 THREAD_LIMIT，避免耗尽系统资源。info 中记录：
+    rss_delta 所有任务都在睡眠时进程常驻内存的增量（字节，只在提供 /proc/self/statm 的系统上统计）；
+    lateness_p50 / lateness_p99 任务实际醒来的时间比预期晚了多少（秒）
+"""
+import asyncio
+import functools
+import os
+import threading
+import time
+
+from bench import benchmark, percentile
+
+SLEEP = 0.01
+COUNTS = (10, 100, 1000, 10000, 100000)
+THREAD_LIMIT = 1000
+
+_PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+
+def _rss():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (IOError, OSError, ValueError, IndexError):
+        return None
+
+
+def _record(info, base, rss, lateness):
+    if base is not None and rss is not None:
+        info['rss_delta'] = rss - base
+    lateness.sort()
+    info['lateness_p50'] = percentile(lateness, 50)
+    info['lateness_p99'] = percentile(lateness, 99)
+
+
+def _asyncio_sleepers(count):
+    info = {'tasks': count}
+
+    async def sleeper(lateness):
+        start = time.perf_counter()
+        await asyncio.sleep(SLEEP)
+        lateness.append(time.perf_counter() - start - SLEEP)
+
+    async def main():
+        lateness, base = [], _rss()
+        tasks = [asyncio.ensure_future(sleeper(lateness)) for _ in range(count)]
+        await asyncio.sleep(0)  # 所有任务都已开始睡眠
+        rss = _rss()
+        await asyncio.gather(*tasks)
+        _record(info, base, rss, lateness)
+
+    return lambda: asyncio.run(main()), info
+
+
+def _thread_sleepers(count):
+    info = {'tasks': count}
+
+    def sleeper(lateness, started):
+        started.release()
+        start = time.perf_counter()
+        time.sleep(SLEEP)
+        lateness.append(time.perf_counter() - start - SLEEP)
+
+    def run():
+        lateness, base, started = [], _rss(), threading.Semaphore(0)
+        threads = [threading.Thread(target=sleeper, args=(lateness, started)) for _ in range(count)]
+        for thread in threads:
+            thread.start()
+        for _ in threads:
+            started.acquire()  # 所有线程都已开始睡眠
+        rss = _rss()
+        for thread in threads:
+            thread.join()
+        _record(info, base, rss, lateness)
+
+    return run, info
+
+
+for _count in COUNTS:
+    _repeat = 3 if _count >= 10000 else None
+    benchmark('coroutine', name='asyncio_sleep_{:}'.format(_count), number=1, repeat=_repeat)(
+        functools.partial(_asyncio_sleepers, _count))
+    if _count <= THREAD_LIMIT:
+        benchmark('coroutine', name='thread_sleep_{:}'.format(_count), number=1)(
+            functools.partial(_thread_sleepers, _count))
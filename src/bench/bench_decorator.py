@@ -0,0 +1,276 @@
+# coding=utf-8
+"""
+对应 decorator/test_decorator.py 中的注解范例
+"""
+import asyncio
+import functools
+import io
+import time
+
+from bench import benchmark
+from decorator import cache, logger, markup, timing, validate
+
+
+def memo(fn):
+    cache = {}
+    miss = object()
+
+    @functools.wraps(fn)
+    def wrapper(*args):
+        result = cache.get(args, miss)
+        if result is miss:
+            result = fn(*args)
+            cache[args] = result
+        return result
+
+    return wrapper
+
+
+def _fib(n):
+    return n if n < 2 else _fib(n - 1) + _fib(n - 2)
+
+
+@benchmark('decorator', number=100)
+def fib_plain():
+    return functools.partial(_fib, 15)
+
+
+@benchmark('decorator', number=100)
+def fib_memo():
+    # 每次调用都重新生成带缓存的函数，测量的是一次完整计算（含缓存填充）的耗时
+    def run():
+        @memo
+        def fib(n):
+            return n if n < 2 else fib(n - 1) + fib(n - 2)
+
+        return fib(15)
+
+    return run
+
+
+@benchmark('decorator', number=10000)
+def call_plain():
+    def demo(x):
+        return x
+
+    return functools.partial(demo, 1)
+
+
+@benchmark('decorator', number=10000)
+def call_wrapped():
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            return func(*args, **kwargs)
+
+        return wrapper
+
+    @decorator
+    def demo(x):
+        return x
+
+    return functools.partial(demo, 1)
+
+
+@benchmark('decorator', number=10000)
+def cache_memo_hit():
+    @cache.memo(maxsize=1024)
+    def demo(x, y=0):
+        return x + y
+
+    demo(1, y=2)
+    return functools.partial(demo, 1, y=2)
+
+
+@benchmark('decorator', number=10000)
+def cache_lru_cache_hit():
+    @functools.lru_cache(maxsize=1024)
+    def demo(x, y=0):
+        return x + y
+
+    demo(1, y=2)
+    return functools.partial(demo, 1, y=2)
+
+
+def _drive(coro):
+    # 直接驱动一个不会挂起的协程，不经过事件循环，测量的只是 await 链本身的开销
+    try:
+        coro.send(None)
+    except StopIteration as e:
+        return e.value
+    raise RuntimeError('coroutine suspended')
+
+
+@benchmark('decorator', number=10000)
+def async_await_plain():
+    async def demo(x, y=0):
+        return x + y
+
+    return lambda: _drive(demo(1, y=2))
+
+
+@benchmark('decorator', number=10000)
+def async_memo_hit():
+    @cache.memo(maxsize=1024)
+    async def demo(x, y=0):
+        return x + y
+
+    asyncio.run(demo(1, y=2))
+    return lambda: _drive(demo(1, y=2))
+
+
+@benchmark('decorator', number=10000)
+def log_sync():
+    # test_use_log 中同步写入 io.StringIO 的日志注解
+    sio = io.StringIO()
+
+    def log(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            start_time = time.time()
+            result = fn(*args, **kwargs)
+            end_time = time.time()
+            sio.write(u'function={:}\n'.format(fn.__name__))
+            sio.write(u'arguments={:} {:}\n'.format(args, kwargs))
+            sio.write(u'return={:}\n'.format(result))
+            sio.write(u'time={:.2f} sec'.format(end_time - start_time))
+            return result
+
+        return wrapper
+
+    @log
+    def multiply(x, y):
+        return x * y
+
+    return functools.partial(multiply, 10, 20)
+
+
+@benchmark('decorator', number=10000)
+def log_async():
+    # 调用者只把记录放入缓冲区，容量足以容纳全部调用，不会丢弃记录
+    log = logger.Logger(io.StringIO(), capacity=1 << 20, batch_size=1 << 20)
+
+    @log
+    def multiply(x, y):
+        return x * y
+
+    return functools.partial(multiply, 10, 20), log.close
+
+
+@benchmark('decorator', number=10000)
+def timed_call():
+    @timing.timed(name='bench.timed_call')
+    def demo(x):
+        return x
+
+    return functools.partial(demo, 1)
+
+
+def _html_tag_string_io(tag_name, **kwargs):
+    # test_decorator_with_arguments_py3 中的 html_tag 注解
+    def decorator(func):
+        def wrapper(*args):
+            sio = io.StringIO()
+            sio.write('<')
+            sio.write(tag_name)
+            for key in sorted(kwargs.keys()):
+                sio.write(' ')
+                sio.write('class' if key == 'clazz' else key)
+                value = str(kwargs[key])
+                if value.find('\"') < 0:
+                    sio.write('=\"')
+                    sio.write(value)
+                    sio.write('\"')
+                else:
+                    sio.write('=\'')
+                    sio.write(value)
+                    sio.write('\'')
+            nested = func(*args)
+            if len(nested) == 0:
+                sio.write('/>')
+            else:
+                sio.write('>')
+                sio.write(nested)
+                sio.write('</')
+                sio.write(tag_name)
+                sio.write('>')
+            sio.seek(0)
+            return sio.read()
+
+        return wrapper
+
+    return decorator
+
+
+@benchmark('decorator', number=100)
+def html_tag_string_io():
+    @_html_tag_string_io('li', clazz='item', style='display:block')
+    def item(n):
+        return str(n)
+
+    @_html_tag_string_io('ul', clazz='list')
+    def items():
+        return ''.join(item(n) for n in range(100))
+
+    return items
+
+
+@benchmark('decorator', number=100)
+def html_tag_compiled():
+    @markup.html_tag('li', clazz='item', style='display:block')
+    def item(n):
+        return str(n)
+
+    @markup.html_tag('ul', clazz='list')
+    def items():
+        return (item.stream(n) for n in range(100))
+
+    return items
+
+
+class _EmptyError(Exception):
+    pass
+
+
+def _not_empty_generic(func):
+    # test_wrapper_class_method_py3 中的 not_empty 注解
+    def wrapper(this, *args):
+        for arg in args:
+            if isinstance(arg, str):
+                if arg is None or len(arg) == 0:
+                    raise _EmptyError()
+        return func(this, *args)
+
+    return wrapper
+
+
+@benchmark('decorator', number=10000)
+def not_empty_generic():
+    # noinspection PyUnusedLocal
+    class A(object):
+        @_not_empty_generic
+        def test(self, name, title):
+            return True
+
+    return functools.partial(A().test, 'Alvin', 'Mr')
+
+
+@benchmark('decorator', number=10000)
+def not_empty_generated():
+    # noinspection PyUnusedLocal
+    class A(object):
+        @validate.not_empty
+        def test(self, name, title):
+            return True
+
+    return functools.partial(A().test, 'Alvin', 'Mr')
+
+
+@benchmark('decorator', number=10000)
+def not_empty_none():
+    # noinspection PyUnusedLocal
+    class A(object):
+        def test(self, name, title):
+            return True
+
+    return functools.partial(A().test, 'Alvin', 'Mr')
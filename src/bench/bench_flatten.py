@@ -0,0 +1,52 @@
+# coding=utf-8
+"""
+对应 decorator/flatten.py，比较逐层叠加的注解和合并为一个代理函数的注解在 1 ~ 8 层时的调用开销
+每层做相同的工作：调用计数加一
+"""
+import functools
+
+from bench import benchmark
+from decorator.flatten import Layer, fuse
+
+DEPTHS = range(1, 9)
+
+
+def _demo(x):
+    return x
+
+
+def _counting(counter):
+    # test_fix_function_name 中 decorator2 形式的注解
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            counter[0] += 1
+            return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def _counting_layer(counter):
+    return Layer(before='''
+        {v}counter[0] += 1
+    ''', setup=lambda fn: {'counter': counter}, name='counting')
+
+
+def _stacked(depth):
+    counter = [0]
+    fn = _demo
+    for _ in range(depth):
+        fn = _counting(counter)(fn)
+    return functools.partial(fn, 1)
+
+
+def _fused(depth):
+    counter = [0]
+    return functools.partial(fuse(*[_counting_layer(counter) for _ in range(depth)])(_demo), 1)
+
+
+for _depth in DEPTHS:
+    benchmark('flatten', name='stacked_{:}'.format(_depth), number=10000)(functools.partial(_stacked, _depth))
+    benchmark('flatten', name='fused_{:}'.format(_depth), number=10000)(functools.partial(_fused, _depth))
@@ -0,0 +1,41 @@
+# coding=utf-8
+"""
+对应 io/test_zip_io.py 中构造二进制数据的范例
+"""
+import array
+import struct
+import zlib
+
+from bench import benchmark
+
+COUNT = 1000
+
+
+@benchmark('io', number=100)
+def struct_pack_loop():
+    def run():
+        data = bytearray()
+        for n in range(0, COUNT):
+            data += struct.pack('i', n)
+        return data
+
+    return run
+
+
+@benchmark('io', number=100)
+def struct_pack_once():
+    fmt = struct.Struct('{:}i'.format(COUNT))
+    values = list(range(0, COUNT))
+    return lambda: fmt.pack(*values)
+
+
+@benchmark('io', number=100)
+def array_to_bytes():
+    values = list(range(0, COUNT))
+    return lambda: array.array('i', values).tobytes()
+
+
+@benchmark('io', number=100)
+def deflate():
+    data = struct.pack('{:}i'.format(COUNT), *range(0, COUNT))
+    return lambda: zlib.compress(data)
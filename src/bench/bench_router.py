@@ -0,0 +1,48 @@
+# coding=utf-8
+"""
+对应 decorator/router.py 中的前缀树路由，和逐个匹配正则表达式的路由比较，路由数量为 ROUTES
+"""
+from bench import benchmark
+from decorator import router
+
+ROUTES = 10000
+
+
+def _patterns():
+    # 一半静态路由，一半带参数的路由
+    for n in range(ROUTES // 2):
+        yield '/static{:}/page'.format(n)
+        yield '/api/resource{:}/<id:int>/<tab>'.format(n)
+
+
+def _urls():
+    step = ROUTES // 2 // 10
+    return ['/api/resource{:}/{:}/info'.format(n, n) for n in range(0, ROUTES // 2, step)] + \
+           ['/static{:}/page'.format(n) for n in range(0, ROUTES // 2, step)]
+
+
+def _handler(**kwargs):
+    return kwargs
+
+
+@benchmark('router', number=100)
+def trie_match():
+    app = router.App()
+    for pattern in _patterns():
+        app.add_route(pattern, _handler)
+    urls = _urls()
+    return lambda: [app.match(url) for url in urls]
+
+
+@benchmark('router', number=3)
+def regex_scan_match():
+    routes = [(router.compile_regex(pattern), _handler) for pattern in _patterns()]
+    urls = _urls()
+
+    def match(url):
+        for regex, func in routes:
+            m = regex.match(url)
+            if m:
+                return func, m.groupdict()
+
+    return lambda: [match(url) for url in urls]
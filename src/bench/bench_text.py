@@ -0,0 +1,48 @@
+# coding=utf-8
+"""
+对应 text/test_str_opt.py 中的字符串拼接范例
+"""
+import functools
+import io
+
+from bench import benchmark
+
+WORDS = [str(n) for n in range(1000)]
+
+
+def _concat(words):
+    s = ''
+    for w in words:
+        s += w
+    return s
+
+
+@benchmark('text', number=100)
+def concat_plus():
+    return functools.partial(_concat, WORDS)
+
+
+@benchmark('text', number=100)
+def concat_join():
+    return functools.partial(''.join, WORDS)
+
+
+@benchmark('text', number=100)
+def concat_string_io():
+    def run():
+        sio = io.StringIO()
+        for w in WORDS:
+            sio.write(w)
+        return sio.getvalue()
+
+    return run
+
+
+@benchmark('text', number=1000)
+def format_method():
+    return functools.partial('{:} + {:} = {:}'.format, 10, 20, 30)
+
+
+@benchmark('text', number=1000)
+def format_percent():
+    return functools.partial(str.__mod__, '%d + %d = %d', (10, 20, 30))
@@ -0,0 +1,268 @@
+# coding=utf-8
+"""
+对应 thread/ 中的线程工具，每次测量执行 TASKS 个很小的任务并等待它们全部完成
+cpu_* 测量执行 CPU_TASKS 个计算密集的 runner(times) 任务，比较进程池在 1 ~ N 个进程时的扩展性，
+以及受 GIL 限制的线程池
+lock_* 测量一次没有竞争的 with lock，比较 threading.Lock 和 lockprof 统计的锁
+timer_* 测量 TIMERS 个 TIMER_DELAY 秒后执行的延迟任务，比较时间轮和 threading.Timer，
+以及一次 schedule + cancel 的开销
+fan_* 把 FAN_TASKS 个 runner(FAN_TIMES) 任务分发给线程池并等待它们全部完成，比较 CountDownLatch 和手工使用 Condition
+（每完成一个任务 notify_all 一次）的汇合方式，fan_condition 的 info 中的 wakeups 为等待的线程被唤醒的次数；
+CountDownLatch 只在计数减到 0 时唤醒等待的线程，没有可以比较的唤醒次数
+uneven_* 测量执行 UNEVEN_TASKS 个 times 各不相同的 runner 任务，比较工作窃取调度器和共用一个 queue.Queue 的线程
+"""
+import concurrent.futures
+import functools
+import os
+import queue
+import threading
+
+from bench import benchmark
+from thread import lockprof
+from thread.pool import ThreadPool
+from thread.primitives import CountDownLatch
+from thread.procpool import ProcessPool
+from thread.steal import Scheduler
+from thread.timerwheel import TimerWheel
+
+TASKS = 100
+WORKERS = 4
+CPU_TASKS = 8
+CPU_TIMES = 200000
+CORES = os.cpu_count() or 1
+UNEVEN_TASKS = 1000
+TIMERS = 1000
+FAN_TASKS = 1000
+FAN_TIMES = 1000
+TIMER_DELAY = 0.01
+
+
+def _task(times):
+    total = 0
+    for x in range(times):
+        total += 1
+    return total
+
+
+@benchmark('thread', number=10)
+def thread_per_task():
+    # test_thread.py 中的用法：每个任务启动一个新的线程
+    def run():
+        threads = [threading.Thread(target=_task, kwargs=dict(times=10)) for _ in range(TASKS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    return run
+
+
+@benchmark('thread', number=10)
+def pool_submit():
+    # 线程池在整个测量期间保持运行，测量结束后 shutdown，不影响之后的测量
+    pool = ThreadPool(workers=WORKERS, queue_size=None)
+
+    def run():
+        for future in [pool.submit(_task, times=10) for _ in range(TASKS)]:
+            future.result()
+
+    return run, pool.shutdown
+
+
+def _with_lock(lock):
+    def run():
+        with lock:
+            pass
+
+    return run
+
+
+@benchmark('thread', number=10000)
+def lock_plain():
+    # 关闭统计时 lockprof.Lock() 返回的就是 threading.Lock()
+    return _with_lock(threading.Lock())
+
+
+@benchmark('thread', number=10000)
+def lock_profiled():
+    return _with_lock(lockprof.Lock('bench.lock'))
+
+
+def _scaling(cores):
+    counts, n = [], 1
+    while n < cores:
+        counts.append(n)
+        n *= 2
+    return counts + [cores]
+
+
+def _cpu_run(pool):
+    def run():
+        for future in [pool.submit(_task, CPU_TIMES) for _ in range(CPU_TASKS)]:
+            future.result()
+
+    return run, {'workers': pool.stats.workers}, pool.shutdown
+
+
+def _cpu_process_pool(workers):
+    return _cpu_run(ProcessPool(workers=workers, queue_size=None))
+
+
+@benchmark('thread', number=1)
+def cpu_thread_pool():
+    return _cpu_run(ThreadPool(workers=CORES, queue_size=None))
+
+
+for _workers in _scaling(CORES):
+    benchmark('thread', name='cpu_process_pool_{:}'.format(_workers), number=1)(
+        functools.partial(_cpu_process_pool, _workers))
+
+
+def _uneven_times():
+    # 0 ~ 990 之间分布不均匀的循环次数
+    return [(n * 7919) % 100 * (10 if n % 10 == 0 else 1) for n in range(UNEVEN_TASKS)]
+
+
+class _SharedQueuePool(object):
+    """
+    所有工作线程共用一个 queue.Queue 的最简单的线程池，作为工作窃取的对照
+    """
+
+    def __init__(self, workers):
+        self.tasks = queue.Queue()
+        self.threads = []
+        for _ in range(workers):
+            thread = threading.Thread(target=self.work)
+            thread.daemon = True
+            thread.start()
+            self.threads.append(thread)
+
+    def work(self):
+        while True:
+            task = self.tasks.get()
+            if task is None:
+                return
+            future, fn, args = task
+            if future.set_running_or_notify_cancel():
+                future.set_result(fn(*args))
+
+    def submit(self, fn, *args):
+        future = concurrent.futures.Future()
+        self.tasks.put((future, fn, args))
+        return future
+
+    def shutdown(self):
+        for _ in self.threads:
+            self.tasks.put(None)
+        for thread in self.threads:
+            thread.join()
+
+
+def _uneven_run(pool):
+    times = _uneven_times()
+
+    def run():
+        for future in [pool.submit(_task, n) for n in times]:
+            future.result()
+
+    return run, pool.shutdown
+
+
+@benchmark('thread', number=10)
+def uneven_shared_queue():
+    return _uneven_run(_SharedQueuePool(WORKERS))
+
+
+@benchmark('thread', number=10)
+def uneven_work_stealing():
+    return _uneven_run(Scheduler(workers=WORKERS))
+
+
+@benchmark('thread', number=1)
+def timer_threading_timer():
+    def run():
+        done = threading.Semaphore(0)
+        timers = [threading.Timer(TIMER_DELAY, done.release) for _ in range(TIMERS)]
+        for timer in timers:
+            timer.start()
+        for timer in timers:
+            timer.join()
+
+    return run
+
+
+@benchmark('thread', number=1)
+def timer_wheel():
+    wheel = TimerWheel()
+
+    def run():
+        done = threading.Semaphore(0)
+        for _ in range(TIMERS):
+            wheel.schedule(TIMER_DELAY, done.release)
+        for _ in range(TIMERS):
+            done.acquire()
+
+    return run, wheel.stop
+
+
+@benchmark('thread', number=1000)
+def timer_threading_timer_cancel():
+    def run():
+        timer = threading.Timer(60, int)
+        timer.start()
+        timer.cancel()
+        timer.join()
+
+    return run
+
+
+@benchmark('thread', number=1000)
+def timer_wheel_cancel():
+    wheel = TimerWheel()
+    return lambda: wheel.schedule(60, int).cancel(), wheel.stop
+
+
+@benchmark('thread', number=10)
+def fan_condition():
+    # test_active_count 中的用法：每个任务完成后 notify_all，等待的线程每次被唤醒都重新检查计数
+    pool = ThreadPool(workers=WORKERS, queue_size=None)
+    info = {'wakeups': 0}
+
+    def run():
+        condition = threading.Condition()
+        remaining = [FAN_TASKS]
+
+        def task():
+            _task(FAN_TIMES)
+            with condition:
+                remaining[0] -= 1
+                condition.notify_all()
+
+        for _ in range(FAN_TASKS):
+            pool.submit(task)
+        wakeups = 0
+        with condition:
+            while remaining[0]:
+                condition.wait()
+                wakeups += 1
+        info['wakeups'] = wakeups
+
+    return run, info, pool.shutdown
+
+
+@benchmark('thread', number=10)
+def fan_latch():
+    pool = ThreadPool(workers=WORKERS, queue_size=None)
+
+    def run():
+        latch = CountDownLatch(FAN_TASKS)
+
+        def task():
+            _task(FAN_TIMES)
+            latch.count_down()
+
+        for _ in range(FAN_TASKS):
+            pool.submit(task)
+        latch.wait()
+
+    return run, pool.shutdown
@@ -0,0 +1,62 @@
+# coding=utf-8
+from unittest import TestCase
+
+import bench
+
+
+class TestBench(TestCase):
+    def test_statistics(self):
+        stats = bench.statistics([5, 1, 4, 2, 3])
+        self.assertEqual(stats['min'], 1)
+        self.assertEqual(stats['median'], 3)
+        self.assertEqual(stats['p95'], 5)
+        self.assertEqual(stats['mean'], 3)
+
+        self.assertEqual(bench.percentile(list(range(1, 101)), 95), 95)
+
+    def test_measure(self):
+        calls = [0]
+
+        def factory():
+            def run():
+                calls[0] += 1
+
+            return run, {'size': 10}
+
+        b = bench.Benchmark(name='test.run', topic='test', factory=factory, number=10, repeat=3, warmup=2)
+        result = bench.measure(b)
+        self.assertEqual(calls[0], 10 * (3 + 2))
+        self.assertEqual(result['repeat'], 3)
+        self.assertEqual(result['info'], {'size': 10})
+        self.assertLessEqual(result['min'], result['median'])
+
+    def test_cleanup(self):
+        cleaned = []
+
+        def factory():
+            return (lambda: None), {'size': 10}, lambda: cleaned.append('info')
+
+        result = bench.measure(bench.Benchmark(name='test.info', topic='test', factory=factory, number=1, repeat=1,
+                                               warmup=0))
+        self.assertEqual(result['info'], {'size': 10})
+
+        def failing():
+            def run():
+                raise RuntimeError('run')
+
+            return run, lambda: cleaned.append('failing')
+
+        b = bench.Benchmark(name='test.failing', topic='test', factory=failing, number=1, repeat=1, warmup=0)
+        self.assertRaises(RuntimeError, bench.measure, b)
+        self.assertEqual(cleaned, ['info', 'failing'])
+
+    def test_compare(self):
+        baseline = [dict(name='a', median=1.0), dict(name='b', median=1.0)]
+        results = [dict(name='a', median=1.05), dict(name='b', median=1.5), dict(name='c', median=9.0)]
+        self.assertEqual(bench.compare(results, baseline, threshold=0.1), [('b', 1.0, 1.5, 1.5)])
+
+    def test_format_time(self):
+        self.assertEqual(bench.format_time(1.5), '1.500s')
+        self.assertEqual(bench.format_time(0.0025), '2.500ms')
+        self.assertEqual(bench.format_time(0.0000025), '2.500us')
+        self.assertEqual(bench.format_time(0.0000000025), '2.5ns')
@@ -0,0 +1,55 @@
+# coding=utf-8
+import io
+import time
+import unittest
+from unittest import TestCase
+
+import run_test
+
+# allocations kept alive by one test, which every later test of the run would otherwise pay for
+_retained = []
+
+
+def _suite(retain, n):
+    # defined here so that discovery does not pick the sample tests up
+    class Sample(TestCase):
+        def test_retain(self):
+            _retained.extend(object() for _ in range(retain))
+
+        def test_small(self):
+            self.assertEqual(len([bytearray(64) for _ in range(100)]), 100)
+
+    suite = unittest.TestSuite([Sample('test_retain')])
+    suite.addTests(Sample('test_small') for _ in range(n))
+    return suite
+
+
+def _run(resultclass, retain, n):
+    del _retained[:]
+    result = resultclass(io.StringIO(), True, 0, package='test')
+    ts = time.perf_counter()
+    _suite(retain, n).run(result)
+    return result, time.perf_counter() - ts
+
+
+class TestMemoryProfile(TestCase):
+    def tearDown(self):
+        del _retained[:]
+
+    def test_top_lines(self):
+        result, _ = _run(run_test.MemoryTestResult, 10000, 1)
+        self.assertEqual([usage.test_id.rsplit('.', 1)[1] for usage in result.memory], ['test_retain', 'test_small'])
+        retain, small = result.memory
+        self.assertGreater(retain.net, 10000 * 16)
+        self.assertIn(__file__, [line.rsplit(':', 1)[0] for line, _, _ in retain.top_lines])
+        self.assertGreaterEqual(small.peak, 100 * 64)
+        self.assertLess(small.net, retain.net)
+        self.assertFalse([line for usage in result.memory for line, _, _ in usage.top_lines
+                          if run_test.MemoryTestResult.is_filtered(line.rsplit(':', 1)[0])])
+
+    def test_overhead(self):
+        # what one test costs must not grow with the traces left behind by the tests before it
+        _, plain = _run(run_test.TimingTestResult, 20000, 100)
+        _, first = _run(run_test.MemoryTestResult, 20000, 0)
+        _, traced = _run(run_test.MemoryTestResult, 20000, 100)
+        self.assertLess(traced - first, plain * 20 + 0.5)
@@ -0,0 +1,262 @@
+# coding=utf-8
+"""
+由 test_decorator.py 中 test_cache_function_call 的 memo 注解发展而来的缓存注解
+
+原 memo 注解使用一个不限大小的字典，以位置参数为键缓存函数返回值，存在以下问题：
+    1. 缓存无限增长，长期运行会占满内存；
+    2. 忽略了关键字参数；
+    3. 多线程同时读写同一个字典，缺少同步
+本模块的 memo 注解在其基础上增加了：
+    1. LRU 淘汰：缓存数量超过 maxsize 后，淘汰最久未被使用的值；
+    2. TTL 过期：缓存的值超过 ttl 秒后失效；
+    3. 关键字参数参与生成缓存键；
+    4. 分段锁：未命中时按键分段加锁，不同线程计算不同段的键时不会互相阻塞；缓存的值统一存放，
+       淘汰时按全局的 maxsize 和 LRU 顺序进行；
+    5. cache_info() 统计命中、未命中和淘汰次数；
+    6. coalesce 模式：多个线程同时请求同一个尚未缓存的键时，只有第一个线程调用被注解函数，其余线程等待
+       并共享其结果（或异常），避免大量并发请求同时压到昂贵的后端上（等待者计入命中次数）；
+    7. 支持 async def 定义的协程函数：缓存的是 await 得到的结果而不是协程对象，并且总是合并同一个事件循环中
+       对同一个键的并发 await（合并只需共享一个 Task，不会阻塞线程）
+命中时不加锁、不 await，但仍需生成缓存键并按线程计数，所以开销高于一次普通的 await
+（见 bench 中的 async_memo_hit 和 async_await_plain）
+"""
+import asyncio
+import collections
+import functools
+import inspect
+import threading
+import time
+
+CacheInfo = collections.namedtuple('CacheInfo', ['hits', 'misses', 'evictions', 'maxsize', 'currsize'])
+
+_kwargs_mark = object()  # 分隔位置参数和关键字参数的标志
+
+
+def make_key(args, kwargs, typed=False):
+    """
+    根据位置参数和关键字参数生成缓存键，关键字参数按名称排序，所以和传入的顺序无关
+    typed 为 True 时，参数的类型也作为键的一部分，例如 f(1) 和 f(1.0) 会分别缓存
+    与 functools.lru_cache 相同，键是一个不嵌套的元组，计算哈希时不需要再进入内层的元组
+    """
+    key = args
+    if kwargs:
+        items = sorted(kwargs.items()) if len(kwargs) > 1 else kwargs.items()  # 只有一个时不需要排序
+        key += (_kwargs_mark,)
+        for item in items:
+            key += item
+    if typed:
+        key += tuple(type(v) for v in args)
+        if kwargs:
+            key += tuple(type(v) for _, v in items)
+    return key
+
+
+class MemoStore(object):
+    """
+    memo 注解缓存的值，flatten.memo_layer 也使用它，两者的淘汰、过期和 cache_info 完全相同。
+    OrderedDict 的顺序即访问顺序，最后一个元素为最近使用的元素；所有段共用一个 data，所以 maxsize 和 LRU 顺序
+    都是全局准确的。读取不加锁：dict.get 和 OrderedDict.move_to_end 在 GIL 下都是原子的，只有写入、淘汰和删除
+    过期的值需要加锁；命中次数按线程分别计数，每个线程只更新自己的计数，读取统计时再求和
+    """
+    __slots__ = ('lock', 'data', 'hits', 'evictions', 'table', 'maxsize', 'ttl', 'timer')
+
+    def __init__(self, maxsize=128, ttl=None, segments=8, timer=time.monotonic):
+        self.lock = threading.Lock()
+        self.data = collections.OrderedDict()  # key -> (value, expire_time)
+        self.hits = collections.defaultdict(int)  # 线程 id -> 命中次数
+        self.evictions = 0
+        self.table = [_Segment() for _ in range(max(1, segments))]
+        self.maxsize, self.ttl, self.timer = maxsize, ttl, timer
+
+    def segment(self, key):
+        return self.table[hash(key) % len(self.table)]
+
+    def lookup(self, key):
+        """
+        返回 (是否命中, 缓存的值)，命中时计数
+        """
+        data, timer = self.data, self.timer
+        entry = data.get(key)
+        if entry is not None:
+            if entry[1] is None or entry[1] > timer():
+                try:
+                    data.move_to_end(key)
+                except KeyError:
+                    pass  # 刚刚被其它线程淘汰，本次仍然算命中
+                self.hits[threading.get_ident()] += 1
+                return True, entry[0]
+            with self.lock:
+                if data.get(key) is entry:
+                    del data[key]  # 已过期
+        return False, None
+
+    def miss(self, key):
+        segment = self.segment(key)
+        with segment.lock:
+            segment.misses += 1
+
+    def store(self, key, result):
+        data = self.data
+        with self.lock:
+            data[key] = (result, None if self.ttl is None else self.timer() + self.ttl)
+            data.move_to_end(key)
+            if self.maxsize is not None and len(data) > self.maxsize:
+                data.popitem(last=False)  # 淘汰最久未使用的值
+                self.evictions += 1
+
+    def cache_info(self):
+        # list 在 GIL 下一次复制出所有线程的计数，其它线程同时新增计数时不会出错
+        hits, misses = sum(list(self.hits.values())), 0
+        for segment in self.table:
+            with segment.lock:
+                hits += segment.hits
+                misses += segment.misses
+        return CacheInfo(hits, misses, self.evictions, self.maxsize, len(self.data))
+
+    def cache_clear(self):
+        for segment in self.table:
+            with segment.lock:
+                segment.hits = segment.misses = 0
+        with self.lock:
+            self.data.clear()
+            self.hits.clear()
+            self.evictions = 0
+
+
+class _Segment(object):
+    """
+    未命中时按键分段加锁，记录未命中的次数以及 coalesce 模式下正在计算的键
+    """
+    __slots__ = ('lock', 'hits', 'misses', 'calls')
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.hits = self.misses = 0  # hits 为等待其它调用者结果的次数
+        self.calls = {}  # 正在计算的键 -> _Call（协程函数为 Task）
+
+
+class _Call(object):
+    """
+    一次正在进行的计算，等待者通过 event 等待其结果
+    """
+    __slots__ = ('event', 'owner', 'result', 'error')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.owner = threading.current_thread()
+        self.result = self.error = None
+
+
+def memo(fn=None, maxsize=128, ttl=None, typed=False, segments=8, timer=time.monotonic, coalesce=False):
+    """
+    缓存注解，既可以直接使用 @memo，也可以带参数使用 @memo(maxsize=1024, ttl=60)
+        maxsize 最多缓存的值的数量，None 表示不限制（和原 memo 注解相同）
+        ttl 缓存值的有效时间（秒），None 表示永不过期
+        typed 参数类型是否作为缓存键的一部分
+        segments 未命中时加锁的段数
+        timer 计算过期时间使用的时钟函数
+        coalesce 并发的相同调用是否只计算一次
+    """
+    if fn is None:
+        return functools.partial(memo, maxsize=maxsize, ttl=ttl, typed=typed, segments=segments, timer=timer,
+                                 coalesce=coalesce)
+
+    cache = MemoStore(maxsize, ttl, segments, timer)
+    data, hits, table, get_ident = cache.data, cache.hits, cache.table, threading.get_ident
+    lookup, store, segments = cache.lookup, cache.store, len(table)
+
+    def finish(segment, key, task):
+        # 协程执行完毕后由事件循环调用，异常和取消的结果不缓存
+        with segment.lock:
+            if not task.cancelled() and task.exception() is None:
+                store(key, task.result())
+            if segment.calls.get(key) is task:
+                del segment.calls[key]
+
+    @functools.wraps(fn)
+    async def async_wrapper(*args, **kwargs):
+        key = make_key(args, kwargs, typed) if kwargs or typed else args
+        # 与 lookup 相同，为减少命中时的函数调用而展开；命中时不产生任何 await
+        entry = data.get(key)
+        if entry is not None and (entry[1] is None or entry[1] > timer()):
+            try:
+                data.move_to_end(key)
+            except KeyError:
+                pass
+            hits[get_ident()] += 1
+            return entry[0]
+        loop = asyncio.get_running_loop()
+        segment = table[hash(key) % segments]
+        with segment.lock:
+            found, result = lookup(key)  # 其它调用者可能刚刚计算完成
+            if found:
+                return result
+            task = segment.calls.get(key)
+            # 其它事件循环中的 Task 不能在这里 await；Task 递归等待自己会死锁
+            if task is None or task.get_loop() is not loop or task is asyncio.current_task():
+                task = segment.calls[key] = loop.create_task(fn(*args, **kwargs))
+                task.add_done_callback(functools.partial(finish, segment, key))
+                segment.misses += 1
+            else:
+                segment.hits += 1
+        # shield：某个等待者被取消时，不会取消其它调用者共享的 Task
+        return await asyncio.shield(task)
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        key = make_key(args, kwargs, typed) if kwargs or typed else args
+        entry = data.get(key)  # 与 lookup 相同，为减少命中时的函数调用而展开
+        if entry is not None and (entry[1] is None or entry[1] > timer()):
+            try:
+                data.move_to_end(key)
+            except KeyError:
+                pass
+            hits[get_ident()] += 1
+            return entry[0]
+        segment = table[hash(key) % segments]
+        call = leader = None
+        with segment.lock:
+            if coalesce:
+                found, result = lookup(key)  # 计算者先写入结果再移除 _Call，所以在段锁中重新查找
+                if found:
+                    return result
+                call = segment.calls.get(key)
+                # 同一线程递归调用相同的参数时不能等待自己，作为新的计算者直接计算
+                if call is None or call.owner is threading.current_thread():
+                    call = leader = segment.calls[key] = _Call()
+            if call is not None and leader is None:
+                segment.hits += 1
+            else:
+                segment.misses += 1
+
+        if call is not None and leader is None:
+            call.event.wait()  # 等待计算者的结果
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        if leader is None:
+            # 在锁外调用被注解函数，否则递归调用（例如 fib）会在同一段的锁上死锁
+            result = fn(*args, **kwargs)
+            store(key, result)
+            return result
+
+        try:
+            leader.result = fn(*args, **kwargs)
+        except BaseException as e:
+            leader.error = e
+            raise
+        finally:
+            with segment.lock:
+                if leader.error is None:
+                    store(key, leader.result)
+                if segment.calls.get(key) is leader:
+                    del segment.calls[key]
+            leader.event.set()
+        return leader.result
+
+    if inspect.iscoroutinefunction(fn):
+        wrapper = async_wrapper
+    wrapper.cache_info = cache.cache_info
+    wrapper.cache_clear = cache.cache_clear
+    return wrapper
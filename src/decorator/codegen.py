@@ -0,0 +1,50 @@
+# coding=utf-8
+"""
+validate.py 和 flatten.py 共用的代理函数生成
+
+两个模块都把注解的逻辑拼成源代码，编译出一个代理函数，代替一层套一层的代理函数。本模块负责其中相同的部分：
+    1. 被注解函数是 async def 定义的协程函数时，生成的代理函数同样是协程函数，代码中的 {await} 替换为 await；
+    2. 编译并复制被注解函数的名称、文档等属性；
+    3. 记录生成的代理函数，再次注解时可以与已有的部分合并
+"""
+import functools
+import inspect
+import weakref
+
+# compile_wrapper 生成的代理函数 -> (kind, 被注解函数, parts)。functools.wraps 会把 __validation__ 等属性复制到
+# 其它注解的代理函数上，所以只能用代理函数本身判断是否可以合并，不能依据这些属性
+_generated = weakref.WeakKeyDictionary()
+
+
+def compile_wrapper(kind, fn, params, body, namespace, parts, is_async=None):
+    """
+    生成参数列表为 params、函数体为 body（代码行的列表）的代理函数，返回 (代理函数, 源代码)
+    body 中 await 被注解函数的位置写作 {await}，namespace 为生成的代码可以引用的名称，
+    kind 和 parts 记录代理函数由哪个模块的哪些部分生成，见 generated；
+    is_async 默认与被注解函数相同，为 False 时总是生成普通函数
+    """
+    if is_async is None:
+        # 协程函数的代理函数也必须是协程函数，否则 memo 等注解会把它当作普通函数，缓存只能 await 一次的协程对象
+        is_async = inspect.iscoroutinefunction(fn)
+    # 使用固定的函数名，被注解函数的名称（例如 <lambda>）不一定是合法的标识符，update_wrapper 会复制原来的名称
+    lines = ['{:}def _wrapper({:}):'.format('async ' if is_async else '', params)]
+    lines.extend(('    ' + line) if line.strip() else '' for line in body)
+    source = '\n'.join(lines).replace('{await}', 'await ' if is_async else '') + '\n'
+
+    exec(compile(source, '<{:} {:}>'.format(kind, getattr(fn, '__qualname__', fn.__name__)), 'exec'), namespace)
+    wrapper = functools.update_wrapper(namespace['_wrapper'], fn)
+    _generated[wrapper] = (kind, fn, list(parts))
+    return wrapper, source
+
+
+def generated(fn, kind):
+    """
+    fn 是 compile_wrapper 以同一个 kind 生成的代理函数时返回 (被注解函数, parts)，否则返回 None
+    """
+    try:
+        entry = _generated.get(fn)
+    except TypeError:  # 不支持弱引用或不可哈希的对象
+        return None
+    if entry is None or entry[0] != kind:
+        return None
+    return entry[1], entry[2]
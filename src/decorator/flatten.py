@@ -0,0 +1,181 @@
+# coding=utf-8
+"""
+将多个注解合并为一个代理函数
+
+test_decorator.py 中的注解每叠加一层，每次调用就多一层代理函数的调用（多一个栈帧）。如果注解的逻辑以
+源代码片段的形式描述（即 Layer 对象），fuse 函数可以把多个注解的代码片段按叠加的顺序拼接起来，生成一个
+代理函数，无论叠加多少层都只有一个栈帧。Layer 对象直接作为注解逐个叠加时，也会与已有的层合并。
+
+Layer 的代码片段中可以使用：
+    args, kwargs   代理函数收到的参数，可以修改
+    result         被注解函数的返回值（after 片段中），可以修改
+    _fn            被注解函数
+    {v}            该层的名称前缀，用于避免不同层的变量重名，namespace 中的名称同样以 {v} 引用
+short_circuit 为 True 的层在 before 片段中设置 {v}call，为 False 时不再调用内层（包括被注解函数），
+直接使用 before 片段中设置的 result，同时该层的 after 片段也不会执行（例如缓存命中）
+被注解函数是 async def 定义的协程函数时，合并后的代理函数同样是协程函数，result 为 await 得到的返回值。
+
+memo_layer、log_layer、check_layer（not_empty_layer）和 html_tag_layer 分别使用 cache.memo、logger.Logger、
+validate 的校验注解和 markup.html_tag 的缓存、日志记录、校验代码和标签生成，合并前后的行为相同；
+唯一的区别是 memo_layer 不合并并发的相同调用（即 memo 的 coalesce 模式，以及协程函数总是合并并发的 await）
+
+    fused = fuse(log_layer(logger), memo_layer())(fn)   # 等价于 log_layer(logger)(memo_layer()(fn))
+"""
+import textwrap
+import time
+
+from decorator import cache, codegen, markup, validate
+
+
+class Layer(object):
+    """
+        before 调用内层之前执行的代码片段
+        after 调用内层之后执行的代码片段
+        setup 每次注解一个函数时调用 setup(fn)，返回该层使用的名称字典（例如每个函数各自的缓存）
+        short_circuit before 片段是否可以跳过内层的调用
+        exports setup 返回的名称中，需要设置为代理函数属性的名称（例如 cache_info）
+    """
+
+    def __init__(self, before='', after='', setup=None, short_circuit=False, name=None, exports=()):
+        self.before = textwrap.dedent(before).strip('\n')
+        self.after = textwrap.dedent(after).strip('\n')
+        self.setup = setup
+        self.short_circuit = short_circuit
+        self.name = name or 'layer'
+        self.exports = tuple(exports)
+
+    def render(self, fn, prefix):
+        """
+        返回该层注解 fn 时的 (before 代码行, after 代码行, 名称字典)，{v} 和名称都已替换为 prefix 开头
+        """
+        names = {} if self.setup is None else self.setup(fn)
+        return (self.before.replace('{v}', prefix).splitlines(), self.after.replace('{v}', prefix).splitlines(),
+                dict((prefix + key, value) for key, value in names.items()))
+
+    def __call__(self, fn):
+        """
+        单独作为注解使用，被注解函数如果已由 Layer 代理，则与其合并
+        """
+        return fuse(self)(fn)
+
+    def __repr__(self):
+        return 'Layer({:})'.format(self.name)
+
+
+def generate(fn, layers):
+    namespace = {'_fn': fn}
+    body, exports = ['result = {await}_fn(*args, **kwargs)'], []
+    # 从最内层开始，逐层包裹
+    for n in range(len(layers) - 1, -1, -1):
+        layer, prefix = layers[n], '_l{:}_'.format(n)
+        before, after, names = layer.render(fn, prefix)
+        namespace.update(names)
+        exports.extend((key, prefix + key) for key in layer.exports)
+        if layer.short_circuit:
+            body = before + ['if {:}call:'.format(prefix)] + ['    ' + line for line in body + after]
+        else:
+            body = before + body + after
+    body.append('return result')
+
+    wrapper, source = codegen.compile_wrapper('fuse', fn, '*args, **kwargs', body, namespace, layers)
+    for key, name in exports:  # 外层在后，与逐层叠加时外层的属性覆盖内层的相同
+        setattr(wrapper, key, namespace[name])
+    wrapper.__fused__ = (fn, list(layers), source)
+    return wrapper
+
+
+def fuse(*layers):
+    """
+    将多个 Layer 合并为一个注解，fuse(a, b)(fn) 的行为与 a(b(fn)) 相同，但只生成一个代理函数
+    被注解函数如果已经是 fuse 的结果，则与其原有的层合并
+    """
+
+    def decorator(fn):
+        fused = codegen.generated(fn, 'fuse')
+        if fused is not None:
+            return generate(fused[0], list(layers) + fused[1])
+        return generate(fn, list(layers))
+
+    return decorator
+
+
+def memo_layer(maxsize=128, ttl=None, typed=False, segments=8, timer=time.monotonic):
+    """
+    对应 cache.memo 注解，参数的含义相同，缓存命中时跳过内层，代理函数同样提供 cache_info 和 cache_clear
+    """
+
+    def setup(fn):
+        store = cache.MemoStore(maxsize, ttl, segments, timer)
+        return {'make_key': cache.make_key, 'typed': typed, 'lookup': store.lookup, 'miss': store.miss,
+                'store': store.store, 'cache_info': store.cache_info, 'cache_clear': store.cache_clear}
+
+    return Layer(before='''
+        {v}key = {v}make_key(args, kwargs, {v}typed) if kwargs or {v}typed else args
+        {v}found, result = {v}lookup({v}key)
+        {v}call = not {v}found
+        if {v}call:
+            {v}miss({v}key)
+    ''', after='''
+        {v}store({v}key, result)
+    ''', setup=setup, short_circuit=True, name='memo', exports=('cache_info', 'cache_clear'))
+
+
+def log_layer(logger):
+    """
+    对应 logger.Logger 注解，记录写入 logger 的缓冲区，采样和统计与直接使用 @logger 相同
+    """
+
+    def setup(fn):
+        return {'full': logger.sample_rate >= 1.0, 'sample': logger.sample, 'append': logger.append,
+                'time': time.time, 'name': fn.__name__}
+
+    # 记录该层收到的参数，内层（例如 check_layer）可能替换 args 和 kwargs
+    return Layer(before='''
+        {v}sampled = {v}full or {v}sample()
+        if {v}sampled:
+            {v}args, {v}kwargs, {v}start = args, kwargs, {v}time()
+    ''', after='''
+        if {v}sampled:
+            {v}append(({v}name, {v}args, {v}kwargs, result, {v}time() - {v}start))
+    ''', setup=setup, name='log')
+
+
+class _CheckLayer(Layer):
+    """
+    执行 validate 校验注解的 checks，并像校验注解的代理函数那样，按被注解函数的签名整理 args 和 kwargs
+    （默认值已填入，位置参数总是按位置传入），内层看到的参数与逐层叠加时相同
+    """
+
+    def __init__(self, make_checks):
+        super(_CheckLayer, self).__init__(name='check')
+        self.make_checks = make_checks
+
+    def render(self, fn, prefix):
+        if not validate.is_enabled():  # 与关闭校验后的校验注解相同，不做任何校验
+            return [], [], {}
+        arguments = validate.arguments(fn, self.make_checks(fn))
+        return ['args, kwargs = {:}arguments(*args, **kwargs)'.format(prefix)], [], {prefix + 'arguments': arguments}
+
+
+def check_layer(decorator):
+    """
+    由 validate 的校验注解生成 Layer，例如 check_layer(validate.typed(age=int))，校验和异常与该注解相同
+    """
+    return _CheckLayer(decorator.checks)
+
+
+def not_empty_layer(*names):
+    """
+    对应 validate.not_empty 注解，不指定参数时校验 self/cls 以外的全部参数
+    """
+    return check_layer(validate.not_empty(*names))
+
+
+def html_tag_layer(tag_name, **kwargs):
+    """
+    对应 markup.html_tag 注解，用被注解函数返回的字符串、列表或生成器生成标签
+    """
+    render = markup.tag_renderer(tag_name, kwargs)[0]
+    return Layer(after='''
+        result = {v}render(result)
+    ''', setup=lambda fn: {'render': render}, name='html_tag')
@@ -0,0 +1,179 @@
+# coding=utf-8
+"""
+由 test_decorator.py 中 test_use_log_py2/py3 的 Logger 类发展而来的异步日志注解
+
+原 Logger 类在每次调用被注解函数时，同步格式化日志并写入 io.StringIO，日志的开销全部由调用者承担。
+本模块的 Logger 类：
+    1. 调用者只把日志记录（函数名、参数、返回值、耗时）放入环形缓冲区，不做格式化和 IO；
+    2. 后台线程批量取出记录，格式化后一次性写入文件或流；
+    3. 缓冲区已满时丢弃新的记录并计数，调用者永远不会被日志阻塞，格式化或写入出错的记录同样计为丢弃；
+    4. 支持按比例采样，未被采样的调用不计时也不产生记录；
+    5. 支持 async def 定义的协程函数，记录的是 await 得到的返回值，耗时包含协程挂起等待的时间
+注意，参数和返回值在后台线程中才被格式化，如果它们在调用后被修改，日志中记录的是修改后的值；
+close() 之后的调用不再产生记录，与 close() 同时发生的调用由调用者自己写入它的记录
+"""
+import collections
+import functools
+import inspect
+import random
+import threading
+import time
+
+LoggerStats = collections.namedtuple('LoggerStats', ['written', 'dropped', 'sampled_out', 'pending'])
+
+
+class Logger(object):
+    """
+        stream 写入日志的流（或文件对象），需要提供 write 和 flush 方法
+        capacity 缓冲区能容纳的记录数，超过后新的记录被丢弃
+        batch_size 后台线程每次最多写入的记录数，缓冲区中的记录达到该数量时立即唤醒后台线程
+        flush_interval 后台线程最长的等待时间（秒）
+        sample_rate 记录日志的调用比例，取值 0 ~ 1
+    """
+
+    def __init__(self, stream, capacity=10000, batch_size=512, flush_interval=0.1, sample_rate=1.0):
+        self.__stream = stream
+        self.__capacity = capacity
+        self.__batch_size = batch_size
+        self.__flush_interval = flush_interval
+        self.__sample_rate = sample_rate
+        # deque 的 append 和 popleft 是原子操作，后台线程取出记录时无需加锁
+        self.__buffer = collections.deque()
+        self.__wakeup = threading.Event()
+        self.__closed = False
+        self.__dropped = self.__sampled_out = 0
+        self.__lock = threading.Lock()  # 保护调用者线程更新的计数，以及 close() 之后的写入
+        # 放入缓冲区的记录数，以及其中已经写入或因出错而丢弃的记录数，flush() 等待后者追上前者
+        self.__enqueued = self.__written = self.__failed = 0
+        self.__done = threading.Condition()
+        self.__writer = threading.Thread(target=self.__run, name='logger-writer')
+        self.__writer.daemon = True
+        self.__writer.start()
+
+    def __call__(self, fn):
+        sample_rate = self.__sample_rate
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):  # 代理方法，只记录调用信息，格式化和写入由后台线程完成
+            if sample_rate < 1.0 and not self.sample():
+                return fn(*args, **kwargs)
+
+            start_time = time.time()
+            result = fn(*args, **kwargs)
+            end_time = time.time()
+            self.append((fn.__name__, args, kwargs, result, end_time - start_time))
+            return result
+
+        @functools.wraps(fn)
+        async def async_wrapper(*args, **kwargs):
+            if sample_rate < 1.0 and not self.sample():
+                return await fn(*args, **kwargs)
+
+            start_time = time.time()
+            result = await fn(*args, **kwargs)
+            end_time = time.time()
+            self.append((fn.__name__, args, kwargs, result, end_time - start_time))
+            return result
+
+        return async_wrapper if inspect.iscoroutinefunction(fn) else wrapper
+
+    @property
+    def sample_rate(self):
+        return self.__sample_rate
+
+    def sample(self):
+        """
+        按 sample_rate 决定本次调用是否记录日志，不记录时计入 sampled_out
+        """
+        if random.random() < self.__sample_rate:
+            return True
+        with self.__lock:
+            self.__sampled_out += 1
+        return False
+
+    def append(self, record):
+        """
+        放入一条 (函数名, 位置参数, 关键字参数, 返回值, 耗时) 记录，flatten.log_layer 同样通过它记录调用
+        """
+        buffer = self.__buffer
+        if len(buffer) >= self.__capacity or self.__closed:
+            with self.__lock:
+                self.__dropped += 1  # 缓冲区已满，丢弃记录而不阻塞调用者
+            return
+        with self.__done:  # 与计数一起放入，后台线程写入的记录数不会超过 __enqueued
+            buffer.append(record)
+            self.__enqueued += 1
+        if self.__closed:
+            # close() 在检查之后开始，后台线程最后一次写入时可能没有看到这条记录，等它结束后由调用者写入
+            self.__writer.join()
+            with self.__lock:
+                self.__drain()
+        elif len(buffer) >= self.__batch_size:
+            self.__wakeup.set()
+
+    @staticmethod
+    def format(record):
+        name, args, kwargs, result, elapsed = record
+        return u'function={:}\narguments={:} {:}\nreturn={:}\ntime={:.2f} sec\n'.format(name, args, kwargs, result,
+                                                                                     elapsed)
+
+    def __drain(self):
+        buffer = self.__buffer
+        while buffer:
+            batch, failed = [], 0
+            while buffer and len(batch) + failed < self.__batch_size:
+                record = buffer.popleft()
+                try:
+                    batch.append(self.format(record))
+                except Exception:
+                    failed += 1
+            try:
+                self.__stream.write(u''.join(batch))
+            except Exception:
+                batch, failed = [], failed + len(batch)
+            with self.__done:
+                self.__written += len(batch)
+                self.__failed += failed
+                self.__done.notify_all()
+        try:
+            self.__stream.flush()
+        except Exception:
+            pass  # 记录已经交给了流，flush 出错不影响计数
+
+    def __run(self):
+        while not self.__closed:
+            self.__wakeup.wait(self.__flush_interval)
+            self.__wakeup.clear()
+            self.__drain()
+        self.__drain()
+
+    @property
+    def stats(self):
+        with self.__lock, self.__done:
+            return LoggerStats(self.__written, self.__dropped + self.__failed, self.__sampled_out,
+                               self.__enqueued - self.__written - self.__failed)
+
+    def flush(self, timeout=None):
+        """
+        唤醒后台线程，等待调用 flush() 之前放入缓冲区的记录被写入（或因出错而丢弃），
+        包括后台线程已经从缓冲区取出、但还没有写完的记录
+        """
+        with self.__done:
+            target = self.__enqueued
+            if self.__written + self.__failed < target:
+                self.__wakeup.set()
+            return self.__done.wait_for(lambda: self.__written + self.__failed >= target, timeout)
+
+    def close(self):
+        """
+        停止接收新的记录，写入缓冲区中剩余的记录后结束后台线程
+        """
+        self.__closed = True
+        self.__wakeup.set()
+        self.__writer.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -0,0 +1,125 @@
+# coding=utf-8
+"""
+由 test_decorator.py 中 test_decorator_with_arguments_py2/py3 的 html_tag 注解发展而来的 HTML 生成注解
+
+原 html_tag 注解在每次调用被注解函数时，都重新排序属性、判断引号并逐段写入 io.StringIO。本模块的 html_tag 注解：
+    1. 在注解时就生成好标签的开始部分、结束部分和空标签，每次调用只需拼接三段字符串；
+    2. 被注解函数除了返回字符串外，还可以返回列表或生成器，其中的元素可以是字符串、列表、生成器，
+       或其它被注解函数的 stream(...) 结果，嵌套的内容只在最后拼接一次，不会反复复制；
+    3. 通过 stream(...) 可以得到一个逐段产生 HTML 的生成器，render(...) 将其分批写入文件等流，
+       生成很大的文档时无需在内存中保存完整的字符串
+被注解函数也可以是 async def 定义的协程函数，此时注解后的函数和 stream(...) 同样是协程函数，需要 await 取得结果
+与原注解相同，属性值和内容都不做转义
+"""
+import functools
+import inspect
+
+
+def start_tag(tag_name, attributes):
+    """
+    生成标签的开始部分（不含 '>' 或 '/>'），属性按名称排序，clazz 表示 class 属性
+    """
+    parts = ['<', tag_name]
+    for key in sorted(attributes):
+        value = str(attributes[key])
+        quote = '"' if value.find('"') < 0 else '\''
+        parts.extend((' ', 'class' if key == 'clazz' else key, '=', quote, value, quote))
+    return ''.join(parts)
+
+
+def iter_chunks(content):
+    """
+    将嵌套的内容展开为字符串序列，使用显式的栈，不受嵌套层数的限制
+    """
+    if isinstance(content, str):
+        if content:
+            yield content
+        return
+
+    stack = [iter(content)]
+    while stack:
+        for item in stack[-1]:
+            if isinstance(item, str):
+                if item:
+                    yield item
+            elif item is not None:
+                stack.append(iter(item))
+                break
+        else:
+            stack.pop()
+
+
+def tag_renderer(tag_name, attributes):
+    """
+    返回 (render, wrap)：render(nested) 生成完整的标签字符串，wrap(nested) 逐段产生标签，
+    html_tag 和 flatten.html_tag_layer 都由它生成标签
+    """
+    head = start_tag(tag_name, attributes)
+    open_tag, close_tag, empty_tag = head + '>', '</' + tag_name + '>', head + '/>'
+
+    def wrap(nested):
+        """
+        逐段产生 HTML，需要先取得第一段非空内容，才能确定是否为空标签
+        """
+        chunks = iter_chunks(nested)
+        for first in chunks:
+            yield open_tag
+            yield first
+            for chunk in chunks:
+                yield chunk
+            yield close_tag
+            return
+        yield empty_tag
+
+    def render(nested):
+        if isinstance(nested, str):  # 最常见的情况，不经过生成器
+            return open_tag + nested + close_tag if nested else empty_tag
+        return ''.join(wrap(nested))
+
+    return render, wrap
+
+
+def html_tag(tag_name, **kwargs):
+    render, wrap = tag_renderer(tag_name, kwargs)
+
+    def decorator(func):
+        def stream(*args, **kw):
+            return wrap(func(*args, **kw))
+
+        @functools.wraps(func)
+        def wrapper(*args, **kw):
+            return render(func(*args, **kw))
+
+        wrapper.stream = stream
+        return wrapper
+
+    def async_decorator(func):
+        async def stream(*args, **kw):
+            return wrap(await func(*args, **kw))
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kw):
+            return render(await func(*args, **kw))
+
+        wrapper.stream = stream
+        return wrapper
+
+    return lambda func: async_decorator(func) if inspect.iscoroutinefunction(func) else decorator(func)
+
+
+def render(content, writer, buffer_size=8192):
+    """
+    将内容（字符串、列表、生成器等）写入 writer，积累到 buffer_size 个字符后才写入一次，返回写入的字符数
+    """
+    buf, size, total = [], 0, 0
+    for chunk in iter_chunks(content):
+        buf.append(chunk)
+        size += len(chunk)
+        if size >= buffer_size:
+            writer.write(''.join(buf))
+            total += size
+            buf, size = [], 0
+    if buf:
+        writer.write(''.join(buf))
+        total += size
+    return total
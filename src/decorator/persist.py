@@ -0,0 +1,215 @@
+# coding=utf-8
+"""
+基于 sqlite 的持久化缓存注解
+
+test_decorator.py 中的 memo 注解把返回值保存在内存中，进程退出后缓存即丢失，每个新启动的进程都要重新计算。
+persist 注解把返回值保存到 sqlite 数据库文件中：
+    1. 缓存键为函数全名和参数序列化后的 sha1 值，与进程无关，所以不同进程、不同次运行之间可以共享缓存；
+    2. sqlite 以文件锁保证多进程并发读写的安全，并使用 WAL 日志模式，使读操作不会被写操作阻塞；
+    3. 缓存数量超过 maxsize 后，按最近使用时间淘汰最旧的记录；
+    4. 打开数据库时通过 mmap_size 将数据库文件（包括主键索引）映射到内存，进程启动后无需逐页读取即可命中缓存
+"""
+import functools
+import hashlib
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+from decorator.cache import CacheInfo
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS memo (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL,
+    used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS memo_used ON memo (used);
+'''
+
+
+class Store(object):
+    """
+    一个缓存数据库文件，可被多个函数、多个线程、多个进程共享
+        path 数据库文件名
+        maxsize 最多保存的记录数，None 表示不限制
+        mmap_size 映射到内存的最大字节数，0 表示不使用 mmap
+        touch_interval 命中缓存时，距上次更新超过该秒数才更新记录的使用时间，以减少写操作
+        check_interval 每写入该数量的记录检查一次是否需要淘汰
+    """
+
+    def __init__(self, path, maxsize=10000, mmap_size=64 << 20, touch_interval=60.0, check_interval=100,
+                 timeout=30.0):
+        self.__path = path
+        self.__maxsize = maxsize
+        self.__mmap_size = mmap_size
+        self.__touch_interval = touch_interval
+        self.__check_interval = check_interval
+        self.__timeout = timeout
+        self.__local = threading.local()
+        self.__lock = threading.Lock()
+        self.__connections = []  # 各线程建立的 (线程, 连接, 进程号)，close 时全部关闭
+        self.__inserts = 0
+        self.hits = self.misses = self.evictions = 0
+
+    @property
+    def maxsize(self):
+        return self.__maxsize
+
+    def __connection(self):
+        """
+        sqlite 连接不能在线程间共享，也不能在 fork 后的子进程中继续使用，所以每个线程（进程）各自建立连接
+        连接只由建立它的线程使用，check_same_thread=False 只是为了 close 可以在其它线程中关闭它
+        """
+        local = self.__local
+        if getattr(local, 'pid', None) != os.getpid():
+            conn = sqlite3.connect(self.__path, timeout=self.__timeout, isolation_level=None,
+                                   check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            if self.__mmap_size:
+                conn.execute('PRAGMA mmap_size={:d}'.format(self.__mmap_size))
+            conn.executescript(_SCHEMA)
+            local.conn, local.pid = conn, os.getpid()
+            with self.__lock:
+                # 顺便关闭已结束的线程留下的连接，丢弃 fork 前父进程的连接（不能在子进程中关闭）
+                self.__connections, finished = self.__partition()
+                self.__connections.append((threading.current_thread(), conn, local.pid))
+            for finished_conn in finished:
+                finished_conn.close()
+        return local.conn
+
+    def __partition(self):
+        """
+        将登记的连接分为 (仍在使用的, 需要关闭的)，需要由调用者持有 __lock
+        """
+        alive, finished, pid = [], [], os.getpid()
+        for entry in self.__connections:
+            if entry[2] != pid:
+                continue
+            if entry[0].is_alive():
+                alive.append(entry)
+            else:
+                finished.append(entry[1])
+        return alive, finished
+
+    def get(self, key, miss=None):
+        conn = self.__connection()
+        row = conn.execute('SELECT value, used FROM memo WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            with self.__lock:
+                self.misses += 1
+            return miss
+
+        now = time.time()
+        if now - row[1] > self.__touch_interval:
+            conn.execute('UPDATE memo SET used = ? WHERE key = ?', (now, key))
+        with self.__lock:
+            self.hits += 1
+        return pickle.loads(row[0])
+
+    def put(self, key, value):
+        conn = self.__connection()
+        conn.execute('INSERT OR REPLACE INTO memo (key, value, used) VALUES (?, ?, ?)',
+                     (key, sqlite3.Binary(pickle.dumps(value, pickle.HIGHEST_PROTOCOL)), time.time()))
+        with self.__lock:
+            self.__inserts += 1
+            check = self.__maxsize is not None and self.__inserts % self.__check_interval == 0
+        if check:
+            self.evict()
+
+    def evict(self):
+        """
+        淘汰最久未使用的记录，使记录数不超过 maxsize，返回淘汰的记录数
+        """
+        if self.__maxsize is None:
+            return 0
+        conn = self.__connection()
+        count = conn.execute('DELETE FROM memo WHERE key IN (SELECT key FROM memo ORDER BY used LIMIT max(0, '
+                             '(SELECT count(*) FROM memo) - ?))', (self.__maxsize,)).rowcount
+        with self.__lock:
+            self.evictions += count
+        return count
+
+    def __len__(self):
+        return self.__connection().execute('SELECT count(*) FROM memo').fetchone()[0]
+
+    def clear(self):
+        self.__connection().execute('DELETE FROM memo')
+        with self.__lock:
+            self.hits = self.misses = self.evictions = 0
+
+    def close(self):
+        """
+        关闭当前进程中所有线程建立的连接，之后再使用时各线程重新建立连接
+        """
+        with self.__lock:
+            alive, finished = self.__partition()
+            self.__connections = []
+            self.__local = threading.local()
+        for conn in finished + [entry[1] for entry in alive]:
+            conn.close()
+
+
+def stable_key(fn, args, kwargs):
+    """
+    生成与进程无关的缓存键：函数的模块名、限定名和参数一同序列化后计算 sha1
+    参数必须可以被 pickle 序列化，且相等的参数序列化结果相同；set、frozenset 和 dict（包括嵌套在 list、tuple、
+    dict 中的）的序列化结果与元素的顺序有关，先按元素的序列化结果排序
+    """
+    data = pickle.dumps((fn.__module__, getattr(fn, '__qualname__', fn.__name__), _normalise(args),
+                         [(key, _normalise(value)) for key, value in sorted(kwargs.items())]), protocol=2)
+    return hashlib.sha1(data).hexdigest()
+
+
+class _Unordered(tuple):
+    """
+    排序后的 set、frozenset 或 dict：(原类型, 排序后的各元素的序列化结果...)，与同样内容的 tuple 的缓存键不同
+    """
+
+
+def _normalise(value):
+    """
+    返回 value 的等价形式，其中的 set、frozenset 和 dict 替换为与元素顺序（例如 str 的哈希随机化）无关的 _Unordered
+    """
+    kind = type(value)
+    if kind is tuple or kind is list:
+        return kind(_normalise(item) for item in value)
+    if kind is dict:
+        return _Unordered((dict,) + tuple(sorted(pickle.dumps((_normalise(key), _normalise(item)), protocol=2)
+                                                 for key, item in value.items())))
+    if kind is set or kind is frozenset:
+        return _Unordered((kind,) + tuple(sorted(pickle.dumps(_normalise(item), protocol=2) for item in value)))
+    return value
+
+
+def persist(store, **kwargs):
+    """
+    持久化缓存注解，store 为 Store 对象或数据库文件名（此时 kwargs 用于创建 Store 对象）
+        @persist('/tmp/memo.db', maxsize=1000)
+        def compute(n):
+            ...
+    """
+    if not isinstance(store, Store):
+        store = Store(store, **kwargs)
+
+    def decorator(fn):
+        miss = object()
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kw):
+            key = stable_key(fn, args, kw)
+            result = store.get(key, miss)
+            if result is miss:
+                result = fn(*args, **kw)
+                store.put(key, result)
+            return result
+
+        wrapper.store = store
+        wrapper.cache_info = lambda: CacheInfo(store.hits, store.misses, store.evictions, store.maxsize,
+                                               len(store))
+        wrapper.cache_clear = store.clear
+        return wrapper
+
+    return decorator
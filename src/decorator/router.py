@@ -0,0 +1,185 @@
+# coding=utf-8
+"""
+由 test_decorator.py 中 test_router 的 App 类发展而来的 URL 路由
+
+原 App 类以 url 为键将函数保存在字典中，只能精确匹配。本模块的 App 类支持：
+    /user/<id:int>      带类型的路径参数，类型可以为 str（默认）、int、float、path
+    /static/<file:path> path 类型的参数匹配剩余的全部路径，只能出现在最后
+    /user/*/profile     通配符，匹配任意一段路径，不作为参数
+路由按 '/' 分段保存在一棵前缀树（trie）中，查找时逐段向下匹配，耗时只和路径的段数相关，与路由的数量无关
+同一位置的候选节点按 静态路径 > int > float > str > 通配符 > path 的优先级依次尝试，匹配失败时回溯
+"""
+import re
+
+
+class RouteNotFound(Exception):
+    pass
+
+
+# 参数类型 -> (转换函数, 用于正则表达式的模式)，路径段必须完整匹配模式，转换函数抛出 ValueError 也表示不匹配
+CONVERTERS = {
+    'str': (str, '[^/]+'),
+    'int': (int, '[+-]?[0-9]+'),
+    'float': (float, r'[+-]?(?:[0-9]+\.?[0-9]*|\.[0-9]+)'),
+    'path': (str, '.+'),
+}
+
+# int() 和 float() 还接受 '1_000'、' 7'、其它文字的数字、'nan'、'1e5' 等，先用模式检查，与正则表达式的路由保持一致；
+# 模式本身也要足够严格（例如 float 不接受 '1.2.3' 和 '.'），否则正则表达式匹配、转换函数却失败，两者结果不同
+_FULLMATCH = {kind: re.compile(pattern).fullmatch for kind, (_, pattern) in CONVERTERS.items()}
+
+_PRIORITY = ['int', 'float', 'str']  # 参数节点的尝试顺序，越严格的类型越先尝试
+
+_param_pattern = re.compile(r'^<([A-Za-z_][A-Za-z0-9_]*)(?::([A-Za-z_]+))?>$')
+
+
+def split_url(url):
+    url = url.strip('/')
+    return url.split('/') if url else []
+
+
+def parse_pattern(pattern):
+    """
+    将路由模式解析为 (类型, 值) 的列表，类型为 'static'、'*' 或参数类型，值为静态路径或参数名
+    """
+    segments = []
+    parts = split_url(pattern)
+    for n, part in enumerate(parts):
+        if part == '*':
+            segments.append(('*', None))
+            continue
+        m = _param_pattern.match(part)
+        if not m:
+            if '<' in part or '>' in part:
+                raise ValueError('invalid segment {:} in route {:}'.format(part, pattern))
+            segments.append(('static', part))
+            continue
+        name, kind = m.group(1), m.group(2) or 'str'
+        if kind not in CONVERTERS:
+            raise ValueError('unknown converter {:} in route {:}'.format(kind, pattern))
+        if kind == 'path' and n != len(parts) - 1:
+            raise ValueError('path parameter must be the last segment of route {:}'.format(pattern))
+        segments.append((kind, name))
+    return segments
+
+
+def compile_regex(pattern):
+    """
+    将路由模式编译为等价的正则表达式，参数作为命名分组
+    """
+    regex = []
+    for kind, value in parse_pattern(pattern):
+        if kind == 'static':
+            regex.append(re.escape(value))
+        elif kind == '*':
+            regex.append(CONVERTERS['str'][1])
+        else:
+            regex.append('(?P<{:}>{:})'.format(value, CONVERTERS[kind][1]))
+    return re.compile('^/' + '/'.join(regex) + '/?$')
+
+
+class _Node(object):
+    __slots__ = ('static', 'params', 'wildcard', 'rest', 'route')
+
+    def __init__(self):
+        self.static = {}  # 静态路径 -> 子节点
+        self.params = {}  # 参数类型 -> 子节点
+        self.wildcard = None  # '*' 子节点
+        self.rest = None  # path 参数的 (函数, 参数名列表)
+        self.route = None  # 在该节点结束的路由 (函数, 参数名列表)
+
+
+class App(object):
+    def __init__(self):
+        self.__root = _Node()
+        self.__size = 0
+
+    def __len__(self):
+        return self.__size
+
+    def add_route(self, pattern, func):
+        node, names = self.__root, []
+        for kind, value in parse_pattern(pattern):
+            if kind == 'static':
+                node = node.static.setdefault(value, _Node())
+            elif kind == '*':
+                node.wildcard = node.wildcard or _Node()
+                node = node.wildcard
+            elif kind == 'path':
+                names.append(value)
+                self.__size += node.rest is None
+                node.rest = (func, names)
+                return
+            else:
+                names.append(value)
+                node = node.params.setdefault(kind, _Node())
+        self.__size += node.route is None
+        node.route = (func, names)
+
+    def register(self, url):
+        def wrapper(func):
+            """
+            代理方法，将被注解方法按照路由模式存入前缀树，并返回被注解方法本身
+            """
+            self.add_route(url, func)
+            return func
+
+        return wrapper
+
+    def match(self, url):
+        """
+        查找和 url 匹配的函数，返回 (函数, 参数字典)，没有匹配的路由时返回 None
+        """
+        segments = split_url(url)
+        values = []
+        found = self.__match(self.__root, segments, 0, values)
+        if found is None:
+            return None
+        func, names = found
+        return func, dict(zip(names, values))
+
+    def __match(self, node, segments, index, values):
+        if index == len(segments):
+            return node.route
+
+        segment = segments[index]
+        child = node.static.get(segment)
+        if child is not None:
+            found = self.__match(child, segments, index + 1, values)
+            if found is not None:
+                return found
+
+        if node.params:
+            for kind in _PRIORITY:
+                child = node.params.get(kind)
+                if child is None or not _FULLMATCH[kind](segment):
+                    continue
+                try:
+                    value = CONVERTERS[kind][0](segment)
+                except ValueError:
+                    continue
+                values.append(value)
+                found = self.__match(child, segments, index + 1, values)
+                if found is not None:
+                    return found
+                values.pop()
+
+        if node.wildcard is not None:
+            found = self.__match(node.wildcard, segments, index + 1, values)
+            if found is not None:
+                return found
+
+        if node.rest is not None:
+            values.append('/'.join(segments[index:]))
+            return node.rest
+        return None
+
+    def execute(self, url):
+        """
+        根据传入的 url 查找对应的被注解方法，以路径参数作为关键字参数执行该方法
+        """
+        found = self.match(url)
+        if found is None:
+            raise RouteNotFound('function {:} not register'.format(str(url)))
+        func, params = found
+        return func(**params)
@@ -0,0 +1,307 @@
+# coding=utf-8
+from unittest import TestCase
+import asyncio
+import threading
+import time
+
+from decorator.cache import memo, make_key
+
+
+class TestCache(TestCase):
+    def test_cache_function_call(self):
+        """
+        和 test_decorator.py 中的 memo 注解用法相同，递归调用时缓存机制会起作用
+        """
+
+        @memo
+        def fib(n):
+            if n < 2:
+                return n
+            return fib(n - 1) + fib(n - 2)
+
+        self.assertEqual(fib(100), 354224848179261915075)
+
+        info = fib.cache_info()
+        self.assertEqual(info.misses, 101)  # 0 ~ 100 每个值只计算一次
+        self.assertEqual(info.hits, 98)
+
+    def test_lru_eviction(self):
+        """
+        缓存数量超过 maxsize 后，淘汰最久未使用的值
+        """
+        calls = []
+
+        @memo(maxsize=2)
+        def square(n):
+            calls.append(n)
+            return n * n
+
+        square(1)
+        square(2)
+        square(1)  # 1 成为最近使用的值
+        square(3)  # 淘汰 2
+        self.assertEqual(square.cache_info().evictions, 1)
+        self.assertEqual(square.cache_info().currsize, 2)
+
+        square(1)
+        square(2)
+        self.assertEqual(calls, [1, 2, 3, 2])
+
+    def test_global_capacity(self):
+        """
+        maxsize 和 LRU 顺序对所有段都是全局的，不会因为分段提前淘汰，也不会超出 maxsize
+        """
+        calls = []
+
+        @memo(maxsize=4)
+        def square(n):
+            calls.append(n)
+            return n * n
+
+        for n in range(4):
+            square(n)
+        self.assertEqual(square.cache_info()[2:], (0, 4, 4))
+
+        @memo(maxsize=10)
+        def cube(n):
+            calls.append(n)
+            return n ** 3
+
+        for n in range(100):
+            cube(n)
+        self.assertEqual(cube.cache_info()[2:], (90, 10, 10))
+        del calls[:]
+        for n in range(90, 100):
+            cube(n)  # 最近使用的 10 个值仍在缓存中
+        cube(0)
+        self.assertEqual(calls, [0])
+
+    def test_ttl(self):
+        """
+        缓存值超过 ttl 秒后失效，重新调用被注解函数
+        """
+        now = [0.0]
+        calls = []
+
+        @memo(ttl=10, timer=lambda: now[0])
+        def load(name):
+            calls.append(name)
+            return name.upper()
+
+        self.assertEqual(load('a'), 'A')
+        now[0] = 9.9
+        self.assertEqual(load('a'), 'A')
+        now[0] = 10.0
+        self.assertEqual(load('a'), 'A')
+        self.assertEqual(calls, ['a', 'a'])
+
+    def test_kwargs_key(self):
+        """
+        关键字参数参与生成缓存键，且和传入顺序无关
+        """
+        calls = []
+
+        @memo
+        def demo(a, b=0, c=0):
+            calls.append((a, b, c))
+            return a + b + c
+
+        self.assertEqual(demo(1, b=2, c=3), 6)
+        self.assertEqual(demo(1, c=3, b=2), 6)
+        self.assertEqual(demo(1, b=3, c=2), 6)
+        self.assertEqual(calls, [(1, 2, 3), (1, 3, 2)])
+
+        self.assertEqual(make_key((1,), {'b': 2, 'c': 3}), make_key((1,), {'c': 3, 'b': 2}))
+        self.assertNotEqual(make_key((1,), {}), make_key((1.0,), {}, typed=True))
+
+    def test_cache_clear(self):
+        @memo
+        def demo(n):
+            return n
+
+        demo(1)
+        demo(1)
+        demo.cache_clear()
+        self.assertEqual(demo.cache_info(), (0, 0, 0, 128, 0))
+        self.assertEqual(demo.__name__, 'demo')
+
+    def test_thread_safe(self):
+        """
+        多个线程同时访问同一个被缓存的函数，缓存数量和统计结果保持正确
+        """
+
+        @memo(maxsize=64)
+        def double(n):
+            return n * 2
+
+        errors = []
+
+        def runner():
+            for n in range(1000):
+                if double(n % 100) != n % 100 * 2:
+                    errors.append(n)
+
+        threads = [threading.Thread(target=runner) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        info = double.cache_info()
+        self.assertEqual(errors, [])
+        self.assertEqual(info.hits + info.misses, 8000)
+        self.assertLessEqual(info.currsize, 64)
+
+    def test_coalesce(self):
+        """
+        coalesce 模式下，多个线程同时请求同一个键时只计算一次，其余线程共享结果
+        """
+        calls = []
+        started = threading.Event()
+        release = threading.Event()
+
+        @memo(coalesce=True)
+        def load(key):
+            calls.append(key)
+            started.set()
+            release.wait(5)
+            return key.upper()
+
+        results = []
+        leader = threading.Thread(target=lambda: results.append(load('a')))
+        leader.start()
+        started.wait(5)
+        threads = [threading.Thread(target=lambda: results.append(load('a'))) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        # 等全部等待者都开始等待计算者后再放行，否则晚启动的线程可能在计算完成后才调用，直接命中缓存
+        deadline = time.monotonic() + 5
+        while load.cache_info().hits < 8 and time.monotonic() < deadline:
+            time.sleep(0.001)
+        release.set()
+        for thread in [leader] + threads:
+            thread.join()
+
+        self.assertEqual(calls, ['a'])
+        self.assertEqual(results, ['A'] * 9)
+        self.assertEqual(load.cache_info().misses, 1)
+
+    def test_coalesce_exception(self):
+        """
+        计算者抛出的异常会传给所有等待者，并且异常结果不会被缓存
+        """
+        calls = []
+        started = threading.Event()
+        release = threading.Event()
+
+        @memo(coalesce=True)
+        def load(key):
+            calls.append(key)
+            started.set()
+            release.wait(5)
+            raise KeyError(key)
+
+        errors = []
+
+        def runner():
+            try:
+                load('a')
+            except KeyError as e:
+                errors.append(e)
+
+        leader = threading.Thread(target=runner)
+        leader.start()
+        started.wait(5)
+        threads = [threading.Thread(target=runner) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        # 等待者在开始等待计算者时计入命中次数，等它们都开始等待后再放行计算者
+        deadline = time.monotonic() + 5
+        while load.cache_info().hits < 4 and time.monotonic() < deadline:
+            time.sleep(0.001)
+        release.set()
+        for thread in [leader] + threads:
+            thread.join()
+
+        self.assertEqual(calls, ['a'])
+        self.assertEqual(len(errors), 5)
+        self.assertTrue(all(e is errors[0] for e in errors))  # 等待者拿到的是计算者的同一个异常对象
+        self.assertEqual(load.cache_info().currsize, 0)
+
+    def test_coalesce_recursive(self):
+        """
+        coalesce 模式下递归调用不会等待自己
+        """
+
+        @memo(coalesce=True)
+        def fib(n):
+            if n < 2:
+                return n
+            return fib(n - 1) + fib(n - 2)
+
+        self.assertEqual(fib(50), 12586269025)
+
+    def test_coroutine(self):
+        """
+        注解协程函数时缓存的是 await 得到的结果，并发 await 同一个键时只执行一次
+        """
+        calls = []
+
+        @memo
+        async def load(key):
+            calls.append(key)
+            await asyncio.sleep(0.01)
+            return key.upper()
+
+        async def main():
+            first = await asyncio.gather(*[load('a') for _ in range(10)])
+            return first, await load('a')
+
+        first, second = asyncio.run(main())
+        self.assertEqual(first, ['A'] * 10)
+        self.assertEqual(second, 'A')
+        self.assertEqual(calls, ['a'])
+        info = load.cache_info()
+        self.assertEqual((info.hits, info.misses, info.currsize), (10, 1, 1))
+
+    def test_coroutine_exception(self):
+        """
+        协程抛出的异常传给所有并发的等待者，并且不会被缓存
+        """
+        calls = []
+
+        @memo
+        async def load(key):
+            calls.append(key)
+            await asyncio.sleep(0.01)
+            raise KeyError(key)
+
+        async def main():
+            return await asyncio.gather(*[load('a') for _ in range(5)], return_exceptions=True)
+
+        errors = asyncio.run(main())
+        self.assertTrue(all(isinstance(e, KeyError) for e in errors))
+        self.assertEqual(calls, ['a'])
+        self.assertEqual(load.cache_info().currsize, 0)
+
+        self.assertRaises(KeyError, asyncio.run, load('a'))  # 异常没有被缓存，会重新执行
+        self.assertEqual(calls, ['a', 'a'])
+
+    def test_coroutine_cancel(self):
+        """
+        取消一个等待者不会影响其它等待同一个键的调用者
+        """
+
+        @memo
+        async def load(key):
+            await asyncio.sleep(0.01)
+            return key.upper()
+
+        async def main():
+            waiter = asyncio.ensure_future(load('a'))
+            other = asyncio.ensure_future(load('a'))
+            await asyncio.sleep(0)
+            waiter.cancel()
+            return await other
+
+        self.assertEqual(asyncio.run(main()), 'A')
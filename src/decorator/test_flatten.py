@@ -0,0 +1,182 @@
+# coding=utf-8
+from unittest import TestCase
+import asyncio
+import functools
+import inspect
+import io
+import re
+import sys
+
+from decorator import validate
+from decorator.cache import memo
+from decorator.flatten import (Layer, check_layer, fuse, html_tag_layer, log_layer, memo_layer,
+                               not_empty_layer)
+from decorator.logger import Logger
+from decorator.markup import html_tag
+from decorator.validate import EmptyError
+
+
+def depth():
+    """
+    返回调用者所在的栈帧深度
+    """
+    frame, n = sys._getframe(1), 0
+    while frame:
+        frame, n = frame.f_back, n + 1
+    return n
+
+
+class TestFlatten(TestCase):
+    def test_fuse_single_frame(self):
+        """
+        多层注解合并后，被注解函数和调用者之间只有一个代理函数的栈帧，逐个叠加 Layer 时同样会被合并
+        """
+        base = depth()
+
+        def demo():
+            return str(depth() - base)
+
+        stacked = html_tag_layer('b')(not_empty_layer()(memo_layer()(demo)))
+        fused = fuse(html_tag_layer('b'), not_empty_layer(), memo_layer())(demo)
+
+        self.assertEqual(demo(), '1')
+        self.assertEqual(stacked(), '<b>2</b>')
+        self.assertEqual(fused(), '<b>2</b>')
+        self.assertEqual(fused.__name__, 'demo')
+        self.assertIs(fused.__wrapped__, demo)
+
+    def test_same_behaviour_as_stacking(self):
+        """
+        fuse(a, b)(fn) 和 a(b(fn)) 的行为相同，缓存命中时外层的日志仍被记录，参数为空时内层不被调用
+        """
+        calls = []
+
+        def square(n):
+            calls.append(n)
+            return str(n * n)
+
+        for make in (lambda layers: fuse(*layers),
+                     lambda layers: lambda fn: layers[0](layers[1](layers[2](layers[3](fn))))):
+            del calls[:]
+            sio = io.StringIO()
+            with Logger(sio) as logger:
+                demo = make([log_layer(logger), html_tag_layer('td', clazz='cell'), not_empty_layer(),
+                             memo_layer()])(square)
+
+                self.assertEqual(demo(3), '<td class="cell">9</td>')
+                self.assertEqual(demo(3), '<td class="cell">9</td>')
+                self.assertEqual(demo(n=4), '<td class="cell">16</td>')
+                self.assertEqual(calls, [3, 4])
+                with self.assertRaises(EmptyError):
+                    demo('')
+
+            self.assertEqual(sio.getvalue().count('function=square'), 3)
+            self.assertTrue(sio.getvalue().startswith('function=square\narguments=(3,) {}\nreturn=<td'))
+
+    def test_same_behaviour_as_decorators(self):
+        """
+        各个 Layer 与对应的注解（Logger、html_tag、validate、memo）行为相同：返回值、异常及其消息、
+        缓存统计和日志都一致
+        """
+
+        def run(decorate):
+            calls, sio = [], io.StringIO()
+            with Logger(sio) as logger:
+                @decorate(logger)
+                def cell(name, n, title='-', *, sep=': '):
+                    calls.append((name, n))
+                    return [title, name, sep, str(n)]
+
+                outcomes = []
+                for args, kwargs in [(('a', 1), {}), (('a', 1), {}), (('a',), {'n': 1}), (('b', 2), {'title': 'x'}),
+                                     (('', 1), {}), (('c', '1'), {}), (('c', 11), {}), (('d', 3), {'sep': ''}),
+                                     (('d', 3), {'title': ''}), ((None, 3), {})]:
+                    try:
+                        outcomes.append(cell(*args, **kwargs))
+                    except Exception as e:
+                        outcomes.append((type(e), str(e)))
+                outcomes.append(cell.cache_info())
+            return outcomes, calls, re.sub(r'time=.* sec\n', '', sio.getvalue())
+
+        fused = run(lambda logger: fuse(log_layer(logger), html_tag_layer('td', clazz='cell'), not_empty_layer(),
+                                        check_layer(validate.typed(n=int)),
+                                        check_layer(validate.in_range('n', 0, 10)), memo_layer(maxsize=2)))
+        stacked = run(lambda logger: lambda fn: logger(html_tag('td', clazz='cell')(
+            validate.not_empty(validate.typed(n=int)(validate.in_range('n', 0, 10)(memo(maxsize=2)(fn)))))))
+        self.assertEqual(fused, stacked)
+        self.assertEqual(fused[0][-1], (2, 3, 1, 2, 2))  # 校验注解按签名整理参数，cell('a', n=1) 同样命中
+        self.assertEqual(len(fused[1]), 3)
+        self.assertIn((EmptyError, 'name must not be empty'), fused[0])
+        self.assertIn((EmptyError, 'sep must not be empty'), fused[0])
+        self.assertIn((TypeError, 'n must be int, got str'), fused[0])
+
+    def test_coroutine(self):
+        """
+        被注解函数是协程函数时，合并后的代理函数同样是协程函数，缓存的是 await 得到的结果
+        """
+        calls = []
+
+        @fuse(html_tag_layer('b'), not_empty_layer(), memo_layer())
+        async def demo(s):
+            calls.append(s)
+            await asyncio.sleep(0)
+            return s
+
+        self.assertTrue(inspect.iscoroutinefunction(demo))
+
+        async def main():
+            self.assertEqual(await demo('x'), '<b>x</b>')
+            self.assertEqual(await demo('x'), '<b>x</b>')
+            with self.assertRaises(EmptyError):
+                await demo('')
+
+        asyncio.run(main())
+        self.assertEqual(calls, ['x'])
+        self.assertEqual(demo.cache_info().hits, 1)
+
+    def test_fuse_fused(self):
+        """
+        对 fuse 的结果再次 fuse，与原有的层合并为一个代理函数
+        """
+
+        def demo():
+            return 'x'
+
+        fused = fuse(html_tag_layer('i'))(fuse(html_tag_layer('b'))(demo))
+        self.assertEqual(fused(), '<i><b>x</b></i>')
+        self.assertIs(fused.__wrapped__, demo)
+        self.assertEqual(len(fused.__fused__[1]), 2)
+
+    def test_fuse_wrapped(self):
+        """
+        被其它注解（functools.wraps 复制了 __fused__）包装后再 fuse，不会跳过中间的注解；被注解函数可以是 lambda
+        """
+        calls = []
+
+        def logged(fn):
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                calls.append(args)
+                return fn(*args, **kwargs)
+
+            return wrapper
+
+        demo = html_tag_layer('p')(logged(memo_layer()(lambda x: str(x))))
+        self.assertEqual(demo(1), '<p>1</p>')
+        self.assertEqual(demo(1), '<p>1</p>')
+        self.assertEqual(calls, [(1,), (1,)])
+        self.assertEqual(demo.__name__, '<lambda>')
+
+    def test_custom_layer(self):
+        """
+        自定义 Layer，修改传入被注解函数的参数
+        """
+        name_layer = Layer(before='''
+            kwargs['name'] = {v}name
+        ''', setup=lambda fn: {'name': 'Alvin'})
+
+        @name_layer
+        def demo(**kwargs):
+            return kwargs
+
+        self.assertEqual(demo(no=1001), {'name': 'Alvin', 'no': 1001})
@@ -0,0 +1,205 @@
+# coding=utf-8
+from unittest import TestCase
+import asyncio
+import io
+import sys
+import threading
+
+from decorator.logger import Logger
+
+
+class BlockingIO(io.StringIO):
+    """
+    write 方法在 event 被设置前一直阻塞，用于模拟写入缓慢的文件
+    """
+
+    def __init__(self, event):
+        super(BlockingIO, self).__init__()
+        self.__event = event
+
+    def write(self, s):
+        self.__event.wait()
+        return super(BlockingIO, self).write(s)
+
+
+class TestLogger(TestCase):
+    def test_use_log(self):
+        """
+        和 test_decorator.py 中 test_use_log 的日志格式相同，但日志由后台线程写入
+        """
+        sio = io.StringIO()
+        with Logger(sio) as logger:
+            @logger
+            def multiply(x, y):
+                return x * y
+
+            self.assertEqual(multiply(10, 20), 200)
+
+        sio.seek(0)
+        self.assertEqual(sio.readline(), 'function=multiply\n')
+        self.assertEqual(sio.readline(), 'arguments=(10, 20) {}\n')
+        self.assertEqual(sio.readline(), 'return=200\n')
+        self.assertTrue(sio.readline().startswith('time='))
+        self.assertEqual(logger.stats.written, 1)
+
+    def test_coroutine(self):
+        """
+        注解协程函数时记录的是 await 得到的返回值
+        """
+        sio = io.StringIO()
+        with Logger(sio) as logger:
+            @logger
+            async def multiply(x, y):
+                await asyncio.sleep(0)
+                return x * y
+
+            self.assertTrue(asyncio.iscoroutinefunction(multiply))
+            self.assertEqual(asyncio.run(multiply(10, 20)), 200)
+
+        self.assertIn('return=200\n', sio.getvalue())
+        self.assertEqual(logger.stats.written, 1)
+
+    def test_flush(self):
+        sio = io.StringIO()
+        with Logger(sio, flush_interval=60) as logger:
+            @logger
+            def echo(n):
+                return n
+
+            for n in range(10):
+                echo(n)
+            self.assertTrue(logger.flush(timeout=5))
+            self.assertEqual(sio.getvalue().count('function=echo'), 10)
+
+    def test_flush_writing(self):
+        """
+        后台线程已经从缓冲区取出、但还没有写完的记录，flush() 同样要等待
+        """
+        writing, event = threading.Event(), threading.Event()
+
+        class SlowIO(BlockingIO):
+            def write(self, s):
+                writing.set()
+                return super(SlowIO, self).write(s)
+
+        sio = SlowIO(event)
+        with Logger(sio, flush_interval=0.01) as logger:
+            @logger
+            def echo(n):
+                return n
+
+            echo(1)
+            self.assertTrue(writing.wait(5))
+            self.assertFalse(logger.flush(timeout=0.05))
+            self.assertEqual(logger.stats.pending, 1)
+            threading.Timer(0.05, event.set).start()
+            self.assertTrue(logger.flush(timeout=5))
+            self.assertIn('return=1\n', sio.getvalue())
+
+    def test_write_error(self):
+        """
+        格式化或写入出错的记录计为丢弃，后台线程继续写入后面的记录
+        """
+
+        class Unprintable(object):
+            def __format__(self, spec):
+                raise ValueError('unprintable')
+
+        class FailingIO(io.StringIO):
+            def write(self, s):
+                if 'fail' in s:
+                    raise IOError('disk full')
+                return super(FailingIO, self).write(s)
+
+        sio = FailingIO()
+        with Logger(sio, batch_size=1) as logger:
+            @logger
+            def echo(n):
+                return n
+
+            echo(Unprintable())
+            self.assertTrue(logger.flush(timeout=5))
+            echo('fail')
+            self.assertTrue(logger.flush(timeout=5))
+            echo('ok')
+            self.assertTrue(logger.flush(timeout=5))
+            self.assertEqual(logger.stats, (1, 2, 0, 0))
+
+        self.assertIn('return=ok\n', sio.getvalue())
+        self.assertNotIn('fail', sio.getvalue())
+
+    def test_sample_rate(self):
+        """
+        sample_rate 为 0 时不记录任何调用
+        """
+        sio = io.StringIO()
+        with Logger(sio, sample_rate=0) as logger:
+            @logger
+            def echo(n):
+                return n
+
+            for n in range(100):
+                self.assertEqual(echo(n), n)
+
+        self.assertEqual(sio.getvalue(), '')
+        self.assertEqual(logger.stats.sampled_out, 100)
+
+    def test_backpressure(self):
+        """
+        后台线程写入缓慢时，缓冲区满后新的记录被丢弃，调用者不会被阻塞
+        """
+        event = threading.Event()
+        stream = BlockingIO(event)
+        logger = Logger(stream, capacity=10, batch_size=1, flush_interval=0.01)
+        try:
+            @logger
+            def echo(n):
+                return n
+
+            for n in range(100):
+                echo(n)
+            stats = logger.stats
+            self.assertGreaterEqual(stats.dropped, 100 - 10 - 1)  # 后台线程最多取走一条正在写入的记录
+        finally:
+            event.set()
+            logger.close()
+
+        stats = logger.stats
+        self.assertEqual(stats.written + stats.dropped, 100)
+        self.assertEqual(stats.pending, 0)
+
+    def test_concurrent_close(self):
+        """
+        多个线程同时调用并在中途 close，每次调用都恰好计入写入、丢弃或未采样之一，没有留在缓冲区中的记录
+        """
+        sio = io.StringIO()
+        logger = Logger(sio, capacity=50, batch_size=10, flush_interval=0.001, sample_rate=0.5)
+
+        @logger
+        def echo(n):
+            return n
+
+        started = threading.Barrier(9)
+
+        def runner():
+            started.wait(5)
+            for n in range(2000):
+                echo(n)
+
+        interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)  # 频繁切换线程，让计数的读写和 close 更容易交错
+        try:
+            threads = [threading.Thread(target=runner) for _ in range(8)]
+            for thread in threads:
+                thread.start()
+            started.wait(5)
+            logger.close()
+            for thread in threads:
+                thread.join()
+        finally:
+            sys.setswitchinterval(interval)
+
+        stats = logger.stats
+        self.assertEqual(stats.written + stats.dropped + stats.sampled_out, 8 * 2000)
+        self.assertEqual(stats.pending, 0)
+        self.assertEqual(sio.getvalue().count('function=echo'), stats.written)
@@ -0,0 +1,101 @@
+# coding=utf-8
+from unittest import TestCase
+import asyncio
+import io
+
+from decorator.markup import html_tag, iter_chunks, render
+
+
+class TestMarkup(TestCase):
+    def test_decorator_with_arguments(self):
+        """
+        和 test_decorator.py 中 html_tag 注解的输出相同
+        """
+
+        @html_tag(tag_name='div', style='display:block', clazz='col-md-2')
+        def demo1():
+            return 'Hello'
+
+        self.assertEqual(demo1(), '<div class="col-md-2" style="display:block">Hello</div>')
+
+        @html_tag(tag_name='div', click='alter(\"ok\")')
+        def demo2():
+            return ''
+
+        self.assertEqual(demo2(), '<div click=\'alter("ok")\'/>')
+        self.assertEqual(demo2.__name__, 'demo2')
+
+    def test_nested(self):
+        """
+        被注解函数可以返回列表或生成器，嵌套其它被注解函数的 stream 结果
+        """
+
+        @html_tag('li')
+        def item(n):
+            return str(n)
+
+        @html_tag('ul', clazz='list')
+        def items(count):
+            for n in range(count):
+                yield item.stream(n)
+
+        @html_tag('body')
+        def body():
+            return ['<h1>Title</h1>', items.stream(3), None, items.stream(0)]
+
+        self.assertEqual(body(), '<body><h1>Title</h1><ul class="list"><li>0</li><li>1</li><li>2</li></ul>'
+                                 '<ul class="list"/></body>')
+        self.assertEqual(''.join(body.stream()), body())
+
+    def test_coroutine(self):
+        """
+        注解协程函数时，注解后的函数和 stream 都需要 await
+        """
+
+        @html_tag('li')
+        async def item(text):
+            await asyncio.sleep(0)
+            return text
+
+        @html_tag('ul')
+        async def items():
+            return [await item.stream('a'), await item.stream('b')]
+
+        self.assertEqual(asyncio.run(item('a')), '<li>a</li>')
+        self.assertEqual(asyncio.run(items()), '<ul><li>a</li><li>b</li></ul>')
+        self.assertEqual(items.__name__, 'items')
+
+    def test_iter_chunks(self):
+        self.assertEqual(list(iter_chunks('abc')), ['abc'])
+        self.assertEqual(list(iter_chunks(['a', ['b', ('c', iter(['d']))], '', 'e'])), ['a', 'b', 'c', 'd', 'e'])
+
+        deep = 'x'
+        for _ in range(5000):  # 嵌套层数超过递归深度限制
+            deep = [deep]
+        self.assertEqual(list(iter_chunks(deep)), ['x'])
+
+    def test_render(self):
+        """
+        render 将生成器产生的内容分批写入流
+        """
+
+        class CountingIO(io.StringIO):
+            writes = 0
+
+            def write(self, s):
+                CountingIO.writes += 1
+                return super(CountingIO, self).write(s)
+
+        @html_tag('p')
+        def paragraph(n):
+            return 'paragraph {:}'.format(n)
+
+        @html_tag('html')
+        def document(count):
+            return (paragraph.stream(n) for n in range(count))
+
+        sio = CountingIO()
+        size = render(document.stream(1000), sio, buffer_size=4096)
+        self.assertEqual(sio.getvalue(), document(1000))
+        self.assertEqual(size, len(sio.getvalue()))
+        self.assertLess(CountingIO.writes, 10)
@@ -0,0 +1,153 @@
+# coding=utf-8
+from unittest import TestCase
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+
+from decorator.persist import Store, persist, stable_key
+
+
+class TestPersist(TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.file_name = os.path.join(self.path, 'memo.db')
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_persist_between_stores(self):
+        """
+        缓存保存在文件中，使用同一文件的另一个 Store 对象（例如另一个进程）可以直接命中缓存
+        """
+        calls = []
+
+        def square(n):
+            calls.append(n)
+            return n * n
+
+        store1 = Store(self.file_name)
+        self.assertEqual(persist(store1)(square)(10), 100)
+        store1.close()
+
+        store2 = Store(self.file_name)
+        cached = persist(store2)(square)
+        self.assertEqual(cached(10), 100)
+        self.assertEqual(cached(11), 121)
+        self.assertEqual(calls, [10, 11])
+        self.assertEqual(cached.cache_info().hits, 1)
+        self.assertEqual(cached.cache_info().currsize, 2)
+        store2.close()
+
+    def test_stable_key(self):
+        """
+        缓存键与关键字参数顺序无关，不同函数的缓存键不同
+        """
+
+        def f1():
+            pass
+
+        def f2():
+            pass
+
+        self.assertEqual(stable_key(f1, (1,), {'a': 1, 'b': 2}), stable_key(f1, (1,), {'b': 2, 'a': 1}))
+        self.assertNotEqual(stable_key(f1, (1,), {}), stable_key(f2, (1,), {}))
+        self.assertNotEqual(stable_key(f1, (1,), {}), stable_key(f1, (2,), {}))
+
+    def test_stable_key_unordered(self):
+        """
+        set、frozenset 和 dict 参数的缓存键与元素的顺序无关，不同进程（str 的哈希随机化不同）中也相同
+        """
+
+        def f():
+            pass
+
+        self.assertEqual(stable_key(f, ({'a': 1, 'b': 2},), {}), stable_key(f, ({'b': 2, 'a': 1},), {}))
+        self.assertNotEqual(stable_key(f, ({1, 2},), {}), stable_key(f, (frozenset([1, 2]),), {}))
+        self.assertNotEqual(stable_key(f, ({1, 2},), {}), stable_key(f, ((1, 2),), {}))
+
+        code = ('from decorator.persist import stable_key\n'
+                'print(stable_key(stable_key, ({"a", "b", "c", "d"}, [frozenset("xyz")]), {"k": {"m", "n"}}))')
+        keys = set()
+        for seed in range(1, 6):
+            env = dict(os.environ, PYTHONHASHSEED=str(seed))
+            keys.add(subprocess.check_output([sys.executable, '-c', code], env=env,
+                                             cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+        self.assertEqual(len(keys), 1)
+
+    def test_eviction(self):
+        """
+        记录数超过 maxsize 后，淘汰最久未使用的记录
+        """
+        store = Store(self.file_name, maxsize=5, touch_interval=0, check_interval=1)
+
+        @persist(store)
+        def echo(n):
+            return n
+
+        for n in range(10):
+            echo(n)
+        self.assertEqual(len(store), 5)
+        self.assertEqual(echo.cache_info().evictions, 5)
+        self.assertIsNone(store.get(stable_key(echo.__wrapped__, (0,), {})))
+        store.close()
+
+    def test_threads(self):
+        """
+        每个线程使用各自的数据库连接，多个线程可以同时读写同一个缓存文件
+        """
+        store = Store(self.file_name)
+
+        @persist(store)
+        def double(n):
+            return [n * 2]
+
+        errors = []
+
+        def runner():
+            for n in range(50):
+                if double(n) != [n * 2]:
+                    errors.append(n)
+
+        threads = [threading.Thread(target=runner) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(len(store), 50)
+        store.close()
+
+    def test_close_all_threads(self):
+        """
+        close 关闭所有线程建立的连接，之后各线程重新建立连接
+        """
+        store = Store(self.file_name)
+
+        @persist(store)
+        def double(n):
+            return n * 2
+
+        opened, closed, results = threading.Event(), threading.Event(), []
+
+        def runner():
+            results.append(double(1))
+            opened.set()
+            closed.wait(5)
+            results.append(double(2))
+
+        thread = threading.Thread(target=runner)
+        thread.start()
+        opened.wait(5)
+        # 最后一个连接关闭时 sqlite 删除 WAL 文件，其它线程的连接仍然打开时不会删除
+        self.assertTrue(os.path.exists(self.file_name + '-wal'))
+        store.close()
+        self.assertFalse(os.path.exists(self.file_name + '-wal'))
+        closed.set()
+        thread.join()
+        self.assertEqual(results, [2, 4])
+        store.close()
+        self.assertFalse(os.path.exists(self.file_name + '-wal'))
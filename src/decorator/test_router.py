@@ -0,0 +1,125 @@
+# coding=utf-8
+from unittest import TestCase
+
+from decorator.router import App, RouteNotFound, compile_regex
+
+
+class TestRouter(TestCase):
+    def test_static_route(self):
+        """
+        和 test_decorator.py 中 test_router 的用法相同
+        """
+        app = App()
+
+        @app.register('/')
+        def main_page():
+            return 'The main page'
+
+        @app.register('/next')
+        def next_page():
+            return 'The next page'
+
+        self.assertEqual(app.execute('/'), 'The main page')
+        self.assertEqual(app.execute('/next'), 'The next page')
+        self.assertEqual(app.execute('/next/'), 'The next page')
+        self.assertEqual(len(app), 2)
+
+        with self.assertRaises(RouteNotFound):
+            app.execute('/prev')
+
+    def test_path_parameters(self):
+        """
+        路径参数按类型转换后，作为关键字参数传入被注解函数
+        """
+        app = App()
+
+        @app.register('/user/<id:int>')
+        def user(id):
+            return 'user', id
+
+        @app.register('/user/<name>')
+        def user_by_name(name):
+            return 'name', name
+
+        @app.register('/user/<id:int>/posts/<page:int>')
+        def posts(id, page):
+            return 'posts', id, page
+
+        @app.register('/price/<value:float>')
+        def price(value):
+            return value
+
+        self.assertEqual(app.execute('/user/100'), ('user', 100))
+        self.assertEqual(app.execute('/user/alvin'), ('name', 'alvin'))
+        self.assertEqual(app.execute('/user/100/posts/2'), ('posts', 100, 2))
+        self.assertEqual(app.execute('/price/1.5'), 1.5)
+
+        with self.assertRaises(RouteNotFound):
+            app.execute('/user/alvin/posts/2')
+
+    def test_converter_patterns(self):
+        """
+        int 和 float 参数必须完整匹配转换器的模式，与 compile_regex 生成的正则表达式结果相同
+        """
+        app = App()
+        app.add_route('/user/<id:int>', lambda id: id)
+        app.add_route('/v/<value:float>', lambda value: value)
+        user, value = compile_regex('/user/<id:int>'), compile_regex('/v/<value:float>')
+
+        for url in ('/user/1_000', '/user/ 7', '/user/\u0661\u0662', '/v/nan', '/v/inf', '/v/1e5', '/v/1_0',
+                    '/v/1.2.3', '/v/.', '/v/-'):
+            self.assertIsNone(app.match(url), url)
+            self.assertIsNone((user if url.startswith('/user') else value).match(url), url)
+        self.assertEqual(app.execute('/user/-7'), -7)
+        self.assertEqual(app.execute('/v/+1.5'), 1.5)
+        for url, expected in (('/v/.5', 0.5), ('/v/-1.', -1.0), ('/v/3', 3.0)):
+            self.assertEqual(app.execute(url), expected)
+            self.assertEqual(float(value.match(url).group('value')), expected)
+
+    def test_static_before_parameters(self):
+        """
+        静态路径优先于参数，匹配失败时回溯到其它候选节点
+        """
+        app = App()
+        app.add_route('/user/me', lambda: 'me')
+        app.add_route('/user/<name>', lambda name: name)
+        app.add_route('/user/me/<tab>/edit', lambda tab: 'edit ' + tab)
+        app.add_route('/user/<name>/<tab>', lambda name, tab: name + ' ' + tab)
+
+        self.assertEqual(app.execute('/user/me'), 'me')
+        self.assertEqual(app.execute('/user/you'), 'you')
+        self.assertEqual(app.execute('/user/me/info/edit'), 'edit info')
+        self.assertEqual(app.execute('/user/me/info'), 'me info')
+
+    def test_wildcards(self):
+        """
+        '*' 匹配任意一段路径，path 类型参数匹配剩余的全部路径
+        """
+        app = App()
+        app.add_route('/user/*/profile', lambda: 'profile')
+        app.add_route('/static/<file:path>', lambda file: file)
+
+        self.assertEqual(app.execute('/user/100/profile'), 'profile')
+        self.assertEqual(app.execute('/static/js/lib/app.js'), 'js/lib/app.js')
+
+        with self.assertRaises(RouteNotFound):
+            app.execute('/user/100/200/profile')
+        with self.assertRaises(RouteNotFound):
+            app.execute('/static')
+
+    def test_invalid_patterns(self):
+        app = App()
+        with self.assertRaises(ValueError):
+            app.add_route('/user/<id:long>', lambda id: id)
+        with self.assertRaises(ValueError):
+            app.add_route('/file/<path:path>/edit', lambda path: path)
+        with self.assertRaises(ValueError):
+            app.add_route('/file/name.<ext>', lambda ext: ext)
+
+    def test_compile_regex(self):
+        """
+        compile_regex 将路由模式编译为等价的正则表达式
+        """
+        regex = compile_regex('/user/<id:int>/*/<file:path>')
+        self.assertEqual(regex.match('/user/100/x/a/b.txt').groupdict(), {'id': '100', 'file': 'a/b.txt'})
+        self.assertIsNone(regex.match('/user/alvin/x/a'))
@@ -0,0 +1,80 @@
+# coding=utf-8
+from unittest import TestCase
+
+from decorator import timing
+
+
+def timed_as(name):
+    timing.REGISTRY.pop(name, None)  # 每次测试使用新的直方图
+    return timing.timed(name=name)
+
+
+class TestTiming(TestCase):
+    def tearDown(self):
+        timing.set_enabled(True)
+
+    def test_bucket(self):
+        """
+        每个值都落在其所属桶的范围内，且桶的相对误差不超过 1/16
+        """
+        for value in list(range(0, 2000)) + [12345, 10 ** 6, 10 ** 9 + 7, 2 ** 62 + 1]:
+            lower, upper = timing.bucket_range(timing.bucket_index(value))
+            self.assertTrue(lower <= value <= upper)
+            self.assertLessEqual(upper - lower, max(0, lower / 16.0))
+
+        # 桶的编号是连续的
+        for index in range(1, 1000):
+            self.assertEqual(timing.bucket_range(index)[0], timing.bucket_range(index - 1)[1] + 1)
+
+    def test_percentile(self):
+        h = timing.Histogram()
+        for value in range(1, 1001):
+            h.record(value * 1000)
+
+        self.assertEqual(h.count, 1000)
+        self.assertAlmostEqual(h.max, 1000000, delta=1000000 / 16)
+        self.assertAlmostEqual(h.min, 1000, delta=1000 / 16)
+        self.assertAlmostEqual(h.mean, 500500, delta=500500 / 16)
+        self.assertAlmostEqual(h.percentile(50), 500000, delta=500000 / 16)
+        self.assertAlmostEqual(h.percentile(99), 990000, delta=990000 / 16)
+        self.assertEqual(h.percentile(100), h.max)
+
+    def test_timed(self):
+        """
+        被注解函数的每次调用都被记录到以函数名命名的直方图中
+        """
+
+        @timed_as('test.demo')
+        def demo(x):
+            return x * 2
+
+        for n in range(10):
+            self.assertEqual(demo(n), n * 2)
+        self.assertEqual(demo.__name__, 'demo')
+        self.assertEqual(demo.histogram.count, 10)
+
+        summary = [s for s in timing.report() if s['name'] == 'test.demo'][0]
+        self.assertEqual(summary['count'], 10)
+        self.assertLessEqual(summary['p50'], summary['p99'])
+        self.assertLessEqual(summary['p99'], summary['max'])
+
+    def test_disabled(self):
+        """
+        统计关闭后，注解直接返回函数本身，之前被注解的函数也不再计时
+        """
+
+        @timed_as('test.enabled')
+        def enabled():
+            pass
+
+        timing.set_enabled(False)
+
+        @timing.timed
+        def disabled():
+            pass
+
+        self.assertFalse(hasattr(disabled, 'histogram'))
+        self.assertFalse(hasattr(disabled, '__wrapped__'))
+
+        enabled()
+        self.assertEqual(enabled.histogram.count, 0)
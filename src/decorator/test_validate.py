@@ -0,0 +1,181 @@
+# coding=utf-8
+from unittest import TestCase
+import asyncio
+import functools
+import inspect
+
+from decorator import validate
+from decorator.cache import memo
+from decorator.validate import EmptyError, RangeError, in_range, not_empty, typed
+
+
+class TestValidate(TestCase):
+    def tearDown(self):
+        validate.set_enabled(True)
+
+    def test_wrapper_class_method(self):
+        """
+        和 test_decorator.py 中 not_empty 注解的用法相同
+        """
+
+        # noinspection PyUnusedLocal
+        class A(object):
+            @not_empty
+            def test(self, name):
+                return True
+
+        a = A()
+        self.assertTrue(a.test('Alvin'))
+        self.assertTrue(a.test(None))
+
+        with self.assertRaises(EmptyError):
+            a.test('')
+        with self.assertRaises(EmptyError):
+            a.test(name='')
+
+    def test_same_signature(self):
+        """
+        代理函数的参数列表与被注解函数完全相同，默认值、可变参数、仅限关键字参数都被保留
+        """
+
+        def demo(a, b=10, *args, c, d=None, **kwargs):
+            return a, b, args, c, d, kwargs
+
+        wrapped = not_empty('a', 'c')(demo)
+        self.assertEqual(inspect.signature(wrapped), inspect.signature(demo))
+        self.assertEqual(wrapped.__name__, 'demo')
+        self.assertEqual(wrapped(1, c=2), (1, 10, (), 2, None, {}))
+        self.assertEqual(wrapped(1, 2, 3, 4, c=5, d=6, e=7), (1, 2, (3, 4), 5, 6, {'e': 7}))
+
+        with self.assertRaises(TypeError):
+            wrapped(1)  # 缺少参数 c，和直接调用 demo 的行为相同
+        with self.assertRaises(EmptyError):
+            wrapped([], c=1)
+
+        def positional(a, b, /, c):
+            return a, b, c
+
+        wrapped = not_empty('a')(positional)
+        self.assertEqual(wrapped(1, 2, c=3), (1, 2, 3))
+        with self.assertRaises(TypeError):
+            wrapped(a=1, b=2, c=3)
+
+    def test_typed_and_range(self):
+        @typed(name=str, age=(int, float))
+        @in_range('age', 0, 150)
+        def person(name, age):
+            return name, age
+
+        self.assertEqual(person('Alvin', 30), ('Alvin', 30))
+        self.assertEqual(person('Alvin', age=30.5), ('Alvin', 30.5))
+
+        with self.assertRaises(TypeError):
+            person(100, 30)
+        with self.assertRaises(TypeError):
+            person('Alvin', '30')
+        with self.assertRaises(RangeError):
+            person('Alvin', 151)
+
+        @in_range('n', low=0)
+        def positive(n):
+            return n
+
+        self.assertEqual(positive(10 ** 10), 10 ** 10)
+        with self.assertRaises(RangeError):
+            positive(-1)
+
+    def test_merge_validators(self):
+        """
+        叠加的校验注解被合并为一个代理函数
+        """
+
+        def demo(name, age):
+            return name, age
+
+        wrapped = not_empty('name')(in_range('age', 0, 150)(demo))
+        self.assertIs(wrapped.__wrapped__, demo)
+        self.assertEqual(len(wrapped.__validation__[1]), 2)
+
+    def test_merge_keeps_other_decorators(self):
+        """
+        两个校验注解之间的其它注解（functools.wraps 复制了 __validation__）不会被合并掉
+        """
+        calls = []
+
+        def logged(fn):
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                calls.append(args)
+                return fn(*args, **kwargs)
+
+            return wrapper
+
+        @not_empty('s')
+        @logged
+        @in_range('n', 0, 10)
+        def demo(s, n):
+            return s * n
+
+        self.assertEqual(demo('a', 3), 'aaa')
+        self.assertEqual(calls, [('a', 3)])
+        self.assertRaises(EmptyError, demo, '', 3)
+        self.assertRaises(RangeError, demo, 'a', 11)
+
+    def test_builtin_names(self):
+        """
+        参数名与 isinstance、type 等内置名称相同，被注解函数为 lambda
+        """
+
+        @typed(type=str, isinstance=int)
+        def demo(type, isinstance):
+            return type * isinstance
+
+        self.assertEqual(demo('a', 2), 'aa')
+        with self.assertRaises(TypeError):
+            demo(1, 2)
+
+        square = in_range('n', 0)(lambda n: n * n)
+        self.assertEqual(square(3), 9)
+        self.assertEqual(square.__name__, '<lambda>')
+        self.assertRaises(RangeError, square, -1)
+
+    def test_coroutine(self):
+        """
+        协程函数的代理函数也是协程函数，叠加 memo 后缓存的是 await 得到的结果，而不是协程对象
+        """
+        calls = []
+
+        @memo
+        @typed(x=int)
+        async def double(x):
+            calls.append(x)
+            await asyncio.sleep(0)
+            return x * 2
+
+        self.assertTrue(inspect.iscoroutinefunction(double))
+
+        async def main():
+            self.assertEqual(await double(1), 2)
+            self.assertEqual(await double(1), 2)
+            with self.assertRaises(TypeError):
+                await double('1')
+
+        asyncio.run(main())
+        self.assertEqual(calls, [1])
+
+    def test_invalid_parameter(self):
+        with self.assertRaises(ValueError):
+            not_empty('nothing')(lambda name: name)
+
+    def test_disabled(self):
+        """
+        关闭校验后，注解直接返回被注解函数本身
+        """
+        validate.set_enabled(False)
+
+        def demo(name):
+            return name
+
+        self.assertIs(not_empty('name')(demo), demo)
+        self.assertIs(not_empty(demo), demo)
+        self.assertEqual(not_empty(demo)(''), '')
@@ -0,0 +1,167 @@
+# coding=utf-8
+"""
+由 test_decorator.py 中 decorator1/decorator2（functools.wraps）发展而来的耗时统计注解
+
+@timed 注解记录被注解函数每次调用的耗时（纳秒），存入按对数分桶的直方图（与 HdrHistogram 的思路相同）：
+    小于 2^SUB_BITS 的值每个值一个桶；更大的值按 2 的幂分段，每段再等分为 2^(SUB_BITS-1) 个桶，
+    所以每个桶的相对误差不超过 1/2^(SUB_BITS-1)，而桶的总数只与值的位数有关
+记录一次耗时只需要几次整数运算和一次列表下标访问，不加锁（多线程并发记录时计数可能有极少量误差），
+调用次数、最小值、最大值等统计值在读取时才由各桶的计数求得，所以 min/max 同样有上述的相对误差
+所有直方图按名称保存在 REGISTRY 中，可以通过 report() 获取 p50、p99、max 和调用次数
+
+调用 set_enabled(False) 或设置环境变量 TIMED=0 后：
+    1. 之后被注解的函数直接返回函数本身，没有任何额外开销；
+    2. 之前已被注解的函数不再计时，只多一次全局状态的判断
+"""
+import functools
+import os
+import time
+
+SUB_BITS = 5
+_HALF = 1 << (SUB_BITS - 1)
+
+REGISTRY = {}
+
+_state = {'enabled': os.environ.get('TIMED', '1') != '0'}
+
+
+def set_enabled(enabled):
+    _state['enabled'] = bool(enabled)
+
+
+def is_enabled():
+    return _state['enabled']
+
+
+def bucket_index(value):
+    if value < (1 << SUB_BITS):
+        return value
+    e = value.bit_length() - SUB_BITS
+    return e * _HALF + (value >> e)
+
+
+def bucket_range(index):
+    """
+    返回桶所包含的值的范围 [lower, upper]
+    """
+    if index < (1 << SUB_BITS):
+        return index, index
+    e = index // _HALF - 1
+    m = index - e * _HALF
+    return m << e, ((m + 1) << e) - 1
+
+
+class Histogram(object):
+    def __init__(self, name=None):
+        self.name = name
+        self.counts = [0] * ((64 - SUB_BITS + 2) * _HALF)  # 足以容纳 64 位的纳秒值
+
+    def record(self, value):
+        e = value.bit_length() - SUB_BITS
+        if e > 0:
+            self.counts[e * _HALF + (value >> e)] += 1
+        else:
+            self.counts[value] += 1
+
+    @property
+    def count(self):
+        return sum(self.counts)
+
+    @property
+    def min(self):
+        for index, n in enumerate(self.counts):
+            if n:
+                return bucket_range(index)[0]
+        return 0
+
+    @property
+    def max(self):
+        for index in range(len(self.counts) - 1, -1, -1):
+            if self.counts[index]:
+                return bucket_range(index)[1]
+        return 0
+
+    @property
+    def mean(self):
+        count = total = 0
+        for index, n in enumerate(self.counts):
+            if n:
+                lower, upper = bucket_range(index)
+                count += n
+                total += n * (lower + upper) / 2.0
+        return total / count if count else 0.0
+
+    def percentile(self, p):
+        """
+        返回不小于 p% 记录值的最小值，以所在桶的上界表示
+        """
+        counts = self.counts
+        threshold = max(1, p / 100.0 * sum(counts))
+        seen = 0
+        for index, n in enumerate(counts):
+            seen += n
+            if n and seen >= threshold:
+                return bucket_range(index)[1]
+        return 0
+
+    def reset(self):
+        self.counts[:] = [0] * len(self.counts)  # 原地清零，已生成的代理函数仍持有该列表
+
+    def summary(self):
+        return dict(name=self.name, count=self.count, min=self.min, mean=self.mean, p50=self.percentile(50),
+                    p90=self.percentile(90), p99=self.percentile(99), max=self.max)
+
+
+def get_histogram(name):
+    histogram = REGISTRY.get(name)
+    if histogram is None:
+        histogram = REGISTRY.setdefault(name, Histogram(name))
+    return histogram
+
+
+def timed(fn=None, name=None):
+    """
+    耗时统计注解，可以直接使用 @timed，也可以指定直方图名称 @timed(name='db.query')
+    默认名称为被注解函数的模块名和限定名
+    """
+    if fn is None:
+        return functools.partial(timed, name=name)
+    if not _state['enabled']:
+        return fn  # 统计已关闭，不产生代理函数
+
+    histogram = get_histogram(name or '{:}.{:}'.format(fn.__module__, getattr(fn, '__qualname__', fn.__name__)))
+    counts = histogram.counts
+    state = _state
+    clock = time.perf_counter_ns
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        if not state['enabled']:
+            return fn(*args, **kwargs)
+        start = clock()
+        result = fn(*args, **kwargs)  # 抛出异常的调用不计时
+        value = clock() - start
+        # 与 Histogram.record 相同，为减少一次函数调用而展开
+        e = value.bit_length() - SUB_BITS
+        if e > 0:
+            counts[e * _HALF + (value >> e)] += 1
+        else:
+            counts[value] += 1
+        return result
+
+    wrapper.histogram = histogram
+    return wrapper
+
+
+def report(top=None):
+    """
+    按总耗时从大到小返回各直方图的统计结果（单位为纳秒）
+    """
+    summaries = [h.summary() for h in REGISTRY.values() if any(h.counts)]
+    summaries.sort(key=lambda s: s['mean'] * s['count'], reverse=True)
+    return summaries[:top] if top else summaries
+
+
+def reset():
+    for histogram in REGISTRY.values():
+        histogram.reset()
@@ -0,0 +1,209 @@
+# coding=utf-8
+"""
+由 test_decorator.py 中 test_wrapper_class_method_py2/py3 的 not_empty 注解发展而来的参数校验注解
+
+原 not_empty 注解的代理函数使用 *args 接收参数，每次调用都要遍历全部参数进行判断。本模块的校验注解：
+    1. 根据被注解函数的签名生成代理函数的源代码并编译，代理函数的参数列表与被注解函数完全相同，
+       只对指定的参数做判断，然后原样调用被注解函数，开销接近直接调用；
+    2. 同一函数上叠加多个校验注解时，合并为一个代理函数，而不是一层套一层；
+    3. 调用 set_enabled(False) 或设置环境变量 VALIDATE=0 后，之后的校验注解直接返回被注解函数本身；
+    4. 被注解函数是 async def 定义的协程函数时，代理函数同样是协程函数，在 await 时校验参数
+提供的注解：
+    @not_empty('name', ...)          字符串、列表等不能为空（None 不做判断，与原注解相同），不指定参数时校验全部参数
+    @typed(name=str, age=(int, float)) 参数类型必须匹配
+    @in_range('age', 0, 150)         参数必须在 [low, high] 范围内，low 或 high 为 None 表示不限制
+"""
+import inspect
+import os
+
+from decorator import codegen
+
+
+class ValidationError(ValueError):
+    pass
+
+
+class EmptyError(ValidationError):
+    pass
+
+
+class RangeError(ValidationError):
+    pass
+
+
+SIZED_TYPES = (str, bytes, bytearray, list, tuple, dict, set, frozenset)
+
+_state = {'enabled': os.environ.get('VALIDATE', '1') != '0'}
+
+def set_enabled(enabled):
+    _state['enabled'] = bool(enabled)
+
+
+def is_enabled():
+    return _state['enabled']
+
+
+def _signature_source(sig, namespace):
+    """
+    生成与签名相同的参数列表，以及原样转调被注解函数的实参（列表），默认值通过 namespace 引用
+    """
+    params, call = [], []
+    kinds = inspect.Parameter
+    positional_only = star = False
+    for p in sig.parameters.values():
+        if positional_only and p.kind != kinds.POSITIONAL_ONLY:
+            params.append('/')
+            positional_only = False
+        default = ''
+        if p.default is not p.empty:
+            namespace['_v_default_' + p.name] = p.default
+            default = '=_v_default_' + p.name
+
+        if p.kind == kinds.POSITIONAL_ONLY:
+            positional_only = True
+            params.append(p.name + default)
+            call.append(p.name)
+        elif p.kind == kinds.POSITIONAL_OR_KEYWORD:
+            params.append(p.name + default)
+            call.append(p.name)
+        elif p.kind == kinds.VAR_POSITIONAL:
+            star = True
+            params.append('*' + p.name)
+            call.append('*' + p.name)
+        elif p.kind == kinds.KEYWORD_ONLY:
+            if not star:
+                star = True
+                params.append('*')
+            params.append(p.name + default)
+            call.append('{0:}={0:}'.format(p.name))
+        else:
+            params.append('**' + p.name)
+            call.append('**' + p.name)
+    if positional_only:
+        params.append('/')
+    return ', '.join(params), call
+
+
+def _check_source(check, prefix, namespace):
+    """
+    生成一项校验的代码，代码引用的名称都以 prefix 开头并放入 namespace
+    """
+    kind, name = check[0], check[1]
+    if kind == 'not_empty':
+        namespace.update({prefix + 'isinstance': isinstance, prefix + 'sized': SIZED_TYPES,
+                          prefix + 'EmptyError': EmptyError})
+        return ['if not {0:} and {1:}isinstance({0:}, {1:}sized):'.format(name, prefix),
+                '    raise {:}EmptyError({!r})'.format(prefix, '{:} must not be empty'.format(name))]
+    if kind == 'typed':
+        namespace.update({prefix + 'isinstance': isinstance, prefix + 'types': check[2], prefix + 'type': type,
+                          prefix + 'TypeError': TypeError})
+        return ['if not {0:}isinstance({1:}, {0:}types):'.format(prefix, name),
+                '    raise {0:}TypeError({1!r}.format({0:}type({2:}).__name__))'.format(
+                    prefix, '{:} must be {:}, got {{:}}'.format(name, _type_names(check[2])), name)]
+    low, high = check[2], check[3]
+    namespace.update({prefix + 'low': low, prefix + 'high': high, prefix + 'RangeError': RangeError})
+    if low is None and high is None:
+        return []
+    if low is None:
+        condition = '{0:} <= {1:}high'
+    elif high is None:
+        condition = '{1:}low <= {0:}'
+    else:
+        condition = '{1:}low <= {0:} <= {1:}high'
+    return ['if not ' + condition.format(name, prefix) + ':',
+            '    raise {:}RangeError({!r}.format({:}))'.format(
+                prefix, '{:} must be in [{:}, {:}], got {{!r}}'.format(name, low, high), name)]
+
+
+def _type_names(types):
+    types = types if isinstance(types, tuple) else (types,)
+    return ' or '.join(t.__name__ for t in types)
+
+
+def _check_parameters(fn, checks):
+    """
+    返回 fn 的签名，checks 引用了 fn 没有的参数（或 *args、**kwargs）时抛出 ValueError
+    """
+    sig = inspect.signature(fn)
+    names = [p.name for p in sig.parameters.values()
+             if p.kind not in (inspect.Parameter.VAR_POSITIONAL, inspect.Parameter.VAR_KEYWORD)]
+    for check in checks:
+        if check[1] not in names:
+            raise ValueError('{:} has no parameter named {:}'.format(fn.__name__, check[1]))
+    return sig
+
+
+def _compile(kind, fn, checks, returns, is_async=None):
+    sig = _check_parameters(fn, checks)
+    # 生成的代码只引用 _v 开头的名称，参数名与 isinstance 等内置名称相同时不会被遮盖
+    namespace = {'_v_fn': fn}
+    params, call = _signature_source(sig, namespace)
+    body = []
+    for n, check in enumerate(checks):
+        body.extend(_check_source(check, '_v{:}_'.format(n), namespace))
+    body.append('return ' + returns(call))
+    return codegen.compile_wrapper(kind, fn, params, body, namespace, checks, is_async)
+
+
+def generate(fn, checks):
+    """
+    生成校验 checks 后调用 fn 的代理函数，checks 为 (类型, 参数名, ...) 的列表
+    """
+    wrapper, source = _compile('validate', fn, checks, lambda call: '{{await}}_v_fn({:})'.format(', '.join(call)))
+    wrapper.__validation__ = (fn, list(checks), source)
+    return wrapper
+
+
+def arguments(fn, checks):
+    """
+    生成与 fn 签名相同的普通函数，校验 checks 后返回 (args, kwargs)，即 generate 生成的代理函数调用 fn 时传入的参数
+    （默认值已填入，位置参数总是按位置传入），flatten.check_layer 用它取得与校验注解完全相同的行为
+    """
+
+    def returns(call):
+        args = [item for item in call if '=' not in item and not item.startswith('**')]
+        kwargs = ['{!r}: {:}'.format(item.split('=')[0], item.split('=')[0]) if '=' in item else item
+                  for item in call if '=' in item or item.startswith('**')]
+        return '({:}), {{{:}}}'.format(''.join(item + ', ' for item in args), ', '.join(kwargs))
+
+    return _compile('arguments', fn, checks, returns, is_async=False)[0]
+
+
+def _apply(make_checks):
+    """
+    make_checks(fn) 返回校验 fn 的 checks，同样的 make_checks 也被 flatten.check_layer 使用
+    """
+
+    def decorator(fn):
+        if not _state['enabled']:
+            return fn
+        validation = codegen.generated(fn, 'validate')
+        if validation is not None:  # 已被校验注解代理，合并为一个代理函数，与逐层代理相同，外层的校验先执行
+            return generate(validation[0], make_checks(validation[0]) + validation[1])
+        return generate(fn, make_checks(fn))
+
+    decorator.checks = make_checks
+    return decorator
+
+
+def not_empty(*names):
+    if len(names) == 1 and callable(names[0]):  # 不带参数使用 @not_empty
+        return not_empty()(names[0])
+
+    def make_checks(fn):
+        params = names or [p.name for p in inspect.signature(fn).parameters.values()
+                           if p.kind not in (inspect.Parameter.VAR_POSITIONAL, inspect.Parameter.VAR_KEYWORD) and
+                           p.name not in ('self', 'cls')]  # 没有指定参数时校验 self/cls 以外的全部参数
+        return [('not_empty', name) for name in params]
+
+    return _apply(make_checks)
+
+
+def typed(**types):
+    checks = [('typed', name, types[name]) for name in sorted(types)]
+    return _apply(lambda fn: checks)
+
+
+def in_range(name, low=None, high=None):
+    checks = [('range', name, low, high)]
+    return _apply(lambda fn: checks)
@@ -1,27 +1,738 @@
 # coding=utf-8
 
+import argparse
+import ast
+import collections
+import csv
+import fnmatch
+import functools
+import hashlib
+import importlib
+import io
+import itertools
+import json
+import linecache
+import multiprocessing
 import os
+import subprocess
+import time
+import traceback
+import tracemalloc
 import unittest
 import sys
+import zlib
+
+# picklable summary of one package run, sent back from worker processes
+PackageResult = collections.namedtuple('PackageResult', ['package', 'output', 'tests_run', 'failures',
+                                                         'errors', 'skipped', 'elapsed', 'timings', 'index',
+                                                         'memory'])
+
+# wall and cpu seconds spent in one test method
+TestTiming = collections.namedtuple('TestTiming', ['test_id', 'wall', 'cpu'])
+
+# traced bytes of one test: peak and net growth relative to the start of the test, and the source lines
+# which allocated the most as (file:line, size, count) tuples
+MemoryUsage = collections.namedtuple('MemoryUsage', ['test_id', 'peak', 'net', 'top_lines'])
+
+# one line of 'python -X importtime' output, self and cumulative times are in microseconds
+ImportTime = collections.namedtuple('ImportTime', ['module', 'self_us', 'cumulative_us', 'children'])
+
+# discovers one package in a fresh interpreter, the marker separates the imports of the runner itself
+IMPORT_PROBE_MARKER = '-- run_test import probe --'
+IMPORT_PROBE = '''
+import sys
+sys.path.insert(0, {base!r})
+import unittest
+sys.stderr.write({marker!r} + '\\n')
+unittest.TestLoader().discover({test_dir!r})
+'''
+
+HISTOGRAM_BUCKETS = [0.001, 0.01, 0.1, 1.0, 10.0]
+
+BASE_PATH = os.path.split(os.path.abspath(__file__))[0]
+CACHE_DIR = os.path.join(BASE_PATH, '.run_test')
+HASH_CACHE = os.path.join(CACHE_DIR, 'hashes.json')
+INDEX_CACHE = os.path.join(CACHE_DIR, 'index.json')
+
+
+class TimingTestResult(unittest.TextTestResult):
+    """
+    Records the wall and cpu time of every test. When 'on_event' is given, a 'test' event (a JSON
+    serializable dict) is passed to it as soon as each test completes.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self.__package = kwargs.pop('package', None)
+        self.__on_event = kwargs.pop('on_event', None)
+        super(TimingTestResult, self).__init__(*args, **kwargs)
+        self.timings = []
+        self.__started = None
+        self.__status = self.__message = None
+
+    def startTest(self, test):
+        self.__status, self.__message = 'pass', None
+        self.__started = (time.perf_counter(), time.process_time())
+        super(TimingTestResult, self).startTest(test)
+
+    def stopTest(self, test):
+        super(TimingTestResult, self).stopTest(test)
+        wall, cpu = self.__started
+        timing = TestTiming(test.id(), time.perf_counter() - wall, time.process_time() - cpu)
+        self.timings.append(timing)
+        self.__emit(timing.test_id, self.__status, timing.wall, timing.cpu, self.__message)
+        self.__status = self.__message = None
+
+    def __emit(self, test_id, status, wall, cpu, message):
+        if self.__on_event:
+            self.__on_event(dict(event='test', package=self.__package, test=test_id, status=status, wall=wall,
+                                 cpu=cpu, message=message))
+
+    def addFailure(self, test, err):
+        super(TimingTestResult, self).addFailure(test, err)
+        self.__status, self.__message = 'fail', self.failures[-1][1]
+
+    def addError(self, test, err):
+        super(TimingTestResult, self).addError(test, err)
+        if self.__status is not None:
+            self.__status, self.__message = 'error', self.errors[-1][1]
+        else:
+            # errors of setUpClass/tearDownClass/setUpModule/tearDownModule are reported outside of any test,
+            # 'test' is then a placeholder named after the fixture
+            self.__emit(test.id(), 'error', 0.0, 0.0, self.errors[-1][1])
+
+    def addSubTest(self, test, subtest, err):
+        super(TimingTestResult, self).addSubTest(test, subtest, err)
+        if err is not None and self.__status != 'fail':
+            failed = issubclass(err[0], test.failureException)
+            self.__status, self.__message = ('fail', self.failures[-1][1]) if failed else \
+                ('error', self.errors[-1][1])
+
+    def addSkip(self, test, reason):
+        super(TimingTestResult, self).addSkip(test, reason)
+        self.__status, self.__message = 'skip', reason
+
+    def addExpectedFailure(self, test, err):
+        super(TimingTestResult, self).addExpectedFailure(test, err)
+        self.__status = 'xfail'
+
+    def addUnexpectedSuccess(self, test):
+        super(TimingTestResult, self).addUnexpectedSuccess(test)
+        self.__status = 'xpass'
+
+
+class MemoryTestResult(TimingTestResult):
+    # leave out the allocations of the runner itself, including formatting the tracebacks of failures
+    SNAPSHOT_FILTERS = [tracemalloc.Filter(False, f) for f in (
+        os.path.abspath(__file__), tracemalloc.__file__, linecache.__file__, traceback.__file__,
+        os.path.join(os.path.dirname(unittest.__file__), '*'), '<frozen importlib._bootstrap*>', '<unknown>')]
+
+    def __init__(self, *args, **kwargs):
+        self.__top_lines = kwargs.pop('top_lines', 5)
+        super(MemoryTestResult, self).__init__(*args, **kwargs)
+        self.memory = []
+        self.__started = False
+
+    @classmethod
+    def is_filtered(cls, filename):
+        return any(fnmatch.fnmatch(filename, f.filename_pattern) for f in cls.SNAPSHOT_FILTERS)
+
+    def startTest(self, test):
+        # trace one test at a time: the snapshot taken in stopTest then holds only what the test allocated,
+        # instead of every trace left over by the tests before it
+        self.__started = not tracemalloc.is_tracing()
+        if self.__started:
+            tracemalloc.start()
+        else:
+            tracemalloc.clear_traces()
+        tracemalloc.reset_peak()
+        super(MemoryTestResult, self).startTest(test)
+
+    def stopTest(self, test):
+        super(MemoryTestResult, self).stopTest(test)
+        current, peak = tracemalloc.get_traced_memory()
+        stats = tracemalloc.take_snapshot().statistics('lineno')
+        if self.__started:
+            tracemalloc.stop()
+        top = (stat for stat in stats if not self.is_filtered(stat.traceback[0].filename))
+        top_lines = [('{:}:{:}'.format(stat.traceback[0].filename, stat.traceback[0].lineno), stat.size, stat.count)
+                     for stat in itertools.islice(top, self.__top_lines)]
+        self.memory.append(MemoryUsage(test.id(), peak, current, top_lines))
 
 
 def list_packages():
     dirs = []
-    base_path = os.path.split(os.path.abspath(__file__))[0]
-    for item in os.listdir(base_path):
-        path = os.path.join(base_path, item)
-        if os.path.isdir(path):
+    for item in os.listdir(BASE_PATH):
+        path = os.path.join(BASE_PATH, item)
+        if os.path.isdir(path) and not item.startswith(('.', '__')):
             dirs.append(path)
     return dirs
 
 
-def main():
-    success = True
-    for test_dir in list_packages():
-        test_suite = unittest.TestLoader().discover(test_dir)
-        result = unittest.TextTestRunner(verbosity=1).run(test_suite)
-        if len(result.failures) > 0:
-            success = False
+def list_sources(test_dir):
+    sources = []
+    for root, dirs, files in os.walk(test_dir):
+        dirs[:] = sorted(d for d in dirs if not d.startswith(('.', '__')))
+        sources.extend(os.path.join(root, f) for f in sorted(files) if f.endswith('.py'))
+    return sources
+
+
+def imported_packages(test_dir):
+    # packages under src/ (directories with __init__.py) imported by the sources of test_dir
+    names = set()
+    for source in list_sources(test_dir):
+        with open(source, 'rb') as f:
+            try:
+                tree = ast.parse(f.read(), source)
+            except SyntaxError:
+                continue
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                names.update(alias.name.split('.')[0] for alias in node.names)
+            elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+                names.add(node.module.split('.')[0])
+    return set(os.path.join(BASE_PATH, name) for name in names
+               if os.path.isfile(os.path.join(BASE_PATH, name, '__init__.py')))
+
+
+def package_digest(test_dir, imports):
+    # hash the sources of the package and, transitively, of every package it imports
+    pending, seen = [test_dir], set()
+    while pending:
+        path = pending.pop()
+        if path not in seen:
+            seen.add(path)
+            pending.extend(imports.get(path, ()))
+
+    sha = hashlib.sha1()
+    for path in sorted(seen):
+        for source in list_sources(path):
+            sha.update(os.path.relpath(source, BASE_PATH).encode('utf-8'))
+            with open(source, 'rb') as f:
+                sha.update(f.read())
+    return sha.hexdigest()
+
+
+def load_cache(file_name):
+    try:
+        with open(file_name) as f:
+            return json.load(f)
+    except (IOError, ValueError):
+        return {}
+
+
+def save_cache(file_name, cache):
+    if not os.path.isdir(CACHE_DIR):
+        os.makedirs(CACHE_DIR)
+    with open(file_name, 'w') as f:
+        json.dump(cache, f, indent=2, sort_keys=True)
+
+
+def package_weight(test_dir):
+    # bigger packages first, so the slowest ones do not end up as the tail of a parallel run
+    weight = 0
+    for root, _, files in os.walk(test_dir):
+        weight += sum(os.path.getsize(os.path.join(root, f)) for f in files if f.endswith('.py'))
+    return weight
+
+
+def find_test_modules(test_dir, pattern='test*.py'):
+    # same layout rules as TestLoader.discover: test files of test_dir and of its sub packages
+    modules = []
+    for root, dirs, files in os.walk(test_dir):
+        dirs[:] = sorted(d for d in dirs if os.path.isfile(os.path.join(root, d, '__init__.py')))
+        prefix = os.path.relpath(root, test_dir)
+        prefix = '' if prefix == os.curdir else prefix.replace(os.sep, '.') + '.'
+        for f in sorted(files):
+            if f.endswith('.py') and fnmatch.fnmatch(f, pattern):
+                modules.append((os.path.join(root, f), prefix + f[:-3]))
+    return modules
+
+
+def iter_tests(suite):
+    for test in suite:
+        if isinstance(test, unittest.TestSuite):
+            for t in iter_tests(test):
+                yield t
+        else:
+            yield test
+
+
+def parse_shard(value):
+    try:
+        index, count = [int(n) for n in value.split('/')]
+    except ValueError:
+        raise argparse.ArgumentTypeError('expected I/N, got {:}'.format(value))
+    if not 1 <= index <= count:
+        raise argparse.ArgumentTypeError('shard index must be in 1..{:}, got {:}'.format(count, index))
+    return index, count
+
+
+def is_selected(test_id, patterns, shard=None):
+    # a shard (i, n) owns the tests whose id hashes to i - 1 modulo n, which is stable across machines
+    if shard and zlib.crc32(test_id.encode('utf-8')) % shard[1] != shard[0] - 1:
+        return False
+    # same matching rules as 'python -m unittest -k'
+    return not patterns or any(fnmatch.fnmatchcase(test_id, p if '*' in p else '*{:}*'.format(p))
+                               for p in patterns)
+
+
+def load_package(test_dir, patterns=None, index=None, shard=None):
+    """
+    Load the selected tests of a package. Without an index this is TestLoader.discover; with an index
+    (relative module path -> mtime and test ids) only stale modules and modules owning selected tests
+    are imported. Returns the suite and the refreshed index entries of the package.
+    """
+    loader = unittest.TestLoader()
+    if index is None:
+        suite = loader.discover(test_dir)
+        return unittest.TestSuite(t for t in iter_tests(suite) if is_selected(t.id(), patterns, shard)), {}
+
+    if test_dir not in sys.path:
+        sys.path.insert(0, test_dir)
+
+    suite, entries = unittest.TestSuite(), {}
+    for path, name in find_test_modules(test_dir):
+        key = os.path.relpath(path, BASE_PATH)
+        mtime = os.path.getmtime(path)
+        entry = index.get(key)
+        if entry and entry['mtime'] == mtime:
+            entries[key] = entry
+            suite.addTests(loader.loadTestsFromName(test_id) for test_id in entry['tests']
+                           if is_selected(test_id, patterns, shard))
+            continue
+
+        try:
+            tests = list(iter_tests(loader.loadTestsFromModule(importlib.import_module(name))))
+            entries[key] = dict(mtime=mtime, tests=[t.id() for t in tests])
+        except Exception:
+            tests = None
+        if tests is None:
+            # not indexed, let discover report the import error as a failing test
+            tests = list(iter_tests(loader.discover(test_dir, pattern=os.path.basename(path))))
+        suite.addTests(t for t in tests if is_selected(t.id(), patterns, shard))
+    return suite, entries
+
+
+def run_package(test_dir, stream=None, patterns=None, index=None, memprofile=0, shard=None, failfast=False,
+                on_event=None):
+    output = stream or io.StringIO()
+    ts = time.time()
+    package = os.path.basename(test_dir)
+    test_suite, entries = load_package(test_dir, patterns, index, shard)
+    resultclass = functools.partial(MemoryTestResult, top_lines=memprofile) if memprofile else TimingTestResult
+    resultclass = functools.partial(resultclass, package=package, on_event=on_event)
+    result = unittest.TextTestRunner(stream=output, verbosity=1, failfast=failfast,
+                                     resultclass=resultclass).run(test_suite)
+    return PackageResult(package=package,
+                         output='' if stream else output.getvalue(),
+                         tests_run=result.testsRun,
+                         failures=[(test.id(), err) for test, err in result.failures],
+                         errors=[(test.id(), err) for test, err in result.errors],
+                         skipped=[(test.id(), reason) for test, reason in result.skipped],
+                         elapsed=time.time() - ts,
+                         timings=result.timings,
+                         index=entries,
+                         memory=getattr(result, 'memory', []))
+
+
+_event_queue = None
+
+
+def init_worker(queue):
+    global _event_queue
+    _event_queue = queue
+    # pool workers are daemonic, which would forbid the tests from starting processes of their own
+    multiprocessing.current_process().daemon = False
+
+
+def run_package_in_worker(test_dir, **kwargs):
+    # test events and the package result share one queue, so the result always comes after its events
+    _event_queue.put(run_package(test_dir, on_event=_event_queue.put, **kwargs))
+
+
+def iter_results(packages, jobs, on_event=None, failfast=False, **kwargs):
+    """
+    Run the packages and yield their PackageResult as each one completes, test events are passed to
+    'on_event' meanwhile. With 'failfast' the run stops at the first failing or erroneous test: the result
+    of the package it belongs to is still yielded, worker processes still running other packages are
+    terminated.
+    """
+    if jobs == 1:
+        for test_dir in packages:
+            result = run_package(test_dir, stream=sys.stderr, failfast=failfast, on_event=on_event, **kwargs)
+            yield result
+            if failfast and (result.failures or result.errors):
+                return
+        return
+
+    # SimpleQueue writes synchronously, a Queue would add a feeder thread to every worker and upset
+    # tests that count threads
+    queue = multiprocessing.SimpleQueue()
+    pool = multiprocessing.Pool(jobs, initializer=init_worker, initargs=(queue,))
+    try:
+        runner = functools.partial(run_package_in_worker, failfast=failfast, **kwargs)
+        for test_dir in sorted(packages, key=package_weight, reverse=True):
+            pool.apply_async(runner, (test_dir,), error_callback=queue.put)
+        pool.close()
+
+        pending, failed = len(packages), None
+        while pending:
+            item = queue.get()
+            if isinstance(item, BaseException):
+                raise item
+            if isinstance(item, PackageResult):
+                pending -= 1
+                yield item
+                if item.package == failed:
+                    return
+            else:
+                if on_event:
+                    on_event(item)
+                # the failing package stops at this test, wait for its result which follows its events
+                if failfast and failed is None and item['status'] in ('fail', 'error'):
+                    failed = item['package']
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+class EventWriter(object):
+    """
+    Writes run events as JSON lines, flushing each one so that consumers see progress in real time
+    """
+
+    def __init__(self, file_name):
+        self.__file = sys.stdout if file_name == '-' else open(file_name, 'w')
+
+    def __call__(self, event):
+        self.__file.write(json.dumps(event, sort_keys=True) + '\n')
+        self.__file.flush()
+
+    def close(self):
+        if self.__file is not sys.stdout:
+            self.__file.close()
+
+
+def print_summary(results, elapsed, jobs, aborted=False, stream=sys.stderr):
+    tests_run = sum(r.tests_run for r in results)
+    failures = sum(len(r.failures) for r in results)
+    errors = sum(len(r.errors) for r in results)
+    skipped = sum(len(r.skipped) for r in results)
+
+    stream.write('=' * 70 + '\n')
+    stream.write('Ran {:} tests in {:} packages in {:.3f}s (jobs={:})\n'.format(tests_run, len(results),
+                                                                             elapsed, jobs))
+    for r in results:
+        for test_id, _ in r.failures:
+            stream.write('FAIL: {:}\n'.format(test_id))
+        for test_id, _ in r.errors:
+            stream.write('ERROR: {:}\n'.format(test_id))
+
+    details = ['{:}={:}'.format(k, v) for k, v in (('failures', failures), ('errors', errors),
+                                                     ('skipped', skipped)) if v]
+    if aborted:
+        details.append('aborted by --failfast')
+    status = 'FAILED' if failures or errors or aborted else 'OK'
+    stream.write('{:}{:}\n'.format(status, ' ({:})'.format(', '.join(details)) if details else ''))
+
+
+def print_timings(results, top, stream=sys.stderr):
+    timings = sorted((t for r in results for t in r.timings), key=lambda t: t.wall, reverse=True)
+    if not timings:
+        return
+
+    stream.write('Slowest {:} tests:\n'.format(min(top, len(timings))))
+    for t in timings[:top]:
+        stream.write('{:10.3f}s wall {:10.3f}s cpu  {:}\n'.format(t.wall, t.cpu, t.test_id))
+
+    counts = [0] * (len(HISTOGRAM_BUCKETS) + 1)
+    for t in timings:
+        counts[sum(1 for bound in HISTOGRAM_BUCKETS if t.wall >= bound)] += 1
+    labels = ['< {:g}s'.format(HISTOGRAM_BUCKETS[0])]
+    labels += ['{:g}s - {:g}s'.format(lo, hi) for lo, hi in zip(HISTOGRAM_BUCKETS, HISTOGRAM_BUCKETS[1:])]
+    labels += ['>= {:g}s'.format(HISTOGRAM_BUCKETS[-1])]
+    scale = max(counts)
+    stream.write('Test duration histogram:\n')
+    for label, count in zip(labels, counts):
+        stream.write('{:>16} {:5} {:}\n'.format(label, count, '#' * -(-40 * count // scale)))
+
+
+def format_size(size):
+    for unit, scale in (('MiB', 1 << 20), ('KiB', 1 << 10)):
+        if abs(size) >= scale:
+            return '{:.1f}{:}'.format(float(size) / scale, unit)
+    return '{:}B'.format(size)
+
+
+def print_memory(results, top, stream=sys.stderr):
+    usages = sorted((m for r in results for m in r.memory), key=lambda m: m.peak, reverse=True)
+    if not usages:
+        return
+
+    stream.write('Top {:} allocating tests (peak / net traced memory):\n'.format(min(top, len(usages))))
+    for m in usages[:top]:
+        stream.write('{:>10} {:>10}  {:}\n'.format(format_size(m.peak), format_size(m.net), m.test_id))
+        for line, size, count in m.top_lines:
+            if line.startswith(BASE_PATH + os.sep):
+                line = os.path.relpath(line, BASE_PATH)
+            stream.write('{:>21} {:>8} blocks  {:}\n'.format('+' + format_size(size), count, line))
+
+
+def dump_timings(results, file_name):
+    rows = [(r.package, t.test_id, t.wall, t.cpu) for r in results for t in r.timings]
+    if file_name.endswith('.csv'):
+        with open(file_name, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['package', 'test', 'wall', 'cpu'])
+            writer.writerows(rows)
+    else:
+        with open(file_name, 'w') as f:
+            json.dump([dict(package=p, test=t, wall=w, cpu=c) for p, t, w, c in rows], f, indent=2)
+
+
+def parse_importtime(lines):
+    """
+    Build the import tree from 'python -X importtime' lines. A module is printed after the modules it
+    imports, indented by two spaces per nesting level, so children are collected until their parent shows up.
+    """
+    pending = collections.defaultdict(list)
+    for line in lines:
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        if not self_us.strip().isdigit():
+            continue  # the header line
+        level = (len(name) - len(name.lstrip()) - 1) // 2
+        pending[level].append(ImportTime(name.strip(), int(self_us), int(cumulative_us), pending.pop(level + 1, [])))
+    return pending[0]
+
+
+def profile_imports(test_dir):
+    # returns the top level imports of the runner and of the package, each one measured in a fresh interpreter
+    code = IMPORT_PROBE.format(base=BASE_PATH, marker=IMPORT_PROBE_MARKER, test_dir=test_dir)
+    process = subprocess.Popen([sys.executable, '-X', 'importtime', '-c', code], cwd=BASE_PATH,
+                               stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
+    _, err = process.communicate()
+    lines = err.splitlines()
+    marker = lines.index(IMPORT_PROBE_MARKER) if IMPORT_PROBE_MARKER in lines else len(lines)
+    return parse_importtime(lines[:marker]), parse_importtime(lines[marker + 1:])
+
+
+def import_usage(source):
+    """
+    Map each module imported at the top of a test module to the number of test methods using a name
+    bound by that import, returns the mapping and the number of test methods. A name used by a fixture
+    (setUp, tearDown, setUpClass ...), a helper method or the class body counts as used by every test of
+    the class, and a name used anywhere else in the module (helper functions and classes, module level
+    code) counts as used by every test.
+    """
+    with open(source, 'rb') as f:
+        tree = ast.parse(f.read(), source)
+
+    bindings = {}
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            for alias in node.names:
+                bindings[alias.asname or alias.name.split('.')[0]] = alias.name if alias.asname else \
+                    alias.name.split('.')[0]
+        elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+            for alias in node.names:
+                bindings[alias.asname or alias.name] = node.module
+
+    def modules_used(nodes):
+        names = set(n.id for node in nodes for n in ast.walk(node) if isinstance(n, ast.Name))
+        return set(bindings[name] for name in names if name in bindings)
+
+    tests, usage, shared = 0, collections.Counter(), set()
+    for node in tree.body:
+        if isinstance(node, (ast.Import, ast.ImportFrom)):
+            continue
+        methods = [n for n in node.body if isinstance(n, (ast.FunctionDef, ast.AsyncFunctionDef))
+                   and n.name.startswith('test')] if isinstance(node, ast.ClassDef) else []
+        if not methods:
+            shared.update(modules_used([node]))
+            continue
+        for method in methods:
+            usage.update(modules_used([method]))
+        others = [n for n in node.body if n not in methods] + node.bases + node.keywords + node.decorator_list
+        for module in modules_used(others):
+            usage[module] += len(methods)
+        tests += len(methods)
+
+    for module in bindings.values():
+        usage[module] = tests if module in shared else min(usage[module], tests)
+    return usage, tests
+
+
+def print_import_report(threshold_ms, stream=sys.stderr):
+    threshold_us = threshold_ms * 1000
+    runner_imports = None
+    rows = []
+    for test_dir in sorted(list_packages()):
+        runner, modules = profile_imports(test_dir)
+        runner_imports = runner_imports or runner
+        rows.append((os.path.basename(test_dir), test_dir, modules, sum(m.cumulative_us for m in modules)))
+
+    stream.write('Runner imports: {:.1f}ms ({:})\n'.format(
+        sum(m.cumulative_us for m in runner_imports or []) / 1000.0,
+        ', '.join('{:} {:.1f}ms'.format(m.module, m.cumulative_us / 1000.0)
+                  for m in sorted(runner_imports or [], key=lambda m: m.cumulative_us, reverse=True)[:5])))
+
+    stream.write('Import time per package (cumulative, on top of the runner imports):\n')
+    for package, test_dir, modules, total in sorted(rows, key=lambda r: r[3], reverse=True):
+        stream.write('{:>10.1f}ms  {:}\n'.format(total / 1000.0, package))
+        for module in sorted(modules, key=lambda m: m.cumulative_us, reverse=True):
+            stream.write('{:>10.1f}ms    {:}\n'.format(module.cumulative_us / 1000.0, module.module))
+            source = os.path.join(test_dir, module.module.replace('.', os.sep) + '.py')
+            try:
+                usage, tests = import_usage(source)
+            except (IOError, SyntaxError):
+                usage, tests = {}, 0
+            for child in sorted(module.children, key=lambda m: m.cumulative_us, reverse=True):
+                used = usage.get(child.module)
+                hint = ''
+                if child.cumulative_us >= threshold_us and used is not None and used < tests:
+                    hint = '  <- could be deferred, used by {:}/{:} tests'.format(used, tests)
+                stream.write('{:>10.1f}ms      {:}{:}\n'.format(child.cumulative_us / 1000.0, child.module, hint))
+
+
+def run_benchmarks(args, stream=sys.stderr):
+    import bench
+
+    results = []
+    for b in bench.load_benchmarks():
+        if is_selected(b.name, args.patterns):
+            result = bench.measure(b, repeat=args.bench_repeat, warmup=args.bench_warmup)
+            stream.write('{:<40} median {:>12} p95 {:>12} ({:}x{:})\n'.format(
+                b.name, bench.format_time(result['median']), bench.format_time(result['p95']),
+                result['repeat'], result['number']))
+            results.append(result)
+
+    if args.bench_json:
+        bench.save_report(args.bench_json, results)
+    if not args.bench_baseline:
+        return 0
+
+    regressions = bench.compare(results, bench.load_report(args.bench_baseline), args.bench_threshold)
+    for name, before, after, ratio in regressions:
+        stream.write('REGRESSION: {:} {:} -> {:} ({:+.1%})\n'.format(
+            name, bench.format_time(before), bench.format_time(after), ratio - 1))
+    return 1 if regressions else 0
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description='Run the unit tests of every package under src/')
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help='number of worker processes, one package per worker (0 = cpu count)')
+    parser.add_argument('--all', action='store_true',
+                        help='run every package, even those unchanged since their last successful run')
+    parser.add_argument('-k', dest='patterns', action='append', metavar='PATTERN',
+                        help='only run tests whose id matches PATTERN (same rules as unittest -k)')
+    parser.add_argument('--no-index', dest='index', action='store_false',
+                        help='walk and import every test module instead of using the discovery index')
+    parser.add_argument('--shard', type=parse_shard, metavar='I/N',
+                        help='only run the I-th of N shards of the tests (1 <= I <= N), split by a stable hash of '
+                             'the test ids')
+    parser.add_argument('-f', '--failfast', action='store_true',
+                        help='stop the whole run, including other workers, on the first failure or error')
+    parser.add_argument('--jsonl', metavar='FILE',
+                        help="stream test results to FILE as JSON lines while running ('-' for stdout)")
+    parser.add_argument('--slowest', type=int, default=10, metavar='N',
+                        help='report the N slowest tests and a duration histogram (0 = off)')
+    parser.add_argument('--timings', metavar='FILE',
+                        help='dump per-test wall/cpu timings to FILE (.csv for CSV, otherwise JSON)')
+    parser.add_argument('--memprofile', type=int, nargs='?', const=5, default=0, metavar='LINES',
+                        help='trace allocations of every test with tracemalloc, report peak/net memory and '
+                             'the top LINES allocating source lines per test (default 5)')
+    parser.add_argument('--importtime', type=float, nargs='?', const=1.0, metavar='MS',
+                        help='profile the imports of every package with -X importtime instead of running the '
+                             'tests, flagging imports slower than MS (default 1.0) used by only some tests')
+    parser.add_argument('--bench', action='store_true',
+                        help='run the micro benchmarks of the bench package instead of the tests')
+    parser.add_argument('--bench-repeat', type=int, metavar='N', help='timed rounds of each benchmark')
+    parser.add_argument('--bench-warmup', type=int, metavar='N', help='untimed rounds before measuring')
+    parser.add_argument('--bench-json', metavar='FILE', help='save the benchmark report to FILE')
+    parser.add_argument('--bench-baseline', metavar='FILE',
+                        help='compare with a saved report, exit with 1 if a benchmark regressed')
+    parser.add_argument('--bench-threshold', type=float, default=0.1, metavar='RATIO',
+                        help='relative slowdown of the median reported as a regression (default 0.1)')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.bench:
+        return run_benchmarks(args)
+    if args.importtime is not None:
+        print_import_report(args.importtime)
+        return 0
+
+    jobs = args.jobs if args.jobs > 0 else multiprocessing.cpu_count()
+
+    packages = list_packages()
+    imports = dict((test_dir, imported_packages(test_dir)) for test_dir in packages)
+    digests = dict((os.path.basename(test_dir), package_digest(test_dir, imports)) for test_dir in packages)
+    cache = load_cache(HASH_CACHE)
+    if not args.all:
+        unchanged = [p for p in packages if cache.get(os.path.basename(p)) == digests[os.path.basename(p)]]
+        if unchanged:
+            packages = [p for p in packages if p not in unchanged]
+            sys.stderr.write('Skipped {:} unchanged packages: {:} (use --all to run them)\n'.format(
+                len(unchanged), ', '.join(sorted(os.path.basename(p) for p in unchanged))))
+
+    index = load_cache(INDEX_CACHE) if args.index else None
+
+    statuses = collections.Counter()
+    writer = EventWriter(args.jsonl) if args.jsonl else None
+
+    def on_event(event):
+        statuses[event['status']] += 1
+        if writer:
+            writer(event)
+
+    ts = time.time()
+    results = []
+    for result in iter_results(packages, jobs, on_event=on_event, failfast=args.failfast, patterns=args.patterns,
+                               index=index, memprofile=args.memprofile, shard=args.shard):
+        if result.output:
+            sys.stderr.write('[{:}]\n{:}'.format(result.package, result.output))
+        if writer:
+            writer(dict(event='package', package=result.package, tests=result.tests_run,
+                        failures=len(result.failures), errors=len(result.errors), skipped=len(result.skipped),
+                        elapsed=result.elapsed))
+        results.append(result)
+
+    # a run cut short by --failfast did not run every test, so it never counts as a success
+    aborted = bool(args.failfast and (statuses['fail'] or statuses['error']))
+    success = not aborted and statuses['fail'] == 0 and all(len(r.failures) == 0 for r in results)
+    if writer:
+        writer(dict(event='summary', tests=sum(statuses.values()), failures=statuses['fail'],
+                    errors=statuses['error'], skipped=statuses['skip'], elapsed=time.time() - ts,
+                    aborted=aborted, success=success))
+        writer.close()
+
+    # only packages which fully passed are remembered, so broken ones are always re-run
+    for result in results:
+        if result.failures or result.errors:
+            cache.pop(result.package, None)
+        elif not (args.patterns or args.shard):
+            cache[result.package] = digests[result.package]
+    save_cache(HASH_CACHE, cache)
+
+    if index is not None:
+        for result in results:
+            index.update(result.index)
+        save_cache(INDEX_CACHE, dict((k, v) for k, v in index.items() if os.path.isfile(os.path.join(BASE_PATH, k))))
+
+    if jobs > 1:
+        print_summary(results, time.time() - ts, jobs, aborted)
+    if args.slowest > 0:
+        print_timings(results, args.slowest)
+    if args.memprofile:
+        print_memory(results, max(args.slowest, 10))
+    if args.timings:
+        dump_timings(results, args.timings)
+
     return 0 if success else 1
 
 
@@ -0,0 +1,245 @@
+# coding=utf-8
+"""
+基于 test_active_count 中 threading.Condition 的 acquire / wait / notify 用法的锁竞争分析工具
+
+Lock、RLock 和 Condition 可以直接替换 threading 中的同名函数，按名称统计每个锁的：
+    1. acquisitions 获取次数，contended 需要等待才能获取的次数；
+    2. wait_time 获取锁时等待的时间（只记录需要等待的获取，以及 Condition.wait 被唤醒后重新获取锁的时间），
+       hold_time 持有锁的时间（RLock 从最外层的 acquire 到最后一次 release），
+       cond_wait_time 在 Condition.wait 中等待通知的时间，均为纳秒直方图
+不指定名称时以创建锁的文件名和行号为名称，同名的锁（例如同一行代码创建的多个锁）合并统计。
+report() 按总等待时间从大到小返回最热的锁。与 decorator/timing.py 相同，计数不加锁，多线程并发更新
+同名锁的统计时可能有极少量误差
+
+调用 set_enabled(False) 或设置环境变量 LOCKPROF=0 后，之后创建的锁就是 threading 中原本的锁，没有任何额外开销；
+之前创建的锁仍然继续统计
+"""
+import os
+import sys
+import threading
+import time
+
+from decorator.timing import SUB_BITS, Histogram
+
+REGISTRY = {}
+
+_state = {'enabled': os.environ.get('LOCKPROF', '1') != '0'}
+
+_clock = time.perf_counter_ns
+_HALF = 1 << (SUB_BITS - 1)
+
+
+def set_enabled(enabled):
+    _state['enabled'] = bool(enabled)
+
+
+def is_enabled():
+    return _state['enabled']
+
+
+class LockStats(object):
+    def __init__(self, name):
+        self.name = name
+        self.acquisitions = self.contended = self.cond_waits = 0
+        self.wait_time = Histogram(name + '.wait')
+        self.hold_time = Histogram(name + '.hold')
+        self.cond_wait_time = Histogram(name + '.cond_wait')
+
+    def summary(self):
+        wait = self.wait_time
+        return dict(name=self.name, acquisitions=self.acquisitions, contended=self.contended,
+                    contention=float(self.contended) / self.acquisitions if self.acquisitions else 0.0,
+                    wait_total=wait.mean * wait.count, wait_p99=wait.percentile(99), wait_max=wait.max,
+                    hold_mean=self.hold_time.mean, hold_p99=self.hold_time.percentile(99),
+                    hold_max=self.hold_time.max, cond_waits=self.cond_waits,
+                    cond_wait_p99=self.cond_wait_time.percentile(99))
+
+    def reset(self):
+        self.acquisitions = self.contended = self.cond_waits = 0
+        for histogram in (self.wait_time, self.hold_time, self.cond_wait_time):
+            histogram.reset()
+
+
+def get_stats(name):
+    stats = REGISTRY.get(name)
+    if stats is None:
+        stats = REGISTRY.setdefault(name, LockStats(name))
+    return stats
+
+
+def _caller_name(depth):
+    frame = sys._getframe(depth + 1)
+    return '{:}:{:}'.format(os.path.basename(frame.f_code.co_filename), frame.f_lineno)
+
+
+class ProfiledLock(object):
+    """
+    包装 threading.Lock，acquire 先尝试不等待地获取锁，失败时才计时等待
+    """
+    __slots__ = ('_lock', '_stats', '_acquired_at')
+
+    def __init__(self, lock, stats):
+        self._lock = lock
+        self._stats = stats
+        self._acquired_at = 0
+
+    def acquire(self, blocking=True, timeout=-1):
+        stats = self._stats
+        if self._lock.acquire(False):
+            self._acquired_at = _clock()
+            stats.acquisitions += 1
+            return True
+        if not blocking:
+            return False
+        start = _clock()
+        acquired = self._lock.acquire(True, timeout)
+        now = _clock()
+        stats.contended += 1
+        stats.wait_time.record(now - start)
+        if acquired:
+            self._acquired_at = now
+            stats.acquisitions += 1
+        return acquired
+
+    def release(self):
+        held = _clock() - self._acquired_at
+        self._lock.release()
+        # 与 Histogram.record 相同，每次获取锁都会执行，为减少一次函数调用而展开
+        e = held.bit_length() - SUB_BITS
+        if e > 0:
+            self._stats.hold_time.counts[e * _HALF + (held >> e)] += 1
+        else:
+            self._stats.hold_time.counts[held] += 1
+
+    def locked(self):
+        return self._lock.locked()
+
+    def _is_owned(self):
+        # Condition 默认通过 acquire(False) 判断，直接使用内部的锁，避免计入统计
+        if self._lock.acquire(False):
+            self._lock.release()
+            return False
+        return True
+
+    __enter__ = acquire
+
+    def __exit__(self, *args):
+        self.release()
+
+    def __repr__(self):
+        return '<ProfiledLock {:} {!r}>'.format(self._stats.name, self._lock)
+
+
+class ProfiledRLock(ProfiledLock):
+    """
+    包装 threading.RLock，重入的 acquire 不计为新的持有，持有时间从最外层的 acquire 开始计算
+    """
+    __slots__ = ('_depth',)
+
+    def __init__(self, lock, stats):
+        super(ProfiledRLock, self).__init__(lock, stats)
+        self._depth = 0  # 只有持有锁的线程会修改
+
+    def acquire(self, blocking=True, timeout=-1):
+        if self._depth and self._lock._is_owned():
+            self._lock.acquire()
+            self._depth += 1
+            return True
+        acquired = super(ProfiledRLock, self).acquire(blocking, timeout)
+        if acquired:
+            self._depth = 1
+        return acquired
+
+    __enter__ = acquire
+
+    def release(self):
+        if self._depth == 1:
+            self._depth = 0
+            super(ProfiledRLock, self).release()
+        else:
+            self._lock.release()  # 未持有锁时由内部的 RLock 抛出 RuntimeError
+            self._depth -= 1
+
+    def locked(self):
+        return self._depth > 0
+
+    def _is_owned(self):
+        return self._lock._is_owned()
+
+    def _release_save(self):
+        # Condition.wait 完全释放锁，记录这一段持有时间
+        held = _clock() - self._acquired_at
+        depth, self._depth = self._depth, 0
+        state = self._lock._release_save()
+        self._stats.hold_time.record(held)
+        return state, depth
+
+    def _acquire_restore(self, saved):
+        # Condition.wait 被唤醒后重新获取锁，等待时间计入 wait_time
+        state, depth = saved
+        start = _clock()
+        self._lock._acquire_restore(state)
+        now = _clock()
+        stats = self._stats
+        stats.acquisitions += 1
+        stats.wait_time.record(now - start)
+        self._acquired_at, self._depth = now, depth
+
+
+class ProfiledCondition(threading.Condition):
+    """
+    在 threading.Condition 的基础上统计 wait 的次数和等待通知的时间
+    """
+
+    def __init__(self, lock, stats):
+        super(ProfiledCondition, self).__init__(lock)
+        self._stats = stats
+
+    def wait(self, timeout=None):
+        start = _clock()
+        try:
+            return super(ProfiledCondition, self).wait(timeout)
+        finally:
+            stats = self._stats
+            stats.cond_waits += 1
+            stats.cond_wait_time.record(_clock() - start)
+
+
+def Lock(name=None):
+    if not _state['enabled']:
+        return threading.Lock()
+    return ProfiledLock(threading.Lock(), get_stats(name or _caller_name(1)))
+
+
+def RLock(name=None):
+    if not _state['enabled']:
+        return threading.RLock()
+    return ProfiledRLock(threading.RLock(), get_stats(name or _caller_name(1)))
+
+
+def Condition(lock=None, name=None):
+    """
+    lock 为 None 时创建一个同名的 RLock；传入的 lock 是 ProfiledLock 时，Condition 的统计合并到该锁的名称下
+    """
+    if not _state['enabled']:
+        return threading.Condition(lock)
+    if isinstance(lock, ProfiledLock):
+        stats = lock._stats
+    else:
+        stats = get_stats(name or _caller_name(1))
+        lock = ProfiledRLock(threading.RLock(), stats) if lock is None else lock
+    return ProfiledCondition(lock, stats)
+
+
+def report(top=None):
+    """
+    按总等待时间从大到小返回各个锁的统计结果（时间单位为纳秒）
+    """
+    summaries = [s.summary() for s in REGISTRY.values() if s.acquisitions or s.contended]
+    summaries.sort(key=lambda s: (s['wait_total'], s['acquisitions']), reverse=True)
+    return summaries[:top] if top else summaries
+
+
+def reset():
+    for stats in REGISTRY.values():
+        stats.reset()
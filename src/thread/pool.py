@@ -0,0 +1,197 @@
+# coding=utf-8
+"""
+由 test_thread.py 中 runner(times) 和 TestingThread 的用法发展而来的线程池
+
+test_thread.py 中每个任务都启动一个新的 threading.Thread，创建和销毁线程的开销由每个任务承担。
+本模块的 ThreadPool 类：
+    1. 预先启动 workers 个工作线程，任务放入队列后由空闲的线程执行；
+    2. max_workers 大于 workers 时为弹性线程池：队列中的任务多于空闲线程时增加线程，
+       超出 workers 的线程空闲 idle_timeout 秒后退出；
+    3. 任务队列有容量上限 queue_size，队列已满时 submit 阻塞等待（与 TestingThread 相同，使用 Condition），
+       或者在 reject=True 时抛出 RejectedError，把压力反馈给调用者；
+    4. submit 返回 concurrent.futures.Future，可以通过 result() 等待结果或异常；
+    5. shutdown 后不再接受新任务，drain=True 时执行完队列中剩余的任务，否则取消它们；
+    6. stats 统计线程数、队列深度和任务数，wait_time / run_time 直方图记录任务的排队时间和执行时间（纳秒）
+"""
+import collections
+import concurrent.futures
+import itertools
+import threading
+import time
+
+from decorator.timing import Histogram
+
+PoolStats = collections.namedtuple('PoolStats', ['workers', 'idle', 'queued', 'max_queued', 'submitted', 'completed',
+                                                 'failed', 'cancelled', 'rejected'])
+
+
+class RejectedError(RuntimeError):
+    """
+    任务队列已满，并且线程池设置为拒绝新任务
+    """
+
+
+class ThreadPool(object):
+    """
+        workers 常驻的工作线程数
+        max_workers 工作线程数的上限，默认与 workers 相同，即固定大小的线程池
+        queue_size 任务队列的容量，None 表示不限
+        reject 队列已满时 submit 是否直接抛出 RejectedError，否则阻塞等待
+        idle_timeout 超出 workers 的线程空闲多少秒后退出
+    """
+
+    _counter = itertools.count(1)
+
+    def __init__(self, workers=4, max_workers=None, queue_size=1024, reject=False, idle_timeout=60.0, name=None):
+        if workers < 0 or (max_workers is not None and max_workers < max(workers, 1)):
+            raise ValueError('invalid worker count: workers={:}, max_workers={:}'.format(workers, max_workers))
+        self.__min_workers = workers
+        self.__max_workers = max(workers, 1) if max_workers is None else max_workers
+        self.__queue_size = queue_size
+        self.__reject = reject
+        self.__idle_timeout = idle_timeout
+        self.__name = name or 'pool-{:}'.format(next(self._counter))
+
+        self.__lock = threading.Lock()
+        self.__not_empty = threading.Condition(self.__lock)
+        self.__not_full = threading.Condition(self.__lock)
+        self.__tasks = collections.deque()
+        self.__workers = set()
+        self.__retired = []  # 空闲超时退出的线程，shutdown 时同样需要 join
+        self.__idle = 0
+        self.__shutdown = False
+        self.__thread_ids = itertools.count(1)
+
+        self.__max_queued = self.__submitted = self.__completed = 0
+        self.__failed = self.__cancelled = self.__rejected = 0
+        self.wait_time = Histogram(self.__name + '.wait')
+        self.run_time = Histogram(self.__name + '.run')
+
+        with self.__lock:
+            for _ in range(workers):
+                self.__spawn()
+
+    def __spawn(self):
+        # 调用时需持有 self.__lock
+        self.__retired = [t for t in self.__retired if t.is_alive()]
+        thread = threading.Thread(target=self.__work, name='{:}-{:}'.format(self.__name, next(self.__thread_ids)))
+        thread.daemon = True
+        self.__workers.add(thread)
+        thread.start()
+
+    def submit(self, fn, *args, **kwargs):
+        future = concurrent.futures.Future()
+        with self.__lock:
+            if self.__shutdown:
+                raise RuntimeError('cannot submit after shutdown')
+            while self.__queue_size is not None and len(self.__tasks) >= self.__queue_size:
+                if self.__reject:
+                    self.__rejected += 1
+                    raise RejectedError('task queue is full ({:})'.format(self.__queue_size))
+                self.__not_full.wait()
+                if self.__shutdown:
+                    raise RuntimeError('cannot submit after shutdown')
+
+            self.__tasks.append((future, fn, args, kwargs, time.perf_counter_ns()))
+            self.__submitted += 1
+            if len(self.__tasks) > self.__max_queued:
+                self.__max_queued = len(self.__tasks)
+            if len(self.__tasks) > self.__idle and len(self.__workers) < self.__max_workers:
+                self.__spawn()
+            else:
+                self.__not_empty.notify()
+        return future
+
+    def __next_task(self):
+        """
+        取出下一个任务，返回 None 表示当前线程应该退出，调用时需持有 self.__lock
+        """
+        tasks = self.__tasks
+        while not tasks:
+            if self.__shutdown:
+                return None
+            elastic = len(self.__workers) > self.__min_workers
+            self.__idle += 1
+            try:
+                notified = self.__not_empty.wait(self.__idle_timeout if elastic else None)
+            finally:
+                self.__idle -= 1
+            if not notified and not tasks and len(self.__workers) > self.__min_workers:
+                # 弹性线程空闲超时，在锁内移出 workers，避免多个线程同时超时后线程数低于 workers
+                self.__workers.discard(threading.current_thread())
+                self.__retired.append(threading.current_thread())
+                return None
+        self.__not_full.notify()
+        return tasks.popleft()
+
+    def __work(self):
+        task = None
+        try:
+            while True:
+                # 每个任务只获取一次锁：记录上一个任务的统计信息，同时取出下一个任务
+                with self.__lock:
+                    if task is not None:
+                        self.__record(*task)
+                    task = self.__next_task()
+                if task is None:
+                    return
+
+                future, fn, args, kwargs, queued_at = task
+                if not future.set_running_or_notify_cancel():
+                    task = (None, queued_at, None, None)  # 任务在排队时已被取消
+                    continue
+                started_at = time.perf_counter_ns()
+                try:
+                    result = fn(*args, **kwargs)
+                except BaseException as e:
+                    future.set_exception(e)
+                    task = (False, queued_at, started_at, time.perf_counter_ns())
+                else:
+                    future.set_result(result)
+                    task = (True, queued_at, started_at, time.perf_counter_ns())
+        finally:
+            with self.__lock:
+                self.__workers.discard(threading.current_thread())
+
+    def __record(self, succeeded, queued_at, started_at, finished_at):
+        # 调用时需持有 self.__lock
+        if succeeded is None:
+            self.__cancelled += 1
+            return
+        if succeeded:
+            self.__completed += 1
+        else:
+            self.__failed += 1
+        self.wait_time.record(started_at - queued_at)
+        self.run_time.record(finished_at - started_at)
+
+    def shutdown(self, wait=True, drain=True):
+        """
+        不再接受新任务，drain 为 False 时取消队列中尚未开始的任务；wait 为 True 时等待所有工作线程退出
+        """
+        with self.__lock:
+            self.__shutdown = True
+            if not drain:
+                while self.__tasks:
+                    future = self.__tasks.popleft()[0]
+                    future.cancel()
+                    self.__cancelled += 1
+            self.__not_empty.notify_all()
+            self.__not_full.notify_all()  # 唤醒阻塞在 submit 中的调用者
+            workers = list(self.__workers) + self.__retired
+        if wait:
+            for thread in workers:
+                if thread is not threading.current_thread():
+                    thread.join()
+
+    @property
+    def stats(self):
+        with self.__lock:
+            return PoolStats(len(self.__workers), self.__idle, len(self.__tasks), self.__max_queued,
+                             self.__submitted, self.__completed, self.__failed, self.__cancelled, self.__rejected)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.shutdown()
@@ -0,0 +1,175 @@
+# coding=utf-8
+"""
+代替 test_active_count 中手工 acquire / notify / release Condition 的同步原语，用于任务的分发与汇合
+
+手工使用 Condition 汇合多个任务时，通常每完成一个任务就 notify_all 一次，等待的线程被反复唤醒后
+发现条件仍不满足又重新等待。本模块的原语让每个等待的线程只被唤醒一次：
+    1. CountDownLatch：计数减到 0 之前 count_down 不唤醒任何线程，减到 0 时一次性放行所有等待的线程；
+    2. Barrier：可重复使用的屏障，每一轮使用单独的 Event，最后到达的线程放行本轮的线程并开始新的一轮，
+       本轮被放行的线程不会被下一轮的到达者唤醒；与 threading.Barrier 相同，超时或 abort 后屏障损坏，
+       wait 抛出 threading.BrokenBarrierError；
+    3. ResultCell：只能赋值一次的结果，赋值后 get 不再加锁也不再等待
+"""
+import threading
+
+
+class CountDownLatch(object):
+    def __init__(self, count):
+        if count < 0:
+            raise ValueError('count must not be negative, got {:}'.format(count))
+        self.__lock = threading.Lock()
+        self.__count = count
+        self.__released = threading.Event()
+        if not count:
+            self.__released.set()
+
+    @property
+    def count(self):
+        return self.__count
+
+    def count_down(self):
+        with self.__lock:
+            if not self.__count:
+                return
+            self.__count -= 1
+            if self.__count:
+                return
+        self.__released.set()  # 只在减到 0 时唤醒一次
+
+    def wait(self, timeout=None):
+        """
+        等待计数减到 0，返回 False 表示超时
+        """
+        return self.__released.wait(timeout)
+
+
+class _Generation(object):
+    """
+    屏障的一轮，broken 表示这一轮因为超时、abort 或 reset 而被放行
+    """
+    __slots__ = ('released', 'broken')
+
+    def __init__(self):
+        self.released = threading.Event()
+        self.broken = False
+
+
+class Barrier(object):
+    """
+        parties 每一轮需要到达的线程数
+        action 每一轮所有线程到达后，由最后到达的线程在放行其它线程之前调用
+    """
+
+    def __init__(self, parties, action=None):
+        if parties < 1:
+            raise ValueError('parties must be positive, got {:}'.format(parties))
+        self.__parties = parties
+        self.__action = action
+        self.__lock = threading.Lock()
+        self.__arrived = 0
+        self.__generation = _Generation()
+        self.__broken = False
+
+    @property
+    def parties(self):
+        return self.__parties
+
+    @property
+    def n_waiting(self):
+        return self.__arrived
+
+    @property
+    def broken(self):
+        return self.__broken
+
+    def wait(self, timeout=None):
+        """
+        返回到达的顺序 0 ~ parties - 1，最后到达的线程返回 parties - 1
+        """
+        with self.__lock:
+            if self.__broken:
+                raise threading.BrokenBarrierError
+            generation, index = self.__generation, self.__arrived
+            if index + 1 < self.__parties:
+                self.__arrived += 1
+            else:
+                if self.__action is not None:
+                    try:
+                        self.__action()
+                    except BaseException:
+                        self.__break()
+                        raise
+                # 开始新的一轮，再放行本轮的线程
+                self.__arrived = 0
+                self.__generation = _Generation()
+                generation.released.set()
+                return index
+
+        if not generation.released.wait(timeout):
+            with self.__lock:
+                if not generation.released.is_set():
+                    self.__break()  # 本轮超时，屏障损坏
+        if generation.broken:
+            raise threading.BrokenBarrierError
+        return index
+
+    def __break(self):
+        # 调用时需持有锁，放行本轮所有等待的线程，让它们抛出 BrokenBarrierError
+        self.__broken = True
+        self.__generation.broken = True
+        self.__generation.released.set()
+
+    def abort(self):
+        with self.__lock:
+            self.__break()
+
+    def reset(self):
+        """
+        放行（并损坏）当前一轮，然后恢复为可用的屏障
+        """
+        with self.__lock:
+            if self.__arrived:
+                self.__break()
+            self.__arrived = 0
+            self.__generation = _Generation()
+            self.__broken = False
+
+
+class ResultCell(object):
+    """
+    只能赋值一次的结果，set_result / set_exception 只能调用其中一个，并且只能调用一次
+    """
+    __slots__ = ('__lock', '__ready', '__done', '__value', '__error')
+
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self.__ready = threading.Event()
+        self.__done = False
+        self.__value = self.__error = None
+
+    def __set(self, value, error):
+        with self.__lock:
+            if self.__done:
+                raise RuntimeError('result already set')
+            self.__value, self.__error = value, error
+            self.__done = True
+        self.__ready.set()
+
+    def set_result(self, value):
+        self.__set(value, None)
+
+    def set_exception(self, error):
+        self.__set(None, error)
+
+    def done(self):
+        return self.__done
+
+    def get(self, timeout=None):
+        """
+        等待并返回结果，或者抛出设置的异常；超时抛出 TimeoutError
+        """
+        if not self.__done and not self.__ready.wait(timeout):
+            raise TimeoutError('result not set within {:} seconds'.format(timeout))
+        if self.__error is not None:
+            raise self.__error
+        return self.__value
@@ -0,0 +1,328 @@
+# coding=utf-8
+"""
+thread/pool.py 中 ThreadPool 的多进程版本，用于 test_thread.py 中 runner(times) 这类计算密集的任务
+
+受 GIL 的限制，计算密集的任务在多个线程中执行并不会更快。ProcessPool 与 ThreadPool 的用法相同
+（submit 返回 Future、有上限的队列、shutdown 和 stats），但任务在工作进程中执行：
+    1. 函数和参数在 submit 时就完成序列化，无法序列化的任务（例如 lambda）直接在 submit 中抛出异常；
+    2. 工作进程用 pickle 协议 5 序列化返回值，bytearray 等支持带外缓冲区的对象不会被复制进 pickle 数据；
+       序列化后的大小不小于 threshold 时，数据和带外缓冲区一起写入一块 multiprocessing.shared_memory，
+       通过结果队列只传递共享内存的名称和各段长度，主进程直接从共享内存反序列化，然后释放共享内存；
+    3. 主进程中的一个线程接收结果并完成 Future，工作进程数固定为 workers；
+    4. submit 只把任务放入进程内的队列，由单独的线程写入任务管道，管道写满时阻塞的是这个线程，
+       不会在持有锁时阻塞而与接收结果的线程互相等待；
+    5. 与 concurrent.futures.ProcessPoolExecutor 相同，工作进程意外退出时（例如被杀死）整个进程池损坏：
+       终止其余的工作进程，所有未完成的 Future 以 BrokenProcessPool 失败，之后的 submit 也抛出 BrokenProcessPool；
+    6. 工作进程开始执行任务时通知主进程，Future 此时才进入 running 状态，stats 中的 idle 和 queued
+       按已经开始的任务计算；shutdown(drain=False) 只取消尚未开始的任务
+任务管道和结果管道是进程池自己创建的 multiprocessing.Pipe，多个工作进程分别用一把进程间的锁串行地读取任务、写入结果
+"""
+import concurrent.futures
+import multiprocessing
+import os
+import pickle
+import queue
+import threading
+import time
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import connection, shared_memory
+
+from decorator.timing import Histogram
+from thread.pool import PoolStats, RejectedError
+
+_STOP = object()  # 通知写任务的线程退出
+
+
+def pack_result(value, threshold):
+    """
+    序列化返回值，返回 (kind, payload, layout)：
+        kind 为 'pickle' 时 payload 为 pickle 数据，layout 为带外缓冲区的列表；
+        kind 为 'shm' 时 payload 为共享内存的名称，layout 为 pickle 数据和各个带外缓冲区的长度
+    """
+    buffers = []
+    data = pickle.dumps(value, protocol=5, buffer_callback=buffers.append)
+    views = [b.raw() for b in buffers]
+    size = len(data) + sum(v.nbytes for v in views)
+    if size < threshold:
+        return 'pickle', data, [v.tobytes() for v in views]
+
+    shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+    try:
+        layout, offset = [], 0
+        for chunk in [data] + views:
+            n = len(chunk) if isinstance(chunk, bytes) else chunk.nbytes
+            shm.buf[offset:offset + n] = chunk
+            layout.append(n)
+            offset += n
+        return 'shm', shm.name, layout
+    finally:
+        shm.close()  # 由接收方 unlink
+
+
+def unpack_result(kind, payload, layout):
+    if kind == 'pickle':
+        return pickle.loads(payload, buffers=layout)
+
+    shm = shared_memory.SharedMemory(name=payload)
+    try:
+        chunks, offset = [], 0
+        for n in layout:
+            with shm.buf[offset:offset + n] as view:
+                # 带外缓冲区复制为 bytearray，反序列化的对象不会引用即将释放的共享内存
+                chunks.append(bytes(view) if not chunks else bytearray(view))
+            offset += n
+        return pickle.loads(chunks[0], buffers=chunks[1:])
+    finally:
+        shm.close()
+        shm.unlink()
+
+
+def _worker(tasks, results, read_lock, write_lock, abort, threshold):
+    def send(message):
+        with write_lock:
+            results.send(message)
+
+    while True:
+        with read_lock:
+            task = tasks.recv()
+        if task is None:
+            send(os.getpid())  # 通知主进程该工作进程正常退出
+            return
+        task_id, payload = task
+        if abort.is_set():
+            send((task_id, 'cancelled'))
+            continue
+        send((task_id, 'started'))
+        started_at = time.perf_counter_ns()
+        try:
+            fn, args, kwargs = pickle.loads(payload)
+            message = (task_id, 'ok', pack_result(fn(*args, **kwargs), threshold))
+        except BaseException as e:
+            try:
+                message = (task_id, 'error', pickle.dumps(e))
+            except Exception:
+                message = (task_id, 'error', pickle.dumps(RuntimeError(repr(e))))
+        send(message + (started_at, time.perf_counter_ns()))
+
+
+class ProcessPool(object):
+    """
+        workers 工作进程数，默认为 CPU 核数
+        queue_size 尚未被取走的任务数的上限，None 表示不限
+        reject 队列已满时 submit 是否直接抛出 RejectedError，否则阻塞等待
+        threshold 返回值序列化后不小于该字节数时通过共享内存传递
+        context multiprocessing 的上下文，例如 multiprocessing.get_context('spawn')
+    """
+
+    def __init__(self, workers=None, queue_size=1024, reject=False, threshold=1 << 16, context=None):
+        self.__workers = workers or os.cpu_count() or 1
+        self.__queue_size = queue_size
+        self.__reject = reject
+        context = context or multiprocessing.get_context()
+
+        self.__lock = threading.Lock()
+        self.__not_full = threading.Condition(self.__lock)
+        self.__pending = {}  # task_id -> (future, submitted_at)
+        self.__running = set()  # 已经开始执行的 task_id
+        self.__next_id = 0
+        self.__shutdown = False
+        self.__broken = None  # 进程池损坏的原因
+
+        self.__max_queued = self.__submitted = self.__completed = 0
+        self.__failed = self.__cancelled = self.__rejected = 0
+        self.wait_time = Histogram('process-pool.wait')
+        self.run_time = Histogram('process-pool.run')
+
+        self.__feed = queue.SimpleQueue()
+        self.__task_reader, self.__task_writer = context.Pipe(duplex=False)
+        self.__result_reader, self.__result_writer = context.Pipe(duplex=False)
+        # 多个工作进程共用管道的读端和写端，各用一把锁保证每条消息完整地读出和写入
+        self.__read_lock, self.__write_lock = context.Lock(), context.Lock()
+        self.__abort = context.Event()
+        self.__processes = []
+        for _ in range(self.__workers):
+            process = context.Process(target=_worker, args=(self.__task_reader, self.__result_writer, self.__read_lock,
+                                                            self.__write_lock, self.__abort, threshold))
+            process.daemon = True
+            process.start()
+            self.__processes.append(process)
+        self.__feeder = threading.Thread(target=self.__feed_tasks, name='process-pool-feeder')
+        self.__feeder.daemon = True
+        self.__feeder.start()
+        self.__collector = threading.Thread(target=self.__collect, name='process-pool-collector')
+        self.__collector.daemon = True
+        self.__collector.start()
+
+    def __check(self):
+        # 调用时需持有锁
+        if self.__broken is not None:
+            raise BrokenProcessPool(self.__broken)
+        if self.__shutdown:
+            raise RuntimeError('cannot submit after shutdown')
+
+    def submit(self, fn, *args, **kwargs):
+        payload = pickle.dumps((fn, args, kwargs))  # 在调用者的线程中序列化，错误直接抛给调用者
+        future = concurrent.futures.Future()
+        with self.__lock:
+            self.__check()
+            while self.__queue_size is not None and len(self.__pending) >= self.__queue_size + self.__workers:
+                if self.__reject:
+                    self.__rejected += 1
+                    raise RejectedError('task queue is full ({:})'.format(self.__queue_size))
+                self.__not_full.wait()
+                self.__check()
+
+            task_id = self.__next_id
+            self.__next_id += 1
+            self.__pending[task_id] = (future, time.perf_counter_ns())
+            self.__submitted += 1
+            self.__max_queued = max(self.__max_queued, len(self.__pending) - self.__workers)
+            self.__feed.put((task_id, payload))  # 不会阻塞，与 shutdown 放入的结束标记保持先后顺序
+        return future
+
+    def __feed_tasks(self):
+        while True:
+            task = self.__feed.get()
+            if task is _STOP:
+                return
+            if self.__broken is None:
+                self.__task_writer.send(task)
+
+    def __collect(self):
+        # 与 ProcessPoolExecutor 相同，同时等待结果管道和各个工作进程的 sentinel
+        reader = self.__result_reader
+        processes = {process.sentinel: process for process in self.__processes}
+        exited = set()
+        while processes:
+            ready = connection.wait([reader] + list(processes))
+            # 工作进程先写入退出通知再退出，所以先读完管道中的消息，再判断退出的进程是否正常退出
+            while reader.poll():
+                message = reader.recv()
+                if isinstance(message, int):
+                    exited.add(message)
+                elif message[1] == 'started':
+                    self.__start(message[0])
+                elif message[1] == 'cancelled':
+                    self.__skip(message[0])
+                else:
+                    self.__complete(*message)
+            for sentinel in ready:
+                process = processes.pop(sentinel, None)
+                if process is not None and process.pid not in exited:
+                    self.__break(process)
+                    return
+
+    def __start(self, task_id):
+        with self.__lock:
+            future = self.__pending[task_id][0]
+            self.__running.add(task_id)
+        # 调用者在任务开始前取消了 Future 时返回 False，任务仍会执行，结果在 __complete 中被丢弃
+        future.set_running_or_notify_cancel()
+
+    def __skip(self, task_id):
+        """
+        shutdown(drain=False) 之后工作进程跳过了尚未开始的任务
+        """
+        with self.__lock:
+            future = self.__pending.pop(task_id)[0]
+            self.__cancelled += 1
+            self.__not_full.notify()
+        future.cancel()
+        future.set_running_or_notify_cancel()  # 通知 concurrent.futures.wait 等等待者
+
+    def __complete(self, task_id, status, value, started_at, finished_at):
+        with self.__lock:
+            future, submitted_at = self.__pending.pop(task_id)
+            self.__running.discard(task_id)
+            self.__not_full.notify()
+        if future.cancelled():
+            if status == 'ok' and value[0] == 'shm':
+                shm = shared_memory.SharedMemory(name=value[1])  # 结果被丢弃，仍需释放共享内存
+                shm.close()
+                shm.unlink()
+            with self.__lock:
+                self.__cancelled += 1
+            return
+        try:
+            if status == 'ok':
+                future.set_result(unpack_result(*value))
+            else:
+                future.set_exception(pickle.loads(value))
+        except BaseException as e:
+            future.set_exception(e)
+        with self.__lock:
+            if status == 'ok':
+                self.__completed += 1
+            else:
+                self.__failed += 1
+            self.wait_time.record(max(started_at - submitted_at, 0))
+            self.run_time.record(finished_at - started_at)
+
+    def __break(self, process):
+        """
+        工作进程意外退出：终止其余的工作进程，未完成的 Future 以 BrokenProcessPool 失败
+        """
+        reason = 'worker process {:} exited unexpectedly with code {:}'.format(process.pid, process.exitcode)
+        with self.__lock:
+            self.__broken = reason
+            self.__shutdown = True
+            pending, self.__pending = self.__pending, {}
+            self.__running.clear()
+            self.__feed.put(_STOP)
+            self.__not_full.notify_all()
+        self.__abort.set()
+        for process in self.__processes:
+            process.terminate()
+            process.join()
+
+        failed = 0
+        for future, _ in pending.values():
+            if future.running() or future.set_running_or_notify_cancel():
+                future.set_exception(BrokenProcessPool(reason))
+                failed += 1
+        with self.__lock:
+            self.__failed += failed
+            self.__cancelled += len(pending) - failed
+
+        # 任务管道已经没有读者，读出剩余的数据，让阻塞在写入上的线程退出；
+        # 被终止的工作进程可能读了半条消息，所以按字节读取，不按消息读取
+        reader = self.__task_reader
+        while self.__feeder.is_alive():
+            if reader.poll(0.01):
+                os.read(reader.fileno(), 1 << 16)
+
+    def shutdown(self, wait=True, drain=True):
+        """
+        不再接受新任务，drain 为 False 时工作进程跳过尚未开始的任务，由接收结果的线程取消它们的 Future，
+        已经开始的任务照常完成；wait 为 True 时等待所有工作进程退出
+        """
+        with self.__lock:
+            if not self.__shutdown:
+                self.__shutdown = True
+                for _ in self.__processes:
+                    self.__feed.put(None)
+                self.__feed.put(_STOP)
+            if not drain:
+                self.__abort.set()
+            self.__not_full.notify_all()
+        if wait:
+            for process in self.__processes:
+                process.join()
+            self.__collector.join()
+            self.__feeder.join()
+            for conn in (self.__task_reader, self.__task_writer, self.__result_reader, self.__result_writer):
+                conn.close()
+
+    @property
+    def stats(self):
+        with self.__lock:
+            pending, running = len(self.__pending), len(self.__running)
+            return PoolStats(self.__workers, self.__workers - running, pending - running,
+                             self.__max_queued, self.__submitted, self.__completed, self.__failed, self.__cancelled,
+                             self.__rejected)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.shutdown()
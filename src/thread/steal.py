@@ -0,0 +1,168 @@
+# coding=utf-8
+"""
+基于 TestThread 中 threading.Thread / Condition 用法的工作窃取调度器
+
+thread/pool.py 中所有工作线程共用一个任务队列，大量很小的任务会集中竞争这个队列的锁。本模块的 Scheduler 类：
+    1. 每个工作线程拥有自己的 collections.deque，deque 的 append / pop / popleft 是原子操作，工作线程取任务和窃取
+       任务时不需要加锁；
+    2. 外部线程提交的任务按轮转的顺序放入各个工作线程的队列，工作线程内部提交的任务（例如拆分出的子任务）
+       放入自己的队列；
+    3. 工作线程从自己队列的尾部取任务（后进先出，刚拆分出的子任务数据仍在缓存中），
+       自己的队列为空时从其它线程队列的头部窃取一半的任务（先进先出，通常是较大的任务）；
+    4. 所有队列都为空时，工作线程在 Condition 上等待；提交任务时在 Condition 的锁中检查 shutdown 并放入任务
+       （与 ThreadPool.submit 相同，不会在 shutdown 之后放入无人执行也无人取消的任务），只在有等待的线程时才唤醒
+所以执行时间相差很大的任务（例如 times 各不相同的 runner）也能在各线程之间自动均衡
+"""
+import collections
+import concurrent.futures
+import itertools
+import random
+import threading
+
+SchedulerStats = collections.namedtuple('SchedulerStats', ['workers', 'queued', 'executed', 'stolen', 'failed'])
+
+_local = threading.local()
+
+
+class Scheduler(object):
+    """
+        workers 工作线程数
+        park_timeout 空闲线程每次等待的最长时间（秒），只是防止意外丢失唤醒的保险
+    """
+
+    _counter = itertools.count(1)
+
+    def __init__(self, workers=4, park_timeout=0.1, name=None):
+        if workers < 1:
+            raise ValueError('invalid worker count: {:}'.format(workers))
+        self.__park_timeout = park_timeout
+        name = name or 'scheduler-{:}'.format(next(self._counter))
+
+        self.__queues = [collections.deque() for _ in range(workers)]
+        self.__cond = threading.Condition()
+        self.__idle = 0
+        self.__shutdown = False
+        self.__next = itertools.count()
+
+        # 每个计数只由对应的工作线程修改，不需要加锁
+        self.__executed = [0] * workers
+        self.__stolen = [0] * workers
+        self.__failed = [0] * workers
+
+        self.__threads = []
+        for index in range(workers):
+            thread = threading.Thread(target=self.__work, args=(index,), name='{:}-{:}'.format(name, index + 1))
+            thread.daemon = True
+            thread.start()
+            self.__threads.append(thread)
+
+    def submit(self, fn, *args, **kwargs):
+        future = concurrent.futures.Future()
+        worker = getattr(_local, 'worker', None)
+        if worker is not None and worker[0] is self:
+            queue = self.__queues[worker[1]]
+        else:
+            queue = self.__queues[next(self.__next) % len(self.__queues)]
+        with self.__cond:
+            if self.__shutdown:
+                raise RuntimeError('cannot submit after shutdown')
+            queue.append((future, fn, args, kwargs))
+            if self.__idle:
+                self.__cond.notify()
+        return future
+
+    def __steal(self, index):
+        """
+        从其它线程的队列头部窃取一半的任务，返回其中一个，其余放入自己的队列
+        """
+        queues = self.__queues
+        count = len(queues)
+        start = random.randrange(count)
+        for offset in range(count):
+            victim = queues[(start + offset) % count]
+            if victim is queues[index]:
+                continue
+            try:
+                task = victim.popleft()
+            except IndexError:
+                continue
+            own = queues[index]
+            for _ in range(len(victim) // 2):
+                try:
+                    own.append(victim.popleft())
+                except IndexError:
+                    break
+            self.__stolen[index] += 1
+            return task
+        return None
+
+    def __park(self):
+        """
+        所有队列都为空时等待新的任务，返回 False 表示线程应该退出
+        """
+        with self.__cond:
+            self.__idle += 1
+            try:
+                # 先增加 __idle 再检查队列：之后提交的任务一定会看到 __idle 并唤醒等待的线程
+                if not any(self.__queues):
+                    if self.__shutdown:
+                        return False
+                    self.__cond.wait(self.__park_timeout)
+            finally:
+                self.__idle -= 1
+        return True
+
+    def __work(self, index):
+        _local.worker = (self, index)
+        own = self.__queues[index]
+        while True:
+            try:
+                task = own.pop()
+            except IndexError:
+                task = self.__steal(index)
+                if task is None:
+                    if self.__park():
+                        continue
+                    return
+
+            future, fn, args, kwargs = task
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                result = fn(*args, **kwargs)
+            except BaseException as e:
+                future.set_exception(e)
+                self.__failed[index] += 1
+            else:
+                future.set_result(result)
+            self.__executed[index] += 1
+
+    def shutdown(self, wait=True, drain=True):
+        """
+        不再接受新任务，drain 为 False 时取消队列中尚未开始的任务；wait 为 True 时等待所有工作线程退出
+        """
+        with self.__cond:
+            self.__shutdown = True
+            if not drain:
+                for queue in self.__queues:
+                    while True:
+                        try:
+                            queue.popleft()[0].cancel()
+                        except IndexError:
+                            break
+            self.__cond.notify_all()
+        if wait:
+            for thread in self.__threads:
+                if thread is not threading.current_thread():
+                    thread.join()
+
+    @property
+    def stats(self):
+        return SchedulerStats(len(self.__threads), sum(len(q) for q in self.__queues), tuple(self.__executed),
+                              sum(self.__stolen), sum(self.__failed))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.shutdown()
@@ -0,0 +1,104 @@
+# coding=utf-8
+from unittest import TestCase
+import asyncio
+import threading
+import time
+
+
+class TestCoroutine(TestCase):
+    """
+    test_thread.py 中各个用法的 asyncio 版本：任务是事件循环中的协程，而不是操作系统的线程
+    """
+
+    def test_start_task_by_function(self):
+        total = 0
+
+        async def runner(times):
+            nonlocal total
+            for x in range(times):
+                total += 1
+
+        async def main():
+            task = asyncio.create_task(runner(times=10))
+            await task
+
+        asyncio.run(main())
+        self.assertEqual(total, 10)
+
+    def test_start_task_by_runner_instance(self):
+        class Runner(object):
+            def __init__(self, times):
+                self.__n, self.__times = 0, times
+
+            @property
+            def n(self):
+                return self.__n
+
+            async def run(self):
+                for x in range(self.__times):
+                    self.__n += 1
+                    await asyncio.sleep(0)  # 每次循环都让出事件循环
+
+        runner = Runner(10)
+        asyncio.run(runner.run())
+        self.assertEqual(runner.n, 10)
+
+    def test_start_task_by_callable_instance(self):
+        class Runner(object):
+            def __init__(self):
+                self.__n = 0
+
+            @property
+            def n(self):
+                return self.__n
+
+            async def __call__(self, **kwargs):
+                for x in range(kwargs['times']):
+                    self.__n += 1
+
+        runner = Runner()
+        asyncio.run(runner(times=10))
+        self.assertEqual(runner.n, 10)
+
+    def test_sleep(self):
+        """
+        100 个任务同时等待，总耗时与一个任务相近，并且不会创建新的线程
+        """
+
+        async def runner(sleep_time):
+            await asyncio.sleep(sleep_time)
+
+        async def main():
+            await asyncio.gather(*[runner(0.1) for _ in range(100)])
+
+        count = threading.active_count()
+        ts = time.time()
+        asyncio.run(main())
+        te = time.time()
+        self.assertGreaterEqual((te - ts) * 1000, 100)
+        self.assertLess((te - ts) * 1000, 1000)
+        self.assertEqual(threading.active_count(), count)
+
+    def test_active_count(self):
+        """
+        与 test_active_count 相同，使用 asyncio.Condition 在任务之间发送信号
+        """
+
+        async def main():
+            self.assertEqual(len(asyncio.all_tasks()), 1)
+
+            async def runner(_condition):
+                async with _condition:
+                    await _condition.wait()
+
+            condition = asyncio.Condition()
+            task = asyncio.create_task(runner(condition))
+            await asyncio.sleep(0)  # 让 runner 开始等待
+            self.assertEqual(len(asyncio.all_tasks()), 2)
+
+            async with condition:
+                condition.notify()
+            await task
+            self.assertEqual(len(asyncio.all_tasks()), 1)
+
+        asyncio.run(main())
@@ -0,0 +1,120 @@
+# coding=utf-8
+from unittest import TestCase
+import threading
+import time
+
+from thread import lockprof
+
+
+def stats_of(name):
+    return [s for s in lockprof.report() if s['name'] == name][0]
+
+
+class TestLockProfiler(TestCase):
+    def setUp(self):
+        lockprof.REGISTRY.clear()  # 每次测试使用新的统计
+
+    def tearDown(self):
+        lockprof.set_enabled(True)
+
+    def test_contention(self):
+        """
+        另一个线程持有锁时，获取锁需要等待，等待时间和持有时间都被记录
+        """
+        lock = lockprof.Lock('test.lock')
+        held = threading.Event()
+
+        def holder():
+            with lock:
+                held.set()
+                time.sleep(0.05)
+
+        thread = threading.Thread(target=holder)
+        thread.start()
+        held.wait(5)
+        with lock:
+            pass
+        thread.join()
+
+        summary = stats_of('test.lock')
+        self.assertEqual(summary['acquisitions'], 2)
+        self.assertEqual(summary['contended'], 1)
+        self.assertGreaterEqual(summary['wait_max'], 10 ** 7)
+        self.assertGreaterEqual(summary['hold_max'], 4 * 10 ** 7)
+
+    def test_rlock(self):
+        """
+        重入的 acquire 不计为新的获取
+        """
+        lock = lockprof.RLock('test.rlock')
+        with lock:
+            with lock:
+                self.assertTrue(lock.locked())
+        self.assertFalse(lock.locked())
+        self.assertRaises(RuntimeError, lock.release)
+
+        summary = stats_of('test.rlock')
+        self.assertEqual((summary['acquisitions'], summary['contended']), (1, 0))
+        self.assertEqual(lockprof.get_stats('test.rlock').hold_time.count, 1)
+
+    def test_condition(self):
+        """
+        和 test_thread.py 中 test_active_count 的用法相同，统计 wait 的次数和等待通知的时间
+        """
+        for profiled in (False, True):  # 使用默认的 RLock，以及传入的 Lock
+            lockprof.REGISTRY.clear()
+            lock = lockprof.Lock('test.condition') if profiled else None
+            condition = lockprof.Condition(lock, name='test.condition')
+            waiting = threading.Event()
+
+            def runner():
+                with condition:
+                    waiting.set()
+                    condition.wait(5)
+
+            thread = threading.Thread(target=runner)
+            thread.start()
+            waiting.wait(5)
+            time.sleep(0.01)
+            with condition:
+                condition.notify()
+            thread.join()
+
+            summary = stats_of('test.condition')
+            self.assertEqual(summary['cond_waits'], 1)
+            self.assertGreaterEqual(summary['cond_wait_p99'], 5 * 10 ** 6)
+            self.assertGreaterEqual(summary['acquisitions'], 3)  # runner、notify 和 wait 返回前重新获取
+
+    def test_report(self):
+        """
+        report 按总等待时间从大到小排序，未命名的锁以创建的位置为名称
+        """
+        cold = lockprof.Lock()
+        hot = lockprof.Lock('test.hot')
+        with cold:
+            pass
+
+        def holder():
+            with hot:
+                time.sleep(0.02)
+
+        thread = threading.Thread(target=holder)
+        thread.start()
+        time.sleep(0.005)
+        with hot:
+            pass
+        thread.join()
+
+        names = [s['name'] for s in lockprof.report()]
+        self.assertEqual(names[0], 'test.hot')
+        self.assertTrue(names[1].startswith('test_lockprof.py:'))
+        self.assertEqual(len(lockprof.report(top=1)), 1)
+
+    def test_disabled(self):
+        """
+        关闭后创建的就是 threading 中原本的锁
+        """
+        lockprof.set_enabled(False)
+        self.assertIs(type(lockprof.Lock()), type(threading.Lock()))
+        self.assertIs(type(lockprof.RLock()), type(threading.RLock()))
+        self.assertIs(type(lockprof.Condition()), threading.Condition)
@@ -0,0 +1,129 @@
+# coding=utf-8
+from unittest import TestCase
+import threading
+import time
+
+from thread.pool import RejectedError, ThreadPool
+
+
+class TestPool(TestCase):
+    def test_submit(self):
+        """
+        和 test_thread.py 中的 runner(times) 相同，但任务由线程池中的线程执行
+        """
+
+        def runner(times):
+            total = 0
+            for x in range(times):
+                total += 1
+            return total
+
+        with ThreadPool(workers=2) as pool:
+            futures = [pool.submit(runner, times=n) for n in range(10)]
+            self.assertEqual([f.result() for f in futures], list(range(10)))
+
+        stats = pool.stats
+        self.assertEqual((stats.submitted, stats.completed, stats.workers), (10, 10, 0))
+        self.assertEqual(pool.run_time.count, 10)
+        self.assertEqual(pool.wait_time.count, 10)
+
+    def test_exception(self):
+        def fail():
+            raise KeyError('x')
+
+        with ThreadPool(workers=1) as pool:
+            future = pool.submit(fail)
+            self.assertRaises(KeyError, future.result)
+        self.assertEqual(pool.stats.failed, 1)
+
+    def test_reject(self):
+        """
+        reject=True 时，队列已满后 submit 抛出 RejectedError
+        """
+        event = threading.Event()
+        pool = ThreadPool(workers=1, queue_size=1, reject=True)
+        try:
+            running = threading.Event()
+            pool.submit(lambda: (running.set(), event.wait(5)))
+            running.wait(5)  # 唯一的线程正在执行第一个任务
+            pool.submit(event.wait, 5)  # 放入队列
+            self.assertRaises(RejectedError, pool.submit, event.wait, 5)
+            self.assertEqual(pool.stats.rejected, 1)
+        finally:
+            event.set()
+            pool.shutdown()
+
+    def test_block(self):
+        """
+        reject=False 时，队列已满后 submit 阻塞，直到有线程取走任务
+        """
+        event = threading.Event()
+        pool = ThreadPool(workers=1, queue_size=1)
+        try:
+            pool.submit(event.wait, 5)
+            pool.submit(event.wait, 5)
+            submitted = []
+            thread = threading.Thread(target=lambda: submitted.append(pool.submit(lambda: 1)))
+            thread.start()
+            thread.join(0.1)
+            self.assertEqual(submitted, [])  # 仍然阻塞在 submit 中
+            event.set()
+            thread.join()
+            self.assertEqual(submitted[0].result(5), 1)
+        finally:
+            event.set()
+            pool.shutdown()
+
+    def test_shutdown(self):
+        """
+        drain=True 时执行完队列中的任务，drain=False 时取消它们
+        """
+        results = []
+        with ThreadPool(workers=1) as pool:
+            for n in range(100):
+                pool.submit(results.append, n)
+        self.assertEqual(results, list(range(100)))
+        self.assertRaises(RuntimeError, pool.submit, results.append, 0)
+
+        event = threading.Event()
+        pool = ThreadPool(workers=1)
+        running = threading.Event()
+        pool.submit(lambda: (running.set(), event.wait(5)))
+        running.wait(5)
+        futures = [pool.submit(results.append, n) for n in range(10)]
+        event.set()
+        pool.shutdown(drain=False)
+        self.assertTrue(all(f.cancelled() for f in futures))
+        self.assertEqual(pool.stats.cancelled, 10)
+
+    def test_elastic(self):
+        """
+        任务多于空闲线程时增加线程，超出 workers 的线程空闲超时后退出
+        """
+        event = threading.Event()
+        pool = ThreadPool(workers=1, max_workers=4, idle_timeout=0.05)
+        try:
+            futures = [pool.submit(event.wait, 5) for _ in range(4)]
+            self.assertEqual(pool.stats.workers, 4)
+            event.set()
+            for f in futures:
+                f.result(5)
+
+            deadline = time.time() + 5
+            while pool.stats.workers > 1 and time.time() < deadline:
+                time.sleep(0.01)
+            self.assertEqual(pool.stats.workers, 1)
+        finally:
+            event.set()
+            pool.shutdown()
+
+    def test_threads_joined(self):
+        """
+        shutdown 后所有工作线程都已退出，不影响 test_thread.py 中 active_count 的断言
+        """
+        count = threading.active_count()
+        with ThreadPool(workers=2, max_workers=8, idle_timeout=0.01) as pool:
+            for f in [pool.submit(time.sleep, 0.01) for _ in range(8)]:
+                f.result()
+            time.sleep(0.05)
+        self.assertEqual(threading.active_count(), count)
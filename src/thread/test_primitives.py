@@ -0,0 +1,100 @@
+# coding=utf-8
+from unittest import TestCase
+import threading
+
+from thread.primitives import Barrier, CountDownLatch, ResultCell
+
+
+def start_threads(target, count, *args):
+    threads = [threading.Thread(target=target, args=args) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    return threads
+
+
+class TestPrimitives(TestCase):
+    def test_latch(self):
+        """
+        分发 100 个任务，等待它们全部完成
+        """
+        latch = CountDownLatch(100)
+        results = []
+
+        def runner():
+            results.append(1)
+            latch.count_down()
+
+        threads = [threading.Thread(target=runner) for _ in range(100)]
+        for thread in threads:
+            thread.start()
+        self.assertTrue(latch.wait(5))
+        self.assertEqual(len(results), 100)
+        self.assertEqual(latch.count, 0)
+        for thread in threads:
+            thread.join()
+
+        latch.count_down()  # 计数为 0 后不再变化
+        self.assertEqual(latch.count, 0)
+        self.assertTrue(CountDownLatch(0).wait(0))
+        self.assertFalse(CountDownLatch(1).wait(0.01))
+
+    def test_barrier(self):
+        """
+        屏障可以重复使用，每一轮所有线程都到达后才继续
+        """
+        rounds, parties = 10, 4
+        actions = []
+        barrier = Barrier(parties, action=lambda: actions.append(1))
+        progress = []
+
+        def runner():
+            for n in range(rounds):
+                progress.append(n)
+                barrier.wait(5)
+
+        threads = start_threads(runner, parties)
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(actions), rounds)
+        # 每一轮的记录都在下一轮之前
+        self.assertEqual(progress, sorted(progress))
+        self.assertFalse(barrier.broken)
+
+    def test_barrier_broken(self):
+        barrier = Barrier(2)
+        self.assertRaises(threading.BrokenBarrierError, barrier.wait, 0.01)
+        self.assertTrue(barrier.broken)
+        self.assertRaises(threading.BrokenBarrierError, barrier.wait)
+
+        barrier.reset()
+        self.assertFalse(barrier.broken)
+        errors = []
+
+        def runner():
+            try:
+                barrier.wait(5)
+            except threading.BrokenBarrierError:
+                errors.append(1)
+
+        threads = start_threads(runner, 1)
+        while not barrier.n_waiting:
+            threading.Event().wait(0.001)
+        barrier.abort()
+        threads[0].join()
+        self.assertEqual(errors, [1])
+
+    def test_result_cell(self):
+        cell = ResultCell()
+        self.assertFalse(cell.done())
+        self.assertRaises(TimeoutError, cell.get, 0.01)
+
+        threads = start_threads(cell.set_result, 1, 42)
+        self.assertEqual(cell.get(5), 42)
+        threads[0].join()
+        self.assertTrue(cell.done())
+        self.assertRaises(RuntimeError, cell.set_result, 0)
+
+        cell = ResultCell()
+        cell.set_exception(KeyError('x'))
+        self.assertRaises(KeyError, cell.get)
@@ -0,0 +1,118 @@
+# coding=utf-8
+from unittest import TestCase
+from concurrent.futures.process import BrokenProcessPool
+import os
+import pickle
+import time
+
+from thread.pool import RejectedError
+from thread.procpool import ProcessPool, pack_result, unpack_result
+
+
+def runner(times):
+    total = 0
+    for x in range(times):
+        total += 1
+    return total
+
+
+def fail():
+    raise KeyError('x')
+
+
+def crash(code):
+    os._exit(code)
+
+
+def make_buffer(size):
+    return {'data': bytearray(b'x' * size), 'size': size}
+
+
+class TestProcessPool(TestCase):
+    def test_submit(self):
+        """
+        和 test_thread.py 中的 runner(times) 相同，但任务在工作进程中执行
+        """
+        with ProcessPool(workers=2) as pool:
+            futures = [pool.submit(runner, times=n) for n in range(10)]
+            self.assertEqual([f.result(10) for f in futures], list(range(10)))
+
+        stats = pool.stats
+        self.assertEqual((stats.submitted, stats.completed), (10, 10))
+        self.assertEqual(pool.run_time.count, 10)
+
+    def test_exception(self):
+        with ProcessPool(workers=1) as pool:
+            self.assertRaises(KeyError, pool.submit(fail).result, 10)
+            # 任务在 submit 时序列化，lambda 无法序列化，直接抛出异常
+            self.assertRaises((pickle.PicklingError, AttributeError), pool.submit, lambda: 1)
+        self.assertEqual(pool.stats.failed, 1)
+
+    def test_shared_memory(self):
+        """
+        较大的返回值通过共享内存传递
+        """
+        kind, payload, layout = pack_result(make_buffer(1 << 20), threshold=1 << 16)
+        self.assertEqual(kind, 'shm')
+        self.assertEqual(sum(layout) > 1 << 20, True)
+        self.assertEqual(unpack_result(kind, payload, layout), make_buffer(1 << 20))
+
+        kind, payload, layout = pack_result(make_buffer(10), threshold=1 << 16)
+        self.assertEqual(kind, 'pickle')
+        self.assertEqual(unpack_result(kind, payload, layout), make_buffer(10))
+
+        with ProcessPool(workers=2, threshold=1 << 10) as pool:
+            futures = [pool.submit(make_buffer, n) for n in (1, 1 << 10, 1 << 20)]
+            self.assertEqual([f.result(10) for f in futures], [make_buffer(n) for n in (1, 1 << 10, 1 << 20)])
+
+    def test_reject(self):
+        pool = ProcessPool(workers=1, queue_size=1, reject=True)
+        try:
+            pool.submit(time.sleep, 0.2)
+            pool.submit(time.sleep, 0)
+            self.assertRaises(RejectedError, pool.submit, time.sleep, 0)
+            self.assertEqual(pool.stats.rejected, 1)
+        finally:
+            pool.shutdown()
+
+    def test_shutdown(self):
+        """
+        drain=False 时尚未开始的任务被取消，已经开始的任务照常完成
+        """
+        pool = ProcessPool(workers=1)
+        started = pool.submit(time.sleep, 0.2)
+        futures = [pool.submit(runner, 10) for _ in range(10)]
+        deadline = time.time() + 10
+        while not started.running() and time.time() < deadline:
+            time.sleep(0.001)
+        self.assertTrue(started.running())
+        self.assertEqual(pool.stats.idle, 0)
+        self.assertEqual(pool.stats.queued, 10)
+        pool.shutdown(drain=False)
+        self.assertIsNone(started.result(0))
+        self.assertFalse(started.cancelled())
+        self.assertTrue(all(f.cancelled() for f in futures))
+        self.assertEqual(pool.stats.completed, 1)
+        self.assertEqual(pool.stats.cancelled, 10)
+        self.assertRaises(RuntimeError, pool.submit, runner, 10)
+
+    def test_full_pipes(self):
+        """
+        任务管道和结果管道都写满时，submit 不会在持有锁时阻塞，与接收结果的线程互相等待
+        """
+        with ProcessPool(workers=1) as pool:
+            futures = [pool.submit(bytes, b'x' * (1 << 10)) for _ in range(2000)]
+            self.assertTrue(all(len(f.result(30)) == 1 << 10 for f in futures))
+        self.assertEqual(pool.stats.completed, 2000)
+
+    def test_worker_crash(self):
+        """
+        工作进程意外退出时，未完成的任务以 BrokenProcessPool 失败，shutdown 不会一直等待
+        """
+        pool = ProcessPool(workers=2)
+        futures = [pool.submit(crash, 3)] + [pool.submit(time.sleep, 1) for _ in range(10)]
+        self.assertRaises(BrokenProcessPool, futures[0].result, 10)
+        for future in futures:
+            self.assertIsNotNone(future.exception(10))
+        self.assertRaises(BrokenProcessPool, pool.submit, runner, 10)
+        pool.shutdown()
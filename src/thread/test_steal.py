@@ -0,0 +1,71 @@
+# coding=utf-8
+from unittest import TestCase
+import threading
+import time
+
+from thread.steal import Scheduler
+
+
+def runner(times):
+    total = 0
+    for x in range(times):
+        total += 1
+    return total
+
+
+class TestScheduler(TestCase):
+    def test_submit(self):
+        """
+        执行时间各不相同的 runner 任务
+        """
+        with Scheduler(workers=4) as scheduler:
+            futures = [scheduler.submit(runner, times=n * 100) for n in range(100)]
+            self.assertEqual([f.result(10) for f in futures], [n * 100 for n in range(100)])
+
+        stats = scheduler.stats
+        self.assertEqual(sum(stats.executed), 100)
+        self.assertEqual(stats.queued, 0)
+
+    def test_exception(self):
+        def fail():
+            raise KeyError('x')
+
+        with Scheduler(workers=2) as scheduler:
+            self.assertRaises(KeyError, scheduler.submit(fail).result, 10)
+        self.assertEqual(scheduler.stats.failed, 1)
+        self.assertRaises(RuntimeError, scheduler.submit, fail)
+
+    def test_steal(self):
+        """
+        一个工作线程拆分出的子任务放入自己的队列，空闲的线程从中窃取
+        """
+        futures = []
+        with Scheduler(workers=4) as scheduler:
+            def split():
+                for _ in range(100):
+                    futures.append(scheduler.submit(time.sleep, 0.001))
+
+            scheduler.submit(split).result(10)
+            for f in list(futures):
+                f.result(10)
+
+        stats = scheduler.stats
+        self.assertEqual(sum(stats.executed), 101)
+        self.assertGreater(stats.stolen, 0)
+        self.assertGreater(len([n for n in stats.executed if n]), 1)  # 子任务由多个线程执行
+
+    def test_shutdown(self):
+        """
+        drain=False 时取消尚未开始的任务
+        """
+        count = threading.active_count()
+        event = threading.Event()
+        running = threading.Event()
+        scheduler = Scheduler(workers=1)
+        scheduler.submit(lambda: (running.set(), event.wait(5)))
+        running.wait(5)
+        futures = [scheduler.submit(runner, 10) for _ in range(10)]
+        event.set()
+        scheduler.shutdown(drain=False)
+        self.assertTrue(all(f.cancelled() or f.done() for f in futures))
+        self.assertEqual(threading.active_count(), count)
@@ -0,0 +1,100 @@
+# coding=utf-8
+from unittest import TestCase
+import contextlib
+import io
+import threading
+import time
+
+from thread.timerwheel import TimerWheel
+
+
+class TestTimerWheel(TestCase):
+    def test_schedule(self):
+        """
+        和 test_sleep 相同，延迟的时间不会少于指定的时间，多个任务按到期时间的顺序执行
+        """
+        fired = []
+        done = threading.Event()
+        with TimerWheel() as wheel:
+            ts = time.monotonic()
+            wheel.schedule(0.05, lambda: (fired.append(('b', time.monotonic() - ts)), done.set()))
+            wheel.schedule(0.02, lambda: fired.append(('a', time.monotonic() - ts)))
+            self.assertEqual(len(wheel), 2)
+            self.assertTrue(done.wait(5))
+
+        self.assertEqual([name for name, _ in fired], ['a', 'b'])
+        self.assertGreaterEqual(fired[0][1], 0.02)
+        self.assertGreaterEqual(fired[1][1], 0.05)
+        self.assertEqual(wheel.stats.fired, 2)
+        self.assertEqual(wheel.lateness.count, 2)
+
+    def test_cascade(self):
+        """
+        每层只有 4 个槽时，较长的延迟需要经过多层级联，超出最高层的延迟也能按时执行
+        """
+        fired = []
+        done = threading.Event()
+        delays = [0.003, 0.010, 0.030, 0.070, 0.150]  # 最高层的范围是 4^3 = 64 毫秒
+        with TimerWheel(wheel_size=4, levels=3) as wheel:
+            ts = time.monotonic()
+            for delay in delays:
+                wheel.schedule(delay, lambda d=delay: fired.append((d, time.monotonic() - ts)))
+            wheel.schedule(0.2, done.set)
+            self.assertTrue(done.wait(5))
+
+        self.assertEqual([d for d, _ in fired], delays)
+        for delay, elapsed in fired:
+            self.assertGreaterEqual(elapsed, delay)
+
+    def test_cancel(self):
+        fired = []
+        with TimerWheel() as wheel:
+            handle = wheel.schedule(0.02, fired.append, 'cancelled')
+            wheel.schedule(0.03, fired.append, 'fired')
+            self.assertTrue(handle.cancel())
+            self.assertFalse(handle.cancel())
+            time.sleep(0.1)
+
+        self.assertEqual(fired, ['fired'])
+        self.assertEqual(wheel.stats.cancelled, 1)
+
+    def test_periodic(self):
+        """
+        周期任务按固定频率执行，在回调中取消后不再执行
+        """
+        calls = []
+        done = threading.Event()
+        with TimerWheel() as wheel:
+            def tick():
+                calls.append(time.monotonic())
+                if len(calls) == 5:
+                    handle.cancel()
+                    done.set()
+
+            handle = wheel.schedule_periodic(0.01, tick)
+            self.assertTrue(done.wait(5))
+            time.sleep(0.05)
+
+        self.assertEqual(len(calls), 5)
+        self.assertGreaterEqual(calls[-1] - calls[0], 0.04 - 0.002)
+
+    def test_exception(self):
+        """
+        回调抛出的异常不会终止驱动线程
+        """
+        done = threading.Event()
+        stderr = io.StringIO()
+        with contextlib.redirect_stderr(stderr), TimerWheel() as wheel:
+            wheel.schedule(0.001, int, 'x')
+            wheel.schedule(0.01, done.set)
+            self.assertTrue(done.wait(5))
+        self.assertEqual(wheel.stats.failed, 1)
+        self.assertIn('ValueError', stderr.getvalue())  # 与 threading.Timer 相同，打印异常的调用栈
+
+    def test_stop(self):
+        count = threading.active_count()
+        wheel = TimerWheel()
+        wheel.schedule(10, int)
+        self.assertEqual(wheel.stop(), 1)
+        self.assertRaises(RuntimeError, wheel.schedule, 1, int)
+        self.assertEqual(threading.active_count(), count)
@@ -0,0 +1,256 @@
+# coding=utf-8
+"""
+代替 test_sleep 中“一个线程 time.sleep 后执行”的分层时间轮
+
+每个延迟任务一个线程（或 threading.Timer）在任务数量很多时代价很高。TimerWheel 只使用一个驱动线程：
+    1. 时间按 tick 秒（默认 1 毫秒）划分为刻度，任务的到期时间向上取整到刻度，所以不会提前执行；
+    2. 共 levels 层轮子，每层 wheel_size（2 的幂）个槽，第 i 层一个槽的跨度为 wheel_size^i 个刻度；
+       到期刻度与当前刻度在第 i 层以上的各位都相同时放入第 i 层，所以插入和取消都只需一次集合操作，为 O(1)；
+    3. 当前刻度跨过第 i 层的边界时，把第 i 层对应槽中的任务重新放入更低的层（级联），最终在第 0 层到期执行；
+       超出最高层范围的任务先放入最高层最晚处理的槽，级联时再重新计算；
+    4. 驱动线程只在下一个非空的槽或下一次级联时醒来，没有任务时一直等待；
+    5. schedule_periodic 按固定频率重复执行，执行落后时跳过错过的周期
+回调默认在驱动线程中执行，耗时的回调会推迟其它任务，可以传入 executor（例如 thread/pool.py 的 ThreadPool），
+由它的 submit 方法执行回调。lateness 直方图记录回调实际执行时间比预定时间晚了多少（纳秒）
+"""
+import collections
+import threading
+import time
+import traceback
+
+from decorator.timing import Histogram
+
+WheelStats = collections.namedtuple('WheelStats', ['pending', 'scheduled', 'fired', 'cancelled', 'failed'])
+
+
+class TimerHandle(object):
+    """
+    schedule 返回的句柄，cancel() 取消尚未执行的任务（周期任务取消后不再执行）
+    """
+    __slots__ = ('deadline', 'interval', 'fn', 'args', 'kwargs', 'slot', 'cancelled', '_wheel')
+
+    def __init__(self, wheel, deadline, interval, fn, args, kwargs):
+        self._wheel = wheel
+        self.deadline = deadline  # 到期的刻度
+        self.interval = interval  # 周期任务的间隔刻度数，一次性任务为 None
+        self.fn, self.args, self.kwargs = fn, args, kwargs
+        self.slot = None  # 所在的槽
+        self.cancelled = False
+
+    def cancel(self):
+        """
+        返回 True 表示任务在执行前被取消
+        """
+        return self._wheel._cancel(self)
+
+
+class TimerWheel(object):
+    """
+        tick 刻度的长度（秒）
+        wheel_size 每层的槽数，必须是 2 的幂
+        levels 层数，默认参数可以容纳约 50 天以内的延迟，更长的延迟会多级联几次
+        executor 执行回调的对象，需要提供 submit(fn, *args, **kwargs) 方法，None 表示在驱动线程中执行
+    """
+
+    def __init__(self, tick=0.001, wheel_size=256, levels=4, executor=None, name='timer-wheel'):
+        if wheel_size < 2 or wheel_size & (wheel_size - 1):
+            raise ValueError('wheel_size must be a power of two, got {:}'.format(wheel_size))
+        self.__tick = tick
+        self.__bits = wheel_size.bit_length() - 1
+        self.__mask = wheel_size - 1
+        self.__levels = levels
+        self.__executor = executor
+        self.__wheels = [[set() for _ in range(wheel_size)] for _ in range(levels)]
+
+        self.__cond = threading.Condition(threading.Lock())
+        self.__start = time.monotonic()
+        self.__now = 0  # 已经处理到的刻度
+        self.__wake_tick = None  # 驱动线程计划醒来的刻度，None 表示等待新的任务
+        self.__pending = 0
+        self.__stopped = False
+        self.__scheduled = self.__fired = self.__cancelled = self.__failed = 0
+        self.lateness = Histogram(name + '.lateness')
+
+        self.__driver = threading.Thread(target=self.__run, name=name)
+        self.__driver.daemon = True
+        self.__driver.start()
+
+    def schedule(self, delay, fn, *args, **kwargs):
+        """
+        delay 秒后执行 fn(*args, **kwargs)
+        """
+        return self.__schedule(delay, None, fn, args, kwargs)
+
+    def schedule_periodic(self, interval, fn, *args, **kwargs):
+        """
+        每隔 interval 秒执行一次 fn(*args, **kwargs)，第一次在 interval 秒后执行
+        """
+        return self.__schedule(interval, max(1, int(round(interval / self.__tick))), fn, args, kwargs)
+
+    def __schedule(self, delay, interval, fn, args, kwargs):
+        # 向上取整，保证不会提前执行
+        deadline = -int(-(time.monotonic() + delay - self.__start) // self.__tick)
+        with self.__cond:
+            if self.__stopped:
+                raise RuntimeError('cannot schedule after stop')
+            handle = TimerHandle(self, max(deadline, self.__now + 1), interval, fn, args, kwargs)
+            self.__place(handle)
+            self.__pending += 1
+            self.__scheduled += 1
+            if self.__wake_tick is None or handle.deadline < self.__wake_tick:
+                self.__cond.notify()
+        return handle
+
+    def __place(self, handle):
+        """
+        按到期刻度把任务放入对应的槽，已到期时返回 False，调用时需持有锁
+        """
+        deadline, now, bits = handle.deadline, self.__now, self.__bits
+        if deadline <= now:
+            return False
+        for level in range(self.__levels):
+            shift = bits * (level + 1)
+            if deadline >> shift == now >> shift:
+                slot = self.__wheels[level][(deadline >> (bits * level)) & self.__mask]
+                break
+        else:
+            top = self.__levels - 1
+            slot = self.__wheels[top][((now >> (bits * top)) - 1) & self.__mask]
+        slot.add(handle)
+        handle.slot = slot
+        return True
+
+    def _cancel(self, handle):
+        with self.__cond:
+            if handle.slot is None:
+                return False  # 已经取消，或者一次性任务已经到期（正在或已经执行）
+            handle.cancelled = True
+            handle.slot.discard(handle)
+            handle.slot = None
+            self.__pending -= 1
+            self.__cancelled += 1
+            return True
+
+    def __advance(self):
+        """
+        处理到当前时间为止的所有刻度，返回到期的任务，调用时需持有锁
+        """
+        target = int((time.monotonic() - self.__start) // self.__tick)
+        if not self.__pending:
+            self.__now = max(self.__now, target)
+            return []
+
+        due, bits, mask, wheels = [], self.__bits, self.__mask, self.__wheels
+        while self.__now < target and self.__pending > len(due):
+            now = self.__now = self.__now + 1
+            if not now & mask:
+                # 跨过了第 1 层的边界，从最高的边界层开始逐层级联
+                level = 1
+                while level < self.__levels - 1 and not now & ((1 << (bits * (level + 1))) - 1):
+                    level += 1
+                for level in range(level, 0, -1):
+                    slot = wheels[level][(now >> (bits * level)) & mask]
+                    if slot:
+                        handles = list(slot)
+                        slot.clear()
+                        for handle in handles:
+                            if not self.__place(handle):
+                                handle.slot = None
+                                due.append(handle)
+            slot = wheels[0][now & mask]
+            if slot:
+                for handle in slot:
+                    handle.slot = None
+                    due.append(handle)
+                slot.clear()
+        if self.__now < target and self.__pending == len(due):
+            self.__now = target  # 剩下的刻度上没有任务
+        self.__pending -= len(due)
+        return due
+
+    def __sleep_time(self):
+        """
+        计算驱动线程下一次醒来的时间：第 0 层中下一个非空的槽，或者第 1 层的下一个边界，调用时需持有锁
+        """
+        if not self.__pending:
+            self.__wake_tick = None
+            return None
+        now, mask, wheel = self.__now, self.__mask, self.__wheels[0]
+        wake_tick = (now | mask) + 1
+        for tick in range(now + 1, wake_tick):
+            if wheel[tick & mask]:
+                wake_tick = tick
+                break
+        self.__wake_tick = wake_tick
+        return max(0.0, self.__start + wake_tick * self.__tick - time.monotonic())
+
+    def __reschedule(self, handle):
+        # 周期任务：按固定频率计算下一次的到期刻度，跳过已经错过的周期，调用时需持有锁
+        if self.__stopped:
+            return
+        handle.deadline += handle.interval
+        if handle.deadline <= self.__now:
+            handle.deadline += (self.__now - handle.deadline) // handle.interval * handle.interval + handle.interval
+        self.__place(handle)
+        self.__pending += 1
+
+    def __run(self):
+        while True:
+            with self.__cond:
+                if self.__stopped:
+                    return
+                due = self.__advance()
+                if not due:
+                    self.__cond.wait(self.__sleep_time())
+                    continue
+                for handle in due:
+                    if handle.interval:
+                        self.__reschedule(handle)
+            for handle in due:
+                self.__fire(handle)
+
+    def __fire(self, handle):
+        if handle.cancelled:
+            return  # 周期任务在本次执行前被取消
+        late = time.monotonic() - (self.__start + handle.deadline * self.__tick)
+        self.lateness.record(max(0, int(late * 1e9)))
+        try:
+            if self.__executor is not None:
+                self.__executor.submit(handle.fn, *handle.args, **handle.kwargs)
+            else:
+                handle.fn(*handle.args, **handle.kwargs)
+        except Exception:
+            self.__failed += 1
+            traceback.print_exc()
+        self.__fired += 1
+
+    def stop(self, wait=True):
+        """
+        停止驱动线程，尚未到期的任务不再执行，返回它们的数量
+        """
+        with self.__cond:
+            self.__stopped = True
+            pending, self.__pending = self.__pending, 0
+            for wheel in self.__wheels:
+                for slot in wheel:
+                    for handle in slot:
+                        handle.slot = None
+                    slot.clear()
+            self.__cond.notify_all()
+        if wait and threading.current_thread() is not self.__driver:
+            self.__driver.join()
+        return pending
+
+    @property
+    def stats(self):
+        with self.__cond:
+            return WheelStats(self.__pending, self.__scheduled, self.__fired, self.__cancelled, self.__failed)
+
+    def __len__(self):
+        return self.__pending
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.stop()